@@ -0,0 +1,138 @@
+"""
+Per-image boot-time history for EVE-NG nodes.
+
+Every node start records how long the image took to reach the running state
+and how long until its console showed the first login prompt. The samples are
+kept per image in a small JSON file so the next run can sleep until the node
+is expected to be ready and only then poll tightly.
+"""
+
+import json
+import os
+import threading
+import logging
+
+logger = logging.getLogger()
+
+
+def quantile(samples, q):
+    """
+    Return the q-quantile of a list of samples using linear interpolation.
+    Args:
+        samples (list): List of numeric samples.
+        q (float): Quantile between 0 and 1.
+    Returns:
+        float: The interpolated quantile, or None if there are no samples.
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class BootHistory:
+    """
+    Thread-safe store of observed boot timings keyed by image and metric.
+
+    Metrics used by the deployment flow:
+        running: seconds from the start API call until the node status is 2.
+        prompt: seconds from the start API call until the first console prompt.
+        reboot_prompt: seconds from a requested reboot (vEOS zerotouch cancel)
+            until the login prompt is back.
+    """
+
+    def __init__(self, history_file=None, max_samples=50, min_samples=3, tight_interval=1, margin=2):
+        """
+        Args:
+            history_file (str): Path of the JSON history file. None keeps the history in memory only.
+            max_samples (int): Number of most recent samples kept per image and metric.
+            min_samples (int): Samples required before the history overrides the defaults.
+            tight_interval (float): Poll interval used once the expected ready time is reached.
+            margin (float): Minimum number of seconds to wake up before the earliest expected ready time.
+        """
+        self.history_file = history_file
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.tight_interval = tight_interval
+        self.margin = margin
+        self._lock = threading.Lock()
+        self._history = self._load()
+
+    def _load(self):
+        if not self.history_file or not os.path.exists(self.history_file):
+            return {}
+        try:
+            with open(self.history_file, 'r') as history:
+                return json.load(history)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable boot history file '{self.history_file}': {e}")
+            return {}
+
+    def record(self, image, metric, seconds):
+        """
+        Record one observed timing for an image.
+        Args:
+            image (str): Image name from the node payload (e.g. 'veos-4.33.2F').
+            metric (str): Metric name ('running', 'prompt', 'reboot_prompt').
+            seconds (float): Observed duration in seconds.
+        """
+        with self._lock:
+            samples = self._history.setdefault(image, {}).setdefault(metric, [])
+            samples.append(round(seconds, 2))
+            del samples[:-self.max_samples]
+        logger.debug(f"Recorded {metric} time for image {image}: {seconds:.1f}s")
+
+    def samples(self, image, metric):
+        """
+        Return a copy of the recorded samples for an image and metric.
+        """
+        with self._lock:
+            return list(self._history.get(image, {}).get(metric, []))
+
+    def schedule(self, image, metric, default_delay, default_interval, default_window):
+        """
+        Work out when to start polling for a readiness event and how tightly.
+
+        Without enough history the caller's defaults are returned unchanged.
+        Otherwise polling starts shortly before the earliest expected ready time
+        (10th percentile) and runs at the tight interval for a window that covers
+        the slow tail (95th percentile) with some headroom.
+
+        Args:
+            image (str): Image name from the node payload.
+            metric (str): Metric name.
+            default_delay (float): Initial sleep used without history.
+            default_interval (float): Poll interval used without history.
+            default_window (float): Polling window used without history.
+        Returns:
+            tuple: (initial_delay, poll_interval, window) in seconds.
+        """
+        samples = self.samples(image, metric)
+        if len(samples) < self.min_samples:
+            return default_delay, default_interval, default_window
+
+        early = quantile(samples, 0.1)
+        late = quantile(samples, 0.95)
+        delay = max(0.0, early - max(self.margin, early * 0.1))
+        window = max(default_window, late * 1.5 - delay)
+        logger.debug(f"Boot schedule for {image} ({metric}): sleep {delay:.1f}s, poll every {self.tight_interval}s for {window:.1f}s")
+        return delay, self.tight_interval, window
+
+    def save(self):
+        """
+        Write the history back to the JSON file, replacing it atomically.
+        """
+        if not self.history_file:
+            return
+        with self._lock:
+            snapshot = json.dumps(self._history, indent=4)
+        temp_file = f"{self.history_file}.tmp"
+        try:
+            with open(temp_file, 'w') as history:
+                history.write(snapshot)
+            os.replace(temp_file, self.history_file)
+        except OSError as e:
+            logger.error(f"Failed to save boot history to '{self.history_file}': {e}")
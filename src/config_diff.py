@@ -0,0 +1,287 @@
+"""
+Running-config diff for incremental deployments.
+
+The running configuration of a device and its workbook commands are both
+parsed into the same normalized structure, and only the workbook lines that
+are missing from the device are pushed:
+    Cisco / Arista: {section header or None: set of lines}, where a section is a
+        top-level block such as `interface gigabitethernet0/1` or `line vty 0 4`.
+        Interface names are expanded and lowercased (`int g0/1` matches
+        `interface GigabitEthernet0/1`), and `no shut` matches `no shutdown`.
+    Junos: the set of `set ...` lines printed by `show configuration | display set`;
+        workbook `edit` levels are folded into the lines.
+The comparison is conservative: a line that cannot be matched is pushed again,
+which is harmless on these CLIs. `no X` / `delete X` lines count as applied when
+nothing in the section starts with X. Secrets are stored hashed, so a line with
+a secret or password counts as applied when the device has the same line up to
+the secret (a changed password is not detected). Commands that leave nothing in
+the running config, such as RSA key generation, are only sent on full deploys.
+Lines that are on the device but not in the workbook are left alone.
+"""
+
+import re
+
+# Commands that print the configuration in the structure parsed below, per node name
+DIFF_COMMANDS = {
+    'vIOS': ["terminal length 0", "show running-config"],
+    'Switch': ["terminal length 0", "show running-config"],
+    'vEOS': ["terminal length 0", "show running-config"],
+    'vSRX-NG': ["show configuration | display set | no-more"],
+}
+
+# Commands sent around the delta, per node name
+DELTA_WRAPPERS = {
+    'vIOS': (["configure terminal"], ["end", "write memory"]),
+    'Switch': (["configure terminal"], ["end", "write memory"]),
+    'vEOS': (["configure"], ["end", "write memory"]),
+    'vSRX-NG': (["configure"], ["commit and-quit"]),
+}
+
+# Mode changes, saves and commits: dropped from the workbook, the wrappers above take their place
+CONTROL_COMMANDS = {
+    "conf t", "configure", "configure terminal", "end", "exit", "wr", "write", "write memory",
+    "commit", "commit and-quit", "top", "up",
+}
+
+# Workbook commands followed by lines that answer their prompts: (pattern, number of answers)
+PROMPTED_COMMANDS = [
+    (re.compile(r"^crypto key generate rsa$"), 1),
+    (re.compile(r"plain-text-password$"), 2),
+]
+
+# Commands whose effect never shows in the running config
+ONE_SHOT_COMMANDS = re.compile(r"^crypto key generate\b")
+
+# Tokens after which a line holds a secret that the device stores hashed
+SECRET_TOKENS = {"secret", "password", "plain-text-password", "encrypted-password"}
+
+# Top-level commands that start a configuration block on Cisco and Arista
+SECTION_COMMANDS = (
+    "interface ", "router ", "line ", "vlan ", "ip access-list ", "ipv6 access-list ", "route-map ",
+    "class-map ", "policy-map ", "management ", "ip vrf ", "vrf definition ", "vrf instance ",
+    "key chain ", "ip dhcp pool ", "control-plane", "monitor session ",
+)
+
+# Global commands that end a block when a workbook has no `exit` before them
+GLOBAL_COMMANDS = (
+    "hostname ", "username ", "enable ", "ip route ", "ipv6 route ", "ip domain", "ip name-server ",
+    "ip ssh ", "ip scp ", "ip routing", "crypto ", "banner ", "ntp ", "logging ", "snmp-server ",
+    "spanning-tree ", "service ", "aaa ", "no ip domain", "clock ", "ip default-gateway ",
+)
+
+# Interface types in the order their abbreviations are resolved (`g` -> gigabitethernet)
+INTERFACE_TYPES = (
+    "gigabitethernet", "fastethernet", "tengigabitethernet", "ethernet", "loopback",
+    "vlan", "management", "port-channel", "tunnel",
+)
+
+COMMAND_ABBREVIATIONS = {"int": "interface", "desc": "description", "shut": "shutdown"}
+
+
+def normalize_line(line):
+    """
+    Normalize one Cisco / Arista configuration line.
+    Args:
+        line (str): A workbook command or running-config line.
+    Returns:
+        str: The line with collapsed whitespace, expanded abbreviations and canonical interface names.
+    """
+    words = line.split()
+    if not words:
+        return ""
+    first = 1 if words[0] == "no" and len(words) > 1 else 0
+    words[first] = COMMAND_ABBREVIATIONS.get(words[first], words[first])
+    if words[first] == "interface" and len(words) > first + 1:
+        words[first + 1:] = [interface_name(" ".join(words[first + 1:]))]
+    return " ".join(words)
+
+
+def interface_name(name):
+    """
+    Expand an interface name (e.g. 'g0/1' or 'vlan 10') to its lowercase full form.
+    """
+    match = re.fullmatch(r"([a-z-]+)\s*(\d[\d/.:]*)", name.lower())
+    if not match:
+        return name.lower()
+    prefix, number = match.groups()
+    for interface_type in INTERFACE_TYPES:
+        if interface_type.startswith(prefix):
+            return f"{interface_type}{number}"
+    return f"{prefix}{number}"
+
+
+def _is_control(line):
+    return line.lower() in CONTROL_COMMANDS or line.lower().startswith(("commit ", "exit configuration"))
+
+
+def _answers(line):
+    for pattern, answers in PROMPTED_COMMANDS:
+        if pattern.search(line):
+            return answers
+    return 0
+
+
+def split_prompted(commands):
+    """
+    Separate workbook commands that answer a prompt from the others.
+    Args:
+        commands (list): Workbook commands of a device, in order.
+    Returns:
+        tuple: (commands without a prompt, list of [command, answers...] lists).
+    """
+    plain = []
+    prompted = []
+    index = 0
+    while index < len(commands):
+        line = " ".join(str(commands[index]).split())
+        count = _answers(line)
+        if count:
+            prompted.append([line] + [str(answer) for answer in commands[index + 1:index + 1 + count]])
+        else:
+            plain.append(commands[index])
+        index += 1 + count
+    return plain, prompted
+
+
+def parse_running_config(name, text):
+    """
+    Parse a running configuration into the normalized structure.
+    Args:
+        name (str): The name of the node (e.g. 'vIOS').
+        text (str): Output of the node's DIFF_COMMANDS, without the echo and the prompt.
+    Returns:
+        dict: Section header (None for top-level lines) mapped to the set of its lines.
+    """
+    config = {None: set()}
+    if name == 'vSRX-NG':
+        config[None] = {" ".join(line.split()) for line in text.splitlines() if line.startswith(("set ", "deactivate "))}
+        return config
+    section = None
+    for line in text.splitlines():
+        if not line.strip() or line.lstrip().startswith("!"):
+            continue
+        if line[0].isspace():
+            if section is not None:
+                config[section].add(normalize_line(line))  # Nested blocks are flattened into their section
+            continue
+        section = normalize_line(line)
+        config[None].add(section)
+        config.setdefault(section, set())
+    return config
+
+
+def desired_config(name, commands):
+    """
+    Fold workbook commands into normalized lines.
+    Args:
+        name (str): The name of the node (e.g. 'vIOS').
+        commands (list): Workbook commands of the device, in order.
+    Returns:
+        list: (section header or None, normalized line, prompt answers) tuples, in workbook order.
+    """
+    items = []
+    section = None
+    edit_levels = []  # Junos `edit` commands in effect, one list of words each
+    index = 0
+    while index < len(commands):
+        line = " ".join(str(commands[index]).split())
+        answers = [str(answer) for answer in commands[index + 1:index + 1 + _answers(line)]]
+        index += 1 + len(answers)
+        if not line:
+            continue
+        if name == 'vSRX-NG':
+            words = line.split()
+            if words[0] == "edit":
+                edit_levels.append(words[1:])
+            elif words[0] == "exit" and edit_levels:
+                edit_levels.pop()  # Back to where the last `edit` started
+            elif words[0] == "up" and edit_levels:
+                edit_levels[-1] = edit_levels[-1][:-1]
+                if not edit_levels[-1]:
+                    edit_levels.pop()
+            elif words[0] == "top":
+                edit_levels = []
+            elif words[0] in ("set", "delete", "deactivate"):
+                path = [word for level in edit_levels for word in level]
+                items.append((None, " ".join([words[0]] + path + words[1:]), answers))
+            continue
+        if _is_control(line):
+            if line.lower() == "exit":
+                section = None
+            continue
+        line = normalize_line(line)
+        if line.startswith(SECTION_COMMANDS):
+            section = line
+            items.append((None, line, answers))
+        elif line.startswith(GLOBAL_COMMANDS):
+            section = None
+            items.append((None, line, answers))
+        else:
+            items.append((section, line, answers))
+    return items
+
+
+def _applied(line, lines, negation):
+    if negation == "delete " and line.startswith("set "):
+        # Junos prints leaves only: `set system services ssh` shows as `set system services ssh root-login allow`
+        if any(existing.startswith(line + " ") for existing in lines):
+            return True
+    if line.startswith(negation):
+        # `no X` / `delete X` is applied when nothing starts with X
+        removed = line[len(negation):]
+        prefix = ("set " + removed) if negation == "delete " else removed
+        return not any(existing == prefix or existing.startswith(prefix + " ") for existing in lines)
+    if line in lines:
+        return True
+    words = line.split()
+    for position, word in enumerate(words):
+        if word in SECRET_TOKENS:
+            key = words[:position]
+            return any(
+                existing.split()[:position] == key and len(existing.split()) > position and existing.split()[position] in SECRET_TOKENS
+                for existing in lines
+            )
+    return False
+
+
+def config_delta(name, commands, running_text):
+    """
+    Compute the commands that bring a device from its running config to the workbook.
+    Args:
+        name (str): The name of the node (e.g. 'vIOS').
+        commands (list): Workbook commands of the device.
+        running_text (str): Output of the node's DIFF_COMMANDS, without the echo and the prompt.
+    Returns:
+        tuple: (commands to push, wrapped in the vendor's configure / save commands or empty
+            if nothing is missing; number of missing lines; number of workbook lines compared).
+    """
+    running = parse_running_config(name, running_text)
+    negation = "delete " if name == 'vSRX-NG' else "no "
+    items = desired_config(name, commands)
+    blocks = {}  # Section mapped to its missing lines, in workbook order
+    missing = 0
+    compared = 0
+    for section, line, answers in items:
+        if ONE_SHOT_COMMANDS.match(line):
+            continue
+        compared += 1
+        if name != 'vSRX-NG' and section is None and line.startswith(SECTION_COMMANDS):
+            # Headers are sent with their block, so a new section is created even without missing lines
+            if line not in running[None]:
+                missing += 1
+                blocks.setdefault(line, [])
+            continue
+        if _applied(line, running.get(section, set()), negation):
+            continue
+        missing += 1
+        blocks.setdefault(section, []).extend([line] + answers)
+    if not missing:
+        return [], 0, compared
+
+    before, after = DELTA_WRAPPERS[name]
+    delta = list(before)
+    delta.extend(blocks.pop(None, []))
+    for section, lines in blocks.items():
+        delta.extend([section] + lines + ["exit"])
+    delta.extend(after)
+    return delta, missing, compared
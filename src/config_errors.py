@@ -0,0 +1,75 @@
+"""
+Error detection in configuration push output.
+
+Network CLIs accept a rejected line, print a short error and carry on with the
+next one, so a typo near the top of a workbook used to be followed by hundreds
+of commands that fail the same way while the run still reported success. The
+output of every command is now checked against ERROR_SIGNATURES as it arrives
+on the console; pasted batches (golden replays, incremental deltas, SSH pushes)
+are checked once the paste returns, and the offending command is located from
+its echo. The first error stops the device's push with a ConfigPushError.
+"""
+
+import re
+from exceptions import ConfigPushError
+
+# Output that means a device rejected a configuration line, per node name
+ERROR_SIGNATURES = {
+    'vIOS': re.compile(r"% ?(Invalid input|Incomplete command|Ambiguous command|Unknown command|Unrecognized command)[^\r\n]*"),
+    'Switch': re.compile(r"% ?(Invalid input|Incomplete command|Ambiguous command|Unknown command|Unrecognized command)[^\r\n]*"),
+    'vEOS': re.compile(r"% ?(Invalid input|Incomplete command|Ambiguous command|Unavailable command|Error)[^\r\n]*"),
+    'vSRX-NG': re.compile(r"(syntax error|unknown command|missing argument|invalid value|error: )[^\r\n]*"),
+}
+
+
+def find_error(name, output):
+    """
+    Return the first error message in a device's output, or None.
+    Args:
+        name (str): The name of the node (e.g. 'vIOS').
+        output (str): Console or SSH output.
+    """
+    signature = ERROR_SIGNATURES.get(name)
+    match = signature.search(output) if signature else None
+    return match.group(0).strip() if match else None
+
+
+def check_output(name, output, command, line_number):
+    """
+    Raise a ConfigPushError if the output of one command contains an error.
+    Args:
+        name (str): The name of the node (e.g. 'vIOS').
+        output (str): Output of the command, up to the next prompt.
+        command (str): The command that was sent.
+        line_number (int): Position of the command in the pushed lines, starting at 1.
+    """
+    message = find_error(name, output)
+    if message:
+        raise ConfigPushError(line_number, command, message, output)
+
+
+def check_paste(name, output, lines):
+    """
+    Raise a ConfigPushError for the first error in the output of a pasted batch.
+    The offending line is the last pasted line echoed before the error.
+    Args:
+        name (str): The name of the node (e.g. 'vIOS').
+        output (str): Output of the whole paste.
+        lines (list): The lines that were pasted, in order.
+    """
+    signature = ERROR_SIGNATURES.get(name)
+    match = signature.search(output) if signature else None
+    if not match:
+        return
+    echoes = output[:match.start()].splitlines()
+    line_number, command = 0, ""
+    position = 0
+    for echo in echoes:
+        echo = echo.rstrip()
+        # Match the echoes in order, so a line sent twice is attributed to the right occurrence
+        for index in range(position, len(lines)):
+            if lines[index].strip() and echo.endswith(lines[index].strip()):
+                line_number, command, position = index + 1, lines[index], index + 1
+                break
+    start = output.rfind("\n", 0, match.start()) + 1
+    raise ConfigPushError(line_number, command, match.group(0).strip(), output[start:match.end()])
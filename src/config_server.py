@@ -0,0 +1,219 @@
+"""
+Embedded HTTP server that devices pull their configuration from.
+
+Typing a large workbook into a serial console costs a round-trip per line. With
+`"config_transport": "http"`, every device's workbook is rendered into a file
+before the run and served from memory by a small threaded HTTP server. The
+console stage only gives the device a management address and then sends one
+vendor pull command (ADDRESS_TEMPLATES, PULL_COMMANDS):
+    Cisco / Arista: copy http://<server>/<token>/<file> running-config
+    Junos:          load set http://<server>/<token>/<file>, then commit
+so the console time no longer grows with the length of the configuration.
+
+Commands that answer a prompt (RSA key generation, Junos plain-text passwords)
+cannot be part of a file; they are sent over the console after the pull. File
+paths carry a random per-run token, and the server records every request per
+device, so the end of the run reports which devices never fetched their file.
+"""
+
+import re
+import secrets
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pandas as pd
+import logging
+from config_diff import DELTA_WRAPPERS, desired_config, split_prompted
+from ssh_config import assign_mgmt_addresses, config_file_content
+
+logger = logging.getLogger()
+
+# Console commands that give a device the management address it pulls from, per node name
+ADDRESS_TEMPLATES = {
+    'vIOS': ["conf t", "interface GigabitEthernet0/0", "ip address {address} {netmask}", "no shutdown", "end"],
+    'Switch': ["conf t", "interface Vlan1", "ip address {address} {netmask}", "no shutdown", "end"],
+    'vEOS': ["configure", "interface Management1", "ip address {address}/{prefixlen}", "end"],
+    'vSRX-NG': ["configure", "set interfaces fxp0 unit 0 family inet address {address}/{prefixlen}", "commit and-quit"],
+}
+
+# Pull commands per node name, and the output that confirms the device applied the file.
+# The empty line answers the IOS destination filename prompt.
+PULL_COMMANDS = {
+    'vIOS': (["copy {url} running-config", "", "write memory"], re.compile(r"\d+ bytes copied")),
+    'Switch': (["copy {url} running-config", "", "write memory"], re.compile(r"\d+ bytes copied")),
+    'vEOS': (["copy {url} running-config", "write memory"], re.compile(r"Copy completed successfully")),
+    'vSRX-NG': (["configure", "load set {url}", "commit and-quit"], re.compile(r"load complete")),
+}
+
+
+def render_config(name, commands):
+    """
+    Render workbook commands into the file a device pulls and the commands left for the console.
+    Args:
+        name (str): The name of the node (e.g. 'vIOS').
+        commands (list): Workbook commands of the device, in order.
+    Returns:
+        tuple: (file content, console commands wrapped in the vendor's configure / save commands,
+            or an empty list when every command fits in the file).
+    """
+    if name == 'vSRX-NG':
+        # `load set` takes flat set / delete lines, so workbook `edit` levels are folded in
+        items = desired_config(name, commands)
+        content = "\n".join(line for _, line, answers in items if not answers) + "\n"
+        prompted = [[line] + answers for _, line, answers in items if answers]
+    else:
+        plain, prompted = split_prompted(commands)
+        content = config_file_content(plain)
+    console_commands = []
+    if prompted:
+        before, after = DELTA_WRAPPERS[name]
+        console_commands = list(before) + [line for command in prompted for line in command] + list(after)
+    return content, console_commands
+
+
+class _ConfigRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.config_server.serve(self)
+
+    def log_message(self, format, *args):
+        logger.debug(f"Config server: {self.address_string()} {format % args}")
+
+
+class ConfigServer:
+    """
+    Serves the rendered configuration of every device over HTTP and tracks who fetched it.
+    """
+
+    def __init__(self, settings, nodes):
+        """
+        Args:
+            settings (dict): Tuning settings; the server is used when `config_transport` is 'http'
+                and is configured by the `config_server` entry.
+            nodes (list): List of dictionaries containing node types and their counts.
+        """
+        self.enabled = settings.get('config_transport', 'console') == 'http'
+        server_settings = settings.get('config_server', {})
+        self.host = server_settings.get('host')
+        self.bind = server_settings.get('bind', '0.0.0.0')
+        self.port = server_settings.get('port', 8080)
+        self.pull_timeout = server_settings.get('pull_timeout', 300)
+        self.pull_retries = server_settings.get('pull_retries', 5)
+        self.retry_delay = server_settings.get('retry_delay', 5)
+        self.token = secrets.token_hex(8)
+        self.files = {}     # URL path mapped to (node, file content)
+        self.consoles = {}  # Node mapped to the commands sent over the console after the pull
+        self.fetches = {}   # Node mapped to its fetch record
+        self.addresses = {}
+        self._lock = threading.Lock()
+        self._httpd = None
+        if self.enabled:
+            if not self.host:
+                raise ValueError("The HTTP configuration transport needs `config_server.host`, the address devices reach the tool on.")
+            self.addresses = assign_mgmt_addresses(nodes, server_settings)
+
+    def publish(self, nodes, node_specs):
+        """
+        Render the workbook of every device and make it available for download.
+        Args:
+            nodes (list): List of dictionaries containing node types and their counts.
+            node_specs (dict): Node type mapped to a (payload, config workbook path) tuple.
+        """
+        if not self.enabled:
+            return
+        workbooks = {}
+        for dev in nodes:
+            for node_type, count in dev.items():
+                if node_type not in node_specs:
+                    continue
+                payload, config_file = node_specs[node_type]
+                if config_file not in workbooks:
+                    workbooks[config_file] = pd.read_excel(config_file, sheet_name=None)
+                for dev_num in range(count):
+                    sheet = workbooks[config_file].get(str(dev_num))
+                    if sheet is None:
+                        continue
+                    node = f"{node_type} {dev_num}"
+                    content, console_commands = render_config(payload['name'], sheet['Command'].dropna().tolist())
+                    self.files[self.path(node_type, dev_num)] = (node, content.encode('ascii'))
+                    self.consoles[node] = console_commands
+        logger.info(f"Rendered {len(self.files)} device configurations for the config server.")
+
+    def path(self, node_type, dev_num):
+        return f"/{self.token}/{node_type.lower().replace(' ', '_')}_{dev_num}.cfg"
+
+    def url(self, node_type, dev_num):
+        """
+        Return the URL a device pulls its configuration from, or None if it has none.
+        """
+        path = self.path(node_type, dev_num)
+        if path not in self.files:
+            return None
+        return f"http://{self.host}:{self.port}{path}"
+
+    def address_commands(self, name, node_type, dev_num):
+        """
+        Return the console commands that give a device its management address.
+        """
+        if name not in ADDRESS_TEMPLATES:
+            raise ValueError(f"No address template for {name}")
+        address = self.addresses[(node_type, dev_num)]
+        values = {'address': address.ip, 'netmask': address.network.netmask, 'prefixlen': address.network.prefixlen}
+        return [line.format(**values) for line in ADDRESS_TEMPLATES[name]]
+
+    def pull_commands(self, name, node_type, dev_num):
+        """
+        Return the pull commands of a device and the pattern that confirms them.
+        Returns:
+            tuple: (commands to send, compiled success pattern), or None if the device has no file.
+        """
+        url = self.url(node_type, dev_num)
+        if url is None or name not in PULL_COMMANDS:
+            return None
+        commands, success = PULL_COMMANDS[name]
+        return [command.format(url=url) for command in commands], success
+
+    def console_commands(self, node_type, dev_num):
+        return self.consoles.get(f"{node_type} {dev_num}", [])
+
+    def serve(self, handler):
+        entry = self.files.get(handler.path)
+        if entry is None:
+            handler.send_error(404)
+            return
+        node, content = entry
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/plain")
+        handler.send_header("Content-Length", str(len(content)))
+        handler.end_headers()
+        handler.wfile.write(content)
+        with self._lock:
+            record = self.fetches.setdefault(node, {'count': 0, 'client': None, 'at': None})
+            record.update(count=record['count'] + 1, client=handler.client_address[0], at=time.time())
+        logger.info(f"Config server: {node} fetched {len(content)} bytes from {handler.client_address[0]}.")
+
+    def start(self):
+        """
+        Start serving on a background thread.
+        """
+        if not self.enabled:
+            return
+        self._httpd = ThreadingHTTPServer((self.bind, self.port), _ConfigRequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.config_server = self
+        self.port = self._httpd.server_address[1]
+        threading.Thread(target=self._httpd.serve_forever, name="config-server", daemon=True).start()
+        logger.info(f"Config server listening on {self.bind}:{self.port}, devices pull from http://{self.host}:{self.port}.")
+
+    def close(self):
+        """
+        Stop the server and log the devices that never fetched their configuration.
+        """
+        if self._httpd is None:
+            return
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._httpd = None
+        missing = sorted(node for node, _ in self.files.values() if node not in self.fetches)
+        logger.info(f"Config server: {len(self.fetches)}/{len(self.files)} devices fetched their configuration.")
+        if missing:
+            logger.warning(f"Config server: never fetched by {', '.join(missing)}.")
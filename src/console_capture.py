@@ -0,0 +1,207 @@
+"""
+Bounded console transcript capture.
+
+Every Telnet console session writes its raw bytes into a fixed-size ring
+buffer, so memory per console stays constant however chatty the device is.
+The buffer can optionally live in a memory-mapped per-device file, which keeps
+the latest output on disk even if the process dies. Transcripts are dumped to
+plain log files on failure or on request instead of flooding the shared log.
+"""
+
+import mmap
+import os
+import signal
+import struct
+import threading
+import datetime
+import logging
+from telnetlib import Telnet
+
+logger = logging.getLogger()
+
+# Header of memory-mapped ring files: write position and total bytes written
+_HEADER = struct.Struct('<QQ')
+
+
+class RingBuffer:
+    """
+    Fixed-size byte ring buffer backed by a bytearray or a memory-mapped file.
+    """
+
+    def __init__(self, capacity, backing_file=None):
+        """
+        Args:
+            capacity (int): Number of bytes kept.
+            backing_file (str): Optional path of a file to memory-map as storage.
+        """
+        self.capacity = capacity
+        self.position = 0
+        self.total = 0
+        self._file = None
+        self._lock = threading.Lock()  # A SIGUSR1 dump may read while the session writes or closes
+        if backing_file:
+            self._file = open(backing_file, 'w+b')
+            self._file.truncate(_HEADER.size + capacity)
+            self._map = mmap.mmap(self._file.fileno(), _HEADER.size + capacity)
+            self._data = memoryview(self._map)[_HEADER.size:]
+        else:
+            self._map = None
+            self._data = memoryview(bytearray(capacity))
+
+    def write(self, data):
+        """
+        Append bytes, overwriting the oldest data once the buffer is full.
+        """
+        size = len(data)
+        if not size:
+            return
+        with self._lock:
+            if self._data is None:
+                return  # Closed
+            self.total += size
+            if size >= self.capacity:
+                # Only the last `capacity` bytes survive
+                self._data[:] = data[-self.capacity:]
+                self.position = 0
+            else:
+                first = min(size, self.capacity - self.position)
+                self._data[self.position:self.position + first] = data[:first]
+                if first < size:
+                    self._data[:size - first] = data[first:]
+                self.position = (self.position + size) % self.capacity
+            if self._map is not None:
+                _HEADER.pack_into(self._map, 0, self.position, self.total)
+
+    def getvalue(self):
+        """
+        Return the buffered bytes, oldest first.
+        """
+        with self._lock:
+            if self._data is None:
+                return b''
+            if self.total < self.capacity:
+                return bytes(self._data[:self.position])
+            return bytes(self._data[self.position:]) + bytes(self._data[:self.position])
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._data.release()
+                self._data = None
+                self._map.close()
+                self._file.close()
+                self._map = None
+
+
+class CapturingTelnet(Telnet):
+    """
+    Telnet client that copies every raw byte received into a ring buffer.
+    """
+
+    def __init__(self, host, port, transcript, timeout=None):
+        self.transcript = transcript
+        if timeout is None:
+            super().__init__(host, port)
+        else:
+            super().__init__(host, port, timeout)
+
+    def fill_rawq(self):
+        # fill_rawq drops the consumed part of rawq before appending the new chunk
+        start = len(self.rawq) if self.irawq < len(self.rawq) else 0
+        super().fill_rawq()
+        self.transcript.write(self.rawq[start:])
+
+
+class TranscriptStore:
+    """
+    Keeps one console ring buffer per device and dumps them on demand.
+    """
+
+    def __init__(self, transcript_dir=None, capacity=65536, use_mmap=False, dump_mode='failure'):
+        """
+        Args:
+            transcript_dir (str): Directory for dumped transcripts and ring files.
+            capacity (int): Ring buffer size per console in bytes.
+            use_mmap (bool): Back each ring buffer with a memory-mapped file in `transcript_dir`.
+            dump_mode (str): 'failure' dumps only failed sessions, 'always' dumps every
+                session when it closes, 'never' disables dumping.
+        """
+        self.transcript_dir = transcript_dir
+        self.capacity = capacity
+        self.use_mmap = use_mmap and bool(transcript_dir)
+        self.dump_mode = dump_mode
+        self._buffers = {}
+        self._lock = threading.Lock()
+        if transcript_dir:
+            os.makedirs(transcript_dir, exist_ok=True)
+
+    def _key(self, name, device_id):
+        return f"{name}_{device_id}"
+
+    def open(self, name, device_id):
+        """
+        Create (or reuse) the ring buffer of a device console.
+        Args:
+            name (str): Node name (e.g. 'vIOS').
+            device_id (str): EVE-NG node ID.
+        Returns:
+            RingBuffer: The device's ring buffer.
+        """
+        key = self._key(name, device_id)
+        with self._lock:
+            if key not in self._buffers:
+                backing_file = os.path.join(self.transcript_dir, f"{key}.ring") if self.use_mmap else None
+                self._buffers[key] = RingBuffer(self.capacity, backing_file)
+            return self._buffers[key]
+
+    def dump(self, name, device_id, reason='request'):
+        """
+        Write a device transcript to `<transcript_dir>/<timestamp>_<name>_<id>.log`.
+        Returns:
+            str: Path of the dumped file, or None if nothing was written.
+        """
+        key = self._key(name, device_id)
+        with self._lock:
+            buffer = self._buffers.get(key)
+        if buffer is None or not self.transcript_dir or self.dump_mode == 'never':
+            return None
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        dump_file = os.path.join(self.transcript_dir, f"{timestamp}_{key}.log")
+        try:
+            with open(dump_file, 'wb') as transcript:
+                transcript.write(buffer.getvalue())
+            logger.info(f"Console transcript for {key} dumped to {dump_file} ({reason}).")
+            return dump_file
+        except OSError as e:
+            logger.error(f"Failed to dump console transcript for {key}: {e}")
+            return None
+
+    def dump_all(self, reason='request'):
+        with self._lock:
+            keys = list(self._buffers)
+        for key in keys:
+            name, device_id = key.rsplit('_', 1)
+            self.dump(name, device_id, reason)
+
+    def close(self, name, device_id, failed=False):
+        """
+        Finish a console session: dump it if required and release its buffer.
+        """
+        if failed or self.dump_mode == 'always':
+            self.dump(name, device_id, 'failure' if failed else 'session end')
+        with self._lock:
+            buffer = self._buffers.pop(self._key(name, device_id), None)
+        if buffer is not None:
+            buffer.close()
+
+    def install_signal_handler(self):
+        """
+        Dump every open transcript when the process receives SIGUSR1 (POSIX only).
+        """
+        if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, self._on_signal)
+
+    def _on_signal(self, signum, frame):
+        # The handler runs on the main thread between two bytecodes, possibly while that thread
+        # holds self._lock (or a logging lock): taking it here would deadlock, so dump from a thread
+        threading.Thread(target=self.dump_all, args=('SIGUSR1',), name="transcript-dump", daemon=True).start()
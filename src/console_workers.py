@@ -0,0 +1,301 @@
+"""
+Console stage sharded across worker processes.
+
+With hundreds of consoles, decoding, prompt matching and logging in a single
+interpreter contend for the GIL. In process mode the parent keeps the API work
+and the scheduling (create, wire, start, verify, capture) and hands the
+console/configure stage of each node to one of `console_processes` forked
+worker processes, which run it with telnet_conn() on a thread per node.
+
+Everything flows back to the parent over one multiprocessing queue:
+    ('log', record)                          -> handled by the parent's logger
+    ('message', queue name, text)            -> put on the parent's status queue
+    ('boot', image, metric, seconds)         -> recorded in the parent's boot history
+    ('result', job ID, ok, error type, text) -> returned by run()
+Cancelling the run sets a shared event that cancels every job in every worker.
+Console sessions are closed by the worker after configuration, so later stages
+log in again from the parent (see console_relogin()).
+"""
+
+import itertools
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from exceptions import DeploymentCancelled, DeadlineExceeded, ConfigPushError
+from node_job import RunContext
+from run_control import RunControl
+from session_pool import SessionPool
+
+logger = logging.getLogger()
+
+# Status queues a console worker reports to, named as in RunContext
+MESSAGE_QUEUES = ('createnode_queue', 'starnode_queue', 'connectnode_queue', 'configure_queue', 'closeconnection_queue')
+
+
+class _ForwardingQueue:
+    """
+    Stand-in for a status queue inside a worker process.
+    """
+
+    def __init__(self, events, name):
+        self.events = events
+        self.name = name
+
+    def put(self, message):
+        self.events.put(('message', self.name, message))
+
+
+class _ForwardingBootHistory:
+    """
+    Boot history of a worker process: schedules from its own copy and sends every sample to the parent.
+    """
+
+    def __init__(self, boot_history, events):
+        self.boot_history = boot_history
+        self.events = events
+
+    def schedule(self, *args, **kwargs):
+        return self.boot_history.schedule(*args, **kwargs)
+
+    def record(self, image, metric, seconds):
+        self.boot_history.record(image, metric, seconds)
+        self.events.put(('boot', image, metric, seconds))
+
+
+class _ForwardingLogHandler(logging.handlers.QueueHandler):
+    """
+    Log handler of a worker process: sends every record to the parent's logger.
+    """
+
+    def enqueue(self, record):
+        self.queue.put(('log', record))
+
+
+class ConsoleWorkers:
+    """
+    Pool of forked processes that run the console stage of the nodes.
+    """
+
+    def __init__(self, processes, console_stage, colors, settings, boot_history, transcripts, ssh_transport, golden_configs, config_server):
+        """
+        Args:
+            processes (int or str): Number of worker processes, 'auto' for one per CPU. 0 disables process mode.
+            console_stage (function): The console stage, called as telnet_conn(port, name, ..., run).
+            colors (dict): Dictionary containing color codes for terminal output.
+            settings (dict): Optional tuning settings from the configuration file.
+            boot_history (BootHistory): Boot history store; workers schedule from a copy and report samples back.
+            transcripts (TranscriptStore): Transcript store; each worker keeps and dumps its own transcripts.
+            ssh_transport (SshTransport): SSH transport, used by the console stage for the management bootstrap.
+            golden_configs (GoldenConfigs): Golden config store, used by the console stage for paste replays.
+            config_server (ConfigServer): Config server; workers inherit the rendered files and send the pull commands.
+        """
+        if processes == 'auto':
+            processes = os.cpu_count() or 1
+        if processes and 'fork' not in multiprocessing.get_all_start_methods():
+            logger.warning("Console worker processes need the 'fork' start method, running the console stage in threads.")
+            processes = 0
+        self.processes = processes
+        self.boot_history = boot_history
+        self.queues = {}
+        self._jobs = {}
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._listener = None
+        if not self.enabled:
+            return
+
+        context = multiprocessing.get_context('fork')
+        self._events = context.Queue()
+        self._cancel = context.Event()
+        # run_threads creates this before anything that starts a thread (engines, config server, pool
+        # reapers, node workers) and pauses the profiler, so no lock is held mid-update while forking
+        for shard in range(processes):
+            tasks = context.Queue()
+            process = context.Process(
+                target=_worker_main,
+                name=f"console-worker-{shard}",
+                args=(tasks, self._events, self._cancel, console_stage, colors, settings, boot_history, transcripts, ssh_transport, golden_configs, config_server),
+                daemon=True,
+            )
+            process.start()
+            self._workers.append({'process': process, 'tasks': tasks, 'pending': 0})
+        self._listener = threading.Thread(target=self._listen, name="console-worker-events", daemon=True)
+        self._listener.start()
+        logger.info(f"Started {processes} console worker processes.")
+
+    @property
+    def enabled(self):
+        return self.processes > 0
+
+    def bind_queues(self, *queues):
+        """
+        Set the parent status queues that worker messages go to, in the order of MESSAGE_QUEUES.
+        """
+        self.queues = dict(zip(MESSAGE_QUEUES, queues))
+
+    def _listen(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            kind = event[0]
+            try:
+                if kind == 'log':
+                    logger.handle(event[1])
+                elif kind == 'message':
+                    self.queues[event[1]].put(event[2])
+                elif kind == 'boot':
+                    self.boot_history.record(*event[1:])
+                elif kind == 'result':
+                    _, job_id, ok, error_type, error = event
+                    with self._lock:
+                        job = self._jobs.pop(job_id, None)
+                    if job is not None:
+                        job['result'] = (ok, error_type, error)
+                        job['done'].set()
+            except Exception as e:
+                logger.error(f"Failed to handle console worker event {kind}: {e}")
+
+    def run(self, port, name, device_id, dev_num, node_type, dev_config_file, image, started_at, run_control):
+        """
+        Run the console stage of a node on the least busy worker process and wait for it.
+        Args:
+            port (str): The port number for the Telnet connection.
+            name (str): The name of the node.
+            device_id (str): The ID of the device.
+            dev_num (int): The device number.
+            node_type (str): Type of the node (e.g., Router, Switch).
+            dev_config_file (str): Path to the configuration file.
+            image (str): Image name of the node, used to schedule prompt waits.
+            started_at (float): time.monotonic() value taken when the node was started.
+            run_control (RunControl): Deadlines and cancellation of the run; the current deadline goes with the job.
+        Returns:
+            bool: True if the console session completed without errors.
+        """
+        # time.monotonic() is system-wide, so the deadline means the same in the worker, however
+        # long the job waits in the queue of its shard
+        deadline = run_control.deadline()
+        job = {'done': threading.Event(), 'result': None}
+        with self._lock:
+            job_id = next(self._job_ids)
+            self._jobs[job_id] = job
+            worker = min(self._workers, key=lambda candidate: candidate['pending'])
+            worker['pending'] += 1
+        node = f"{node_type} {dev_num}"
+        try:
+            worker['tasks'].put((job_id, node, deadline, port, name, device_id, dev_num, node_type, dev_config_file, image, started_at))
+            while not job['done'].wait(0.5):
+                if not worker['process'].is_alive():
+                    raise RuntimeError(f"Console worker {worker['process'].name} exited (code {worker['process'].exitcode})")
+                try:
+                    run_control.check()
+                except DeploymentCancelled:
+                    self.cancel()
+                    raise
+        finally:
+            with self._lock:
+                worker['pending'] -= 1
+                self._jobs.pop(job_id, None)
+
+        ok, error_type, error = job['result']
+        if error_type == 'DeploymentCancelled':
+            raise DeploymentCancelled(error)
+        if error_type == 'DeadlineExceeded':
+            raise DeadlineExceeded(error)
+        if error_type == 'ConfigPushError':
+            raise error
+        if error_type:
+            logger.error(f"Console stage of {node} failed in its worker process: {error_type}: {error}")
+        return ok
+
+    def cancel(self):
+        """
+        Cancel every console job in every worker process.
+        """
+        if self.enabled:
+            self._cancel.set()
+
+    def close(self, timeout=5):
+        """
+        Stop the worker processes and the event listener.
+        """
+        if not self.enabled:
+            return
+        for worker in self._workers:
+            worker['tasks'].put(None)
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker['process'].join(max(0, deadline - time.monotonic()))
+            if worker['process'].is_alive():
+                worker['process'].terminate()
+        self._events.put(None)
+        self._listener.join(timeout)
+
+
+def _worker_main(tasks, events, cancel, console_stage, colors, settings, boot_history, transcripts, ssh_transport, golden_configs, config_server):
+    # Ctrl-C reaches the whole process group; the parent decides and cancels through the shared event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_ForwardingLogHandler(events))
+
+    queues = [_ForwardingQueue(events, name) for name in MESSAGE_QUEUES]
+    boot_history = _ForwardingBootHistory(boot_history, events)
+    session_pool = SessionPool(max_sessions=0)  # Sessions cannot outlive the job: later stages run in the parent
+    lock = threading.Lock()
+    active = set()
+    jobs = []
+
+    def watch_cancel():
+        cancel.wait()
+        with lock:
+            for run_control in active:
+                run_control.cancel("Cancelled by the parent process")
+
+    threading.Thread(target=watch_cancel, name="cancel-watcher", daemon=True).start()
+
+    def run_job(job_id, node, deadline, port, name, device_id, dev_num, node_type, dev_config_file, image, started_at):
+        run_control = RunControl(run_deadline=deadline)
+        run_control.start_node(node)
+        with lock:
+            active.add(run_control)
+        if cancel.is_set():
+            run_control.cancel("Cancelled by the parent process")
+        run = RunContext(
+            response=None, headers=None, eve_node_creation_url=None, eve_start_nodes_url=None, eve_node_port=None,
+            eve_interface_connection=None, node_interface=None, network_mgmt=None,
+            **dict(zip(MESSAGE_QUEUES, queues)),
+            lock=threading.Lock(), colors=colors, settings=settings, boot_history=boot_history, transcripts=transcripts,
+            session_pool=session_pool, ssh_transport=ssh_transport, link_engine=None, run_control=run_control,
+            golden_configs=golden_configs, imported_nodes={}, console_workers=None, deployed_nodes={}, start_engine=None,
+            config_server=config_server, recover_nodes=set(),
+        )
+        ok, error_type, error = False, None, None
+        try:
+            ok = console_stage(port, name, device_id, dev_num, node_type, dev_config_file, image, started_at, run)
+        except ConfigPushError as e:
+            error_type, error = type(e).__name__, e  # Pickled whole, so the parent keeps the offending line
+        except Exception as e:
+            error_type, error = type(e).__name__, str(e)
+        finally:
+            with lock:
+                active.discard(run_control)
+        events.put(('result', job_id, ok, error_type, error))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        job = threading.Thread(target=run_job, args=task, name=task[1], daemon=True)
+        job.start()
+        jobs.append(job)
+    for job in jobs:
+        job.join()
+    events.close()
+    events.join_thread()
@@ -21,3 +21,32 @@ class TableNotFoundError(Exception):
 
 
 
+
+### Processing exceptions
+
+class DeploymentCancelled(Exception):
+    """Raised in a worker when the run was cancelled (Ctrl-C or failure threshold)."""
+    pass
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a run or stage deadline expires."""
+    pass
+
+
+class ConfigPushError(Exception):
+    """Raised when a device rejects a configuration line; the push stops at that line."""
+
+    def __init__(self, line_number, command, message, output=''):
+        super().__init__(line_number, command, message, output)
+        self.line_number = line_number
+        self.command = command
+        self.message = message
+        self.output = output
+
+    def __str__(self):
+        return f"line {self.line_number} '{self.command}' rejected: {self.message}"
+
+    def details(self):
+        """Return the error as a dictionary for the run summary."""
+        return {'line': self.line_number, 'command': self.command, 'message': self.message, 'output': self.output}
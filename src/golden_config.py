@@ -0,0 +1,253 @@
+"""
+Golden-config capture and replay.
+
+The same topology is rebuilt many times, and every build replays the workbook
+commands one by one over slow consoles. After a successful deploy, the capture
+mode saves the running configuration of every device in a local store. Later
+builds of the same topology version are deployed from those configurations,
+either as EVE-NG startup configs (the node boots configured and the console
+stage is skipped) or as a single bulk paste over the console.
+
+Store layout (`golden_config.store_dir` setting):
+    <store_dir>/<topology>/v<N>/manifest.json
+    <store_dir>/<topology>/v<N>/<node type>_<device number>.cfg
+A version is the set of configs captured from one run. It is only published
+(renamed from its `.partial` directory) once every device has been captured,
+and it is only replayed while the topology fingerprint still matches: changing
+the nodes list, a payload image, a workbook or the link file starts a new
+topology version.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import requests
+import logging
+
+logger = logging.getLogger()
+
+# Commands that print the running configuration, per node name; the last command's output is kept
+CAPTURE_COMMANDS = {
+    'vIOS': ["terminal length 0", "show running-config"],
+    'Switch': ["terminal length 0", "show running-config"],
+    'vEOS': ["terminal length 0", "show running-config"],
+    'vSRX-NG': ["show configuration | no-more"],
+}
+
+# Commands sent before and after the pasted configuration, per node name
+PASTE_WRAPPERS = {
+    'vIOS': (["configure terminal"], ["end", "write memory"]),
+    'Switch': (["configure terminal"], ["end", "write memory"]),
+    'vEOS': (["configure"], ["end", "write memory"]),
+    'vSRX-NG': (["configure", "load override terminal"], ["\x04", "commit and-quit"]),
+}
+
+# Lines of `show running-config` output that are not configuration
+NOISE_LINES = re.compile(r"^(Building configuration\.\.\.|Current configuration : \d+ bytes|end)\s*$")
+
+
+def topology_fingerprint(nodes, node_specs, links_file=None):
+    """
+    Hash everything that defines what a deploy produces.
+    Args:
+        nodes (list): List of dictionaries containing node types and their counts.
+        node_specs (dict): Node type mapped to a (payload, config workbook path) tuple.
+        links_file (str): Path of the topology link file, if any.
+    Returns:
+        str: Hex digest identifying the topology version.
+    """
+    digest = hashlib.sha256(json.dumps(nodes, sort_keys=True).encode())
+    files = [links_file] if links_file else []
+    for dev in nodes:
+        for node_type in dev:
+            if node_type not in node_specs:
+                continue
+            payload, config_file = node_specs[node_type]
+            digest.update(json.dumps([node_type, payload.get('template'), payload.get('image')]).encode())
+            files.append(config_file)
+    for path in files:
+        try:
+            with open(path, 'rb') as source:
+                digest.update(hashlib.sha256(source.read()).digest())
+        except OSError as e:
+            logger.warning(f"Could not read {path} for the topology fingerprint: {e}")
+            digest.update(path.encode())
+    return digest.hexdigest()
+
+
+def clean_config(output):
+    """
+    Strip the command echo, the trailing prompt and non-configuration lines from a capture.
+    Args:
+        output (str): Console output of the capture command, up to and including the prompt.
+    Returns:
+        str: The configuration text.
+    """
+    lines = output.replace("\r", "").split("\n")
+    lines = lines[1:-1]  # Echoed command and the prompt that ended the output
+    lines = [line for line in lines if not NOISE_LINES.match(line)]
+    while lines and not lines[0].strip():
+        lines.pop(0)
+    return "\n".join(lines).rstrip() + "\n"
+
+
+def paste_commands(name, config):
+    """
+    Wrap a captured configuration in the commands that apply it in one paste.
+    Args:
+        name (str): The name of the node (e.g. 'vIOS').
+        config (str): The captured configuration.
+    Returns:
+        list: The lines to send.
+    """
+    before, after = PASTE_WRAPPERS[name]
+    lines = [line for line in config.split("\n") if line.strip() and not line.lstrip().startswith('!')]
+    return before + lines + after
+
+
+class GoldenConfigs:
+    """
+    Versioned local store of captured device configurations for one topology.
+    """
+
+    def __init__(self, settings, fingerprint, eve_lab_url, response, headers, lab_lock, http_timeout=None):
+        """
+        Args:
+            settings (dict): Tuning settings; configured by the `golden_config` entry
+                (`mode`: off, capture, replay or auto; `store_dir`; `topology`; `method`: startup or paste).
+            fingerprint (str): Topology fingerprint from topology_fingerprint().
+            eve_lab_url (str): URL of the lab, used to upload startup configs.
+            response (requests.Response): Response object from the EVE-NG login.
+            headers (dict): Headers for API requests.
+            lab_lock (threading.Lock): Lock that serializes writes to the lab.
+            http_timeout (float): Timeout of each API call in seconds.
+        """
+        golden_settings = settings.get('golden_config', {})
+        mode = golden_settings.get('mode', 'off')
+        self.method = golden_settings.get('method', 'startup')
+        self.fingerprint = fingerprint
+        self.eve_lab_url = eve_lab_url
+        self.response = response
+        self.headers = headers
+        self.lab_lock = lab_lock
+        self.http_timeout = http_timeout
+        self.topology_dir = os.path.join(golden_settings.get('store_dir', 'golden_configs'), golden_settings.get('topology', 'default'))
+        self.version_dir = None
+        self.manifest = None
+        self.captured = {}
+        self._lock = threading.Lock()
+
+        if mode in ('replay', 'auto'):
+            self.version_dir, self.manifest = self._find_version()
+            if self.version_dir is None and mode == 'replay':
+                logger.warning(f"No golden configs for topology version {fingerprint[:12]} in {self.topology_dir}, deploying from the workbooks.")
+        self.replaying = self.version_dir is not None
+        self.capturing = mode == 'capture' or (mode == 'auto' and not self.replaying)
+        if self.replaying:
+            logger.info(f"Replaying golden configs from {self.version_dir} ({self.method}).")
+
+    def _versions(self):
+        if not os.path.isdir(self.topology_dir):
+            return []
+        versions = [entry for entry in os.listdir(self.topology_dir) if re.fullmatch(r"v\d+", entry)]
+        return sorted(versions, key=lambda entry: int(entry[1:]))
+
+    def _find_version(self):
+        # Newest published version captured from the same topology version
+        for version in reversed(self._versions()):
+            version_dir = os.path.join(self.topology_dir, version)
+            try:
+                with open(os.path.join(version_dir, 'manifest.json'), 'r') as manifest_file:
+                    manifest = json.load(manifest_file)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping golden config version {version_dir}: {e}")
+                continue
+            if manifest.get('fingerprint') == self.fingerprint:
+                return version_dir, manifest
+        return None, None
+
+    def replay_config(self, node_type, dev_num):
+        """
+        Return the captured configuration of a device, or None to deploy it from the workbook.
+        """
+        if not self.replaying:
+            return None
+        device = self.manifest['devices'].get(f"{node_type} {dev_num}")
+        if device is None:
+            return None
+        with open(os.path.join(self.version_dir, device['file']), 'r') as config_file:
+            config = config_file.read()
+        if hashlib.sha256(config.encode()).hexdigest() != device['sha256']:
+            logger.error(f"Golden config of {node_type} {dev_num} does not match its checksum, deploying from the workbook.")
+            return None
+        return config
+
+    def upload_startup_config(self, device_id, config, run_control=None):
+        """
+        Store a configuration as the EVE-NG startup config of a node.
+        The node must be created with `"config": "1"` to boot from it.
+        `run_control` caps the upload by the run and stage deadlines.
+        """
+        with self.lab_lock:
+            config_api = requests.put(
+                f"{self.eve_lab_url}/configs/{device_id}", json={"id": device_id, "data": config},
+                headers=self.headers, cookies=self.response.cookies,
+                timeout=run_control.timeout(self.http_timeout) if run_control else self.http_timeout,
+            )
+        if config_api.status_code not in (200, 201):
+            raise ValueError(f"Failed to upload startup config of node {device_id}: {config_api.text}")
+
+    def save(self, node_type, dev_num, name, image, config):
+        """
+        Keep the captured configuration of a device for the version being captured.
+        """
+        file_name = f"{node_type.replace(' ', '_')}_{dev_num}.cfg"
+        with self._lock:
+            staging_dir = self._staging_dir()
+            with open(os.path.join(staging_dir, file_name), 'w') as config_file:
+                config_file.write(config)
+            self.captured[f"{node_type} {dev_num}"] = {
+                'file': file_name,
+                'name': name,
+                'image': image,
+                'sha256': hashlib.sha256(config.encode()).hexdigest(),
+            }
+        logger.info(f"Captured golden config of {node_type} {dev_num} ({len(config)} bytes).")
+
+    def _staging_dir(self):
+        staging_dir = os.path.join(self.topology_dir, f".partial-{os.getpid()}")
+        os.makedirs(staging_dir, exist_ok=True)
+        return staging_dir
+
+    def publish(self, expected):
+        """
+        Publish the captured configs as a new version if every device was captured.
+        Args:
+            expected (int): Number of devices in the topology.
+        Returns:
+            str: The new version directory, or None if the capture was incomplete.
+        """
+        if not self.capturing or not self.captured:
+            return None
+        staging_dir = self._staging_dir()
+        if len(self.captured) < expected:
+            logger.warning(f"Golden config capture incomplete ({len(self.captured)}/{expected} devices), not publishing a version.")
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            self.captured = {}
+            return None
+        manifest = {
+            'fingerprint': self.fingerprint,
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'devices': self.captured,
+        }
+        with open(os.path.join(staging_dir, 'manifest.json'), 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        versions = self._versions()
+        version_dir = os.path.join(self.topology_dir, f"v{int(versions[-1][1:]) + 1 if versions else 1}")
+        os.replace(staging_dir, version_dir)
+        logger.info(f"Published golden config version {version_dir}.")
+        return version_dir
@@ -0,0 +1,60 @@
+"""
+Deployment inventory: which EVE-NG node ID each device of the topology got.
+
+Nodes share their payload name (every router is `vIOS`), so the lab alone
+cannot tell which node is `Cisco Router 2`. Each run records the device ID of
+every node it brought up, and incremental runs look them up here.
+"""
+
+import json
+import os
+import logging
+
+logger = logging.getLogger()
+
+
+def load_inventory(inventory_file, eve_lab_url):
+    """
+    Load the device IDs recorded for a lab.
+    Args:
+        inventory_file (str): Path of the inventory JSON file.
+        eve_lab_url (str): URL of the lab; an inventory written for another lab is ignored.
+    Returns:
+        dict: "<node type> <device number>" mapped to the node ID.
+    """
+    if not inventory_file or not os.path.exists(inventory_file):
+        return {}
+    try:
+        with open(inventory_file, 'r') as inventory:
+            data = json.load(inventory)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable inventory {inventory_file}: {e}")
+        return {}
+    if data.get('lab') != eve_lab_url:
+        logger.warning(f"Inventory {inventory_file} was written for {data.get('lab')}, not {eve_lab_url}.")
+        return {}
+    return {node: entry['device_id'] for node, entry in data.get('nodes', {}).items()}
+
+
+def save_inventory(inventory_file, eve_lab_url, summary):
+    """
+    Record the device ID of every node that exists in the lab.
+    Failed nodes are kept too: they exist, and an incremental run fixes their configuration.
+    Args:
+        inventory_file (str): Path of the inventory JSON file.
+        eve_lab_url (str): URL of the lab.
+        summary (dict): Per-node progress from RunControl.summary().
+    """
+    if not inventory_file:
+        return
+    nodes = {
+        node: {'device_id': progress['device_id']}
+        for node, progress in summary.items()
+        if progress.get('device_id') is not None
+    }
+    os.makedirs(os.path.dirname(inventory_file) or '.', exist_ok=True)
+    temp_file = f"{inventory_file}.tmp"
+    with open(temp_file, 'w') as inventory:
+        json.dump({'lab': eve_lab_url, 'nodes': nodes}, inventory, indent=2)
+    os.replace(temp_file, inventory_file)
+    logger.info(f"Saved the device IDs of {len(nodes)} nodes to {inventory_file}.")
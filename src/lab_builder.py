@@ -0,0 +1,203 @@
+"""
+Offline lab-file builder and one-shot lab import.
+
+Creating nodes through the API costs several round-trips per node (create,
+interface GET, management network GET, interface PUT), and every mutation
+waits for the lock on the `.unl` file. The builder instead renders the whole
+lab definition locally (nodes with their canvas positions, the management
+network, one bridge network per topology link, the interface attachments and
+embedded startup configs) and uploads it with a single import call. Node IDs
+are assigned by the builder, so the workers go straight to starting nodes.
+
+An existing lab with the same name is only deleted when `replace_existing`
+is set; otherwise the import stops before touching it.
+"""
+
+import base64
+import io
+import uuid
+import zipfile
+import xml.etree.ElementTree as ET
+import requests
+import logging
+from links import link_networks, network_position
+
+logger = logging.getLogger()
+
+# Canvas grid used to place the nodes: one row per node type, one column per device
+NODE_GRID_SPACING = 120
+
+# Payload fields copied to the <node> element
+NODE_ATTRIBUTES = ('type', 'template', 'image', 'name', 'icon', 'console', 'cpu', 'ram', 'ethernet', 'delay')
+
+
+def lab_location(eve_lab_url):
+    """
+    Split a lab URL into the API base URL, the lab folder and the lab name.
+    Args:
+        eve_lab_url (str): URL of the lab (e.g. http://192.168.0.119/api/labs/Ansiblelab.unl).
+    Returns:
+        tuple: (base URL, folder, lab name), e.g. ('http://192.168.0.119', '/', 'Ansiblelab').
+    """
+    base_url, lab_path = eve_lab_url.split('/api/labs/', 1)
+    folder, _, file_name = lab_path.rpartition('/')
+    return base_url, f"/{folder}", file_name[:-len('.unl')] if file_name.endswith('.unl') else file_name
+
+
+def grid_positions(nodes, node_specs):
+    """
+    Lay nodes out on a grid: one row per node type, starting at the payload's left / top.
+    Args:
+        nodes (list): List of dictionaries containing node types and their counts.
+        node_specs (dict): Node type mapped to a (payload, config workbook path) tuple.
+    Returns:
+        dict: "<node type> <device number>" mapped to a (left, top) tuple.
+    """
+    positions = {}
+    row = 0
+    for dev in nodes:
+        for node_type, count in dev.items():
+            if node_type not in node_specs:
+                continue
+            payload, _ = node_specs[node_type]
+            for dev_num in range(count):
+                positions[f"{node_type} {dev_num}"] = (
+                    int(payload.get('left', 300)) + dev_num * NODE_GRID_SPACING,
+                    int(payload.get('top', 125)) + row * NODE_GRID_SPACING,
+                )
+            row += 1
+    return positions
+
+
+def build_lab(lab_name, nodes, node_specs, links, mgmt_network, startup_configs=None, positions=None):
+    """
+    Render the complete lab definition.
+    Args:
+        lab_name (str): Name of the lab.
+        nodes (list): List of dictionaries containing node types and their counts.
+        node_specs (dict): Node type mapped to a (payload, config workbook path) tuple.
+        links (list): Topology link dictionaries (see links.py).
+        mgmt_network (dict): Management network: `id`, `name` and `type` (e.g. pnet0).
+        startup_configs (dict): "<node type> <device number>" mapped to a startup config to embed.
+        positions (dict): "<node type> <device number>" mapped to its canvas (left, top); defaults to grid_positions().
+    Returns:
+        tuple: (.unl XML as bytes, dict of "<node type> <device number>" mapped to the node ID).
+    """
+    startup_configs = startup_configs or {}
+    positions = positions or grid_positions(nodes, node_specs)
+    lab = ET.Element('lab', {'name': lab_name, 'id': str(uuid.uuid4()), 'version': '1', 'scripttimeout': '300', 'lock': '0'})
+    topology = ET.SubElement(lab, 'topology')
+    nodes_element = ET.SubElement(topology, 'nodes')
+    networks_element = ET.SubElement(topology, 'networks')
+    configs_element = ET.SubElement(ET.SubElement(lab, 'objects'), 'configs')
+
+    # Nodes, each with its management interface
+    mgmt_id = str(mgmt_network['id'])
+    device_ids = {}
+    interfaces = {}
+    node_elements = {}
+    for dev in nodes:
+        for node_type, count in dev.items():
+            if node_type not in node_specs:
+                logger.warning(f"Unsupported node type {node_type} left out of the lab file")
+                continue
+            payload, _ = node_specs[node_type]
+            for dev_num in range(count):
+                key = f"{node_type} {dev_num}"
+                device_id = str(len(device_ids) + 1)
+                left, top = positions[key]
+                attributes = {field: str(payload[field]) for field in NODE_ATTRIBUTES if field in payload}
+                attributes.update({
+                    'id': device_id,
+                    'uuid': str(uuid.uuid4()),
+                    'left': str(left),
+                    'top': str(top),
+                    'config': '1' if key in startup_configs else '0',
+                })
+                node_elements[key] = ET.SubElement(nodes_element, 'node', attributes)
+                if key in startup_configs:
+                    config_element = ET.SubElement(configs_element, 'config', {'id': device_id})
+                    config_element.text = base64.b64encode(startup_configs[key].encode()).decode('ascii')
+                device_ids[key] = device_id
+                interfaces[key] = {'0': mgmt_id}
+
+    # Management network, then one bridge network per link
+    mgmt_left, mgmt_top = network_position(0)
+    ET.SubElement(networks_element, 'network', {
+        'id': mgmt_id, 'type': mgmt_network.get('type', 'pnet0'), 'name': mgmt_network.get('name', 'Mgmt'),
+        'left': str(mgmt_left), 'top': str(mgmt_top - NODE_GRID_SPACING), 'visibility': '1',
+    })
+    next_network_id = 1
+    for position, (number, name, endpoints) in enumerate(link_networks(links, device_ids)):
+        while str(next_network_id) == mgmt_id:
+            next_network_id += 1
+        network_id = str(next_network_id)
+        next_network_id += 1
+        left, top = network_position(position)
+        ET.SubElement(networks_element, 'network', {
+            'id': network_id, 'type': 'bridge', 'name': name, 'left': str(left), 'top': str(top),
+            'visibility': '0' if name.startswith('p2p-') else '1',
+        })
+        for node, interface in endpoints:
+            if interface in interfaces[node]:
+                logger.warning(f"Interface {interface} of {node} is used by more than one link, keeping the last one")
+            interfaces[node][interface] = network_id
+
+    # Interface attachments; EVE-NG matches them to the template interfaces by ID
+    for key, interface_map in interfaces.items():
+        for interface, network_id in sorted(interface_map.items(), key=lambda item: int(item[0])):
+            ET.SubElement(node_elements[key], 'interface', {
+                'id': interface, 'name': f"e{interface}", 'type': 'ethernet', 'network_id': network_id,
+            })
+
+    lab_xml = b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n' + ET.tostring(lab, encoding='utf-8')
+    return lab_xml, device_ids
+
+
+def import_lab(eve_lab_url, lab_xml, response, headers, replace_existing=False, timeout=None):
+    """
+    Upload a lab definition with the EVE-NG import API.
+    Args:
+        eve_lab_url (str): URL of the lab; its folder and name decide where the lab is imported.
+        lab_xml (bytes): The .unl content from build_lab().
+        response (requests.Response): Response object from the EVE-NG login.
+        headers (dict): Headers for API requests.
+        replace_existing (bool): Delete the existing lab of the same name first. When False,
+            an existing lab makes the import fail.
+        timeout (float): Timeout of each API call in seconds.
+    Returns:
+        int: Number of API calls made.
+    """
+    base_url, folder, lab_name = lab_location(eve_lab_url)
+    api_calls = 0
+    if replace_existing:
+        delete_api = requests.delete(eve_lab_url, headers=headers, cookies=response.cookies, timeout=timeout)
+        api_calls += 1
+        if delete_api.status_code not in (200, 404):
+            raise ValueError(f"Failed to delete the existing lab {lab_name}: {delete_api.text}")
+    else:
+        existing_api = requests.get(eve_lab_url, headers=headers, cookies=response.cookies, timeout=timeout)
+        api_calls += 1
+        if existing_api.status_code == 200:
+            raise ValueError(
+                f"Lab {lab_name} already exists in {folder}; delete it, choose another name in eve_lab_url "
+                f"or set \"replace_existing\": true in lab_build to replace it"
+            )
+        if existing_api.status_code != 404:
+            raise ValueError(f"Failed to check for an existing lab {lab_name}: {existing_api.text}")
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as lab_zip:
+        lab_zip.writestr(f"{lab_name}.unl", lab_xml)
+    # Multipart upload: the JSON content type of the other API calls must not be sent
+    upload_headers = {name: value for name, value in headers.items() if name.lower() != 'content-type'}
+    import_api = requests.post(
+        f"{base_url}/api/import", data={'path': folder},
+        files={'file': (f"{lab_name}.zip", archive.getvalue(), 'application/zip')},
+        headers=upload_headers, cookies=response.cookies, timeout=timeout,
+    )
+    api_calls += 1
+    if import_api.status_code != 200:
+        raise ValueError(f"Failed to import lab {lab_name}: {import_api.text}")
+    logger.info(f"Imported lab {lab_name} into {folder} with {api_calls} API calls ({len(lab_xml)} bytes).")
+    return api_calls
@@ -0,0 +1,231 @@
+"""
+Batched topology link wiring.
+
+Reads the link list of the whole topology, creates every bridge network the
+links need in one pass and then applies each node's complete interface map
+(management interface included) with a single PUT per node. All lab mutations
+go through the shared lab-write lock, the same one node creation uses, so
+wiring never races a node creation on the lab file.
+
+Link file format (`topology_links_file` setting):
+    {
+        "links": [
+            {"type": "p2p", "endpoints": [["Cisco Router 0", 1], ["Cisco Switch 0", 1]]},
+            {"type": "lan", "name": "vlan10", "endpoints": [["Cisco Switch 0", 2], ["Arista Switch 0", 1], ["Juniper Firewall 0", 1]]}
+        ]
+    }
+Endpoints are "<node type> <device number>" and the EVE-NG interface index.
+An optional "positions" key maps nodes to their canvas [left, top]; generated
+topologies (topology_generator.py) always include it.
+"""
+
+import json
+import threading
+import requests
+import logging
+
+logger = logging.getLogger()
+
+# Canvas grid used to place the generated bridge networks
+NETWORK_GRID_COLUMNS = 20
+NETWORK_GRID_SPACING = 60
+
+
+def load_links(links_file):
+    """
+    Load and validate a topology link file.
+    Args:
+        links_file (str): Path to the JSON link file.
+    Returns:
+        list: The link dictionaries.
+    """
+    with open(links_file, 'r') as links_json:
+        links = json.load(links_json).get('links', [])
+    for number, link in enumerate(links):
+        endpoints = link.get('endpoints', [])
+        if link.get('type', 'p2p') == 'p2p' and len(endpoints) != 2:
+            raise ValueError(f"Point-to-point link {number} must have exactly 2 endpoints, found {len(endpoints)}")
+        if len(endpoints) < 2:
+            raise ValueError(f"Link {number} must have at least 2 endpoints")
+    return links
+
+
+def load_positions(links_file):
+    """
+    Load the node canvas positions of a topology link file, if it has any.
+    Returns:
+        dict: "<node type> <device number>" mapped to a (left, top) tuple.
+    """
+    with open(links_file, 'r') as links_json:
+        positions = json.load(links_json).get('positions', {})
+    return {node: (int(left), int(top)) for node, (left, top) in positions.items()}
+
+
+def link_networks(links, available):
+    """
+    Resolve the bridge network of every link whose endpoints all exist.
+    Args:
+        links (list): Link dictionaries (see the module docstring).
+        available (collection): Keys ("<node type> <device number>") of the nodes that exist.
+    Returns:
+        list: (link number, network name, [(node key, interface index as str), ...]) tuples.
+    """
+    networks = []
+    for number, link in enumerate(links):
+        endpoints = [(node, str(interface)) for node, interface in link['endpoints']]
+        missing = [node for node, _ in endpoints if node not in available]
+        if missing:
+            logger.warning(f"Skipping link {number}: nodes not created {missing}")
+            continue
+        if link.get('type', 'p2p') == 'p2p':
+            name = link.get('name') or f"p2p-{endpoints[0][0]}-{endpoints[0][1]}-{endpoints[1][0]}-{endpoints[1][1]}".replace(' ', '_')
+        else:
+            name = link.get('name') or f"lan-{number}"
+        networks.append((number, name, endpoints))
+    return networks
+
+
+def network_position(position):
+    """
+    Return the canvas (left, top) of the n-th generated bridge network.
+    """
+    return 50 + (position % NETWORK_GRID_COLUMNS) * NETWORK_GRID_SPACING, 450 + (position // NETWORK_GRID_COLUMNS) * NETWORK_GRID_SPACING
+
+
+class LinkEngine:
+    """
+    Collects created nodes and wires the whole topology once all of them exist.
+    """
+
+    def __init__(self, links, nodes, eve_lab_url, network_mgmt, response, headers, lab_lock, http_timeout=None, run_control=None):
+        """
+        Args:
+            links (list): Link dictionaries (see the module docstring). An empty list disables the engine.
+            nodes (list): List of dictionaries containing node types and their counts.
+            eve_lab_url (str): URL of the lab (e.g. .../api/labs/Ansiblelab.unl).
+            network_mgmt (str): URL of the management network; its last path element is the network ID.
+            response (requests.Response): Response object from the EVE-NG login.
+            headers (dict): Headers for API requests.
+            lab_lock (threading.Lock): Lock that serializes writes to the lab.
+            http_timeout (float): Timeout of each API call in seconds. None waits without limit.
+            run_control (RunControl): Deadlines and cancellation of the run; caps every API call.
+        """
+        self.links = links
+        self.eve_lab_url = eve_lab_url
+        self.mgmt_network_id = network_mgmt.rstrip('/').rsplit('/', 1)[-1]
+        self.response = response
+        self.headers = headers
+        self.lab_lock = lab_lock
+        self.http_timeout = http_timeout
+        self.run_control = run_control
+        self.expected = {f"{node_type} {dev_num}" for dev in nodes for node_type, count in dev.items() for dev_num in range(count)}
+        self.device_ids = {}
+        self.failed = set()
+        self.api_calls = 0
+        self._condition = threading.Condition()
+        self._wired = False
+        self._wiring_error = None
+
+    @property
+    def enabled(self):
+        return bool(self.links)
+
+    def node_created(self, node_type, dev_num, device_id):
+        self._node_done(f"{node_type} {dev_num}", device_id)
+
+    def node_failed(self, node_type, dev_num):
+        self._node_done(f"{node_type} {dev_num}", None)
+
+    def _node_done(self, key, device_id):
+        if not self.enabled:
+            return
+        with self._condition:
+            if key in self.device_ids or key in self.failed:
+                return
+            if device_id is None:
+                self.failed.add(key)
+            else:
+                self.device_ids[key] = device_id
+            # The last node to finish wires the topology for everyone
+            run_wiring = len(self.device_ids) + len(self.failed) == len(self.expected)
+        if run_wiring:
+            try:
+                self.wire()
+            except Exception as e:
+                logger.error(f"Topology wiring failed: {e}")
+                self._wiring_error = e
+            with self._condition:
+                self._wired = True
+                self._condition.notify_all()
+
+    def wait_until_wired(self, timeout=None):
+        """
+        Block until the topology is wired.
+        Args:
+            timeout (float): Seconds to wait. None waits without limit.
+        Returns:
+            bool: True once the topology is wired, False if the wait timed out.
+        Raises:
+            RuntimeError: If wiring failed.
+        """
+        if not self.enabled:
+            return True
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._wired, timeout):
+                return False
+        if self._wiring_error:
+            raise RuntimeError(f"Topology wiring failed: {self._wiring_error}")
+        return True
+
+    def _timeout(self):
+        # Taken once the lab lock is held, so the wait for the lock counts against the deadline
+        return self.run_control.timeout(self.http_timeout) if self.run_control else self.http_timeout
+
+    def _post_network(self, name, position):
+        left, top = network_position(position)
+        payload = {
+            "count": 1,
+            "name": name,
+            "type": "bridge",
+            "left": left,
+            "top": top,
+            "visibility": 0 if name.startswith("p2p-") else 1,
+            "postfix": 0,
+        }
+        with self.lab_lock:
+            network_api = requests.post(f"{self.eve_lab_url}/networks", json=payload, headers=self.headers, cookies=self.response.cookies, timeout=self._timeout())
+        self.api_calls += 1
+        if network_api.status_code not in (200, 201):
+            raise ValueError(f"Failed to create network {name}: {network_api.text}")
+        return str(network_api.json()['data']['id'])
+
+    def wire(self):
+        """
+        Create the networks of every link, then PUT each node's interface map once.
+        Links with an endpoint on a failed node are skipped.
+        Returns:
+            int: Number of API calls made.
+        """
+        interface_maps = {key: {"0": self.mgmt_network_id} for key in self.device_ids}
+        for position, (number, name, endpoints) in enumerate(link_networks(self.links, self.device_ids)):
+            network_id = self._post_network(name, position)
+            for node, interface in endpoints:
+                if interface in interface_maps[node]:
+                    logger.warning(f"Interface {interface} of {node} is used by more than one link, keeping the last one")
+                interface_maps[node][interface] = network_id
+            logger.info(f"Created network {name} (ID {network_id}) for link {number}.")
+
+        for node, interface_map in interface_maps.items():
+            device_id = self.device_ids[node]
+            with self.lab_lock:
+                interface_api = requests.put(
+                    f"{self.eve_lab_url}/nodes/{device_id}/interfaces",
+                    data=json.dumps(interface_map), headers=self.headers, cookies=self.response.cookies,
+                    timeout=self._timeout(),
+                )
+            self.api_calls += 1
+            if interface_api.status_code not in (200, 201):
+                raise ValueError(f"Failed to wire {node} (ID {device_id}): {interface_api.text}")
+            logger.info(f"Connected {node} with ID {device_id} interfaces {sorted(interface_map)}.")
+        logger.info(f"Wired {len(self.links)} links on {len(interface_maps)} nodes with {self.api_calls} API calls.")
+        return self.api_calls
@@ -9,8 +9,15 @@ GitHub: https://github.com/jotape75
 """
 
 import logging
+import argparse
 from utils import file_path, gather_valid_creds, display_message, color_text
 from processing import user_auth, run_threads, threading_process
+from boot_history import BootHistory
+from planner import build_plan, print_plan
+from profiler import SamplingProfiler
+from preflight import run_preflight, print_preflight
+from watch import LabWatcher
+from topology_generator import generate_topology, size_payloads, write_topology
 import datetime
 
 # Configure logging
@@ -24,6 +31,48 @@ logging.basicConfig(
     datefmt="%Y-%m-%d %H:%M:%S"  # Date format
 )
 
+def parse_args():
+    """
+    Parse the command line options.
+
+    Returns:
+        argparse.Namespace: The parsed options.
+    """
+    parser = argparse.ArgumentParser(description="EVE-NG multiple vendor automated device deployment")
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Estimate API calls, console commands and wall-clock time without touching the EVE-NG server",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Sample the stacks of all threads during the run and write collapsed stacks for flame graphs",
+    )
+    parser.add_argument(
+        "--profile-interval",
+        type=float,
+        default=50,
+        help="Milliseconds between profiler samples (default: 50)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Push only the lines that differ from the running config of nodes deployed by an earlier run",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="After the deployment, keep polling the lab and restart and reconfigure nodes that stop",
+    )
+    parser.add_argument(
+        "--skip-preflight",
+        action="store_true",
+        help="Start deploying without checking the lab, templates, images, payloads and workbooks first",
+    )
+    return parser.parse_args()
+
+
 def main():
 
     """
@@ -44,10 +93,24 @@ def main():
         - Calls `user_auth(eve_API_creds, eve_ng_url_login, eve_authorization_header, colors)` 
           to authenticate with the EVE-NG API and obtain a session token.
 
-    4. Deploys and configures devices:
+    4. Runs the preflight checks:
+        - Calls `run_preflight()` to check the session, lab, management network, templates,
+          images, payloads and workbooks concurrently. Nothing is deployed if a check fails.
+
+    5. Deploys and configures devices:
         - Calls `run_threads()` to handle the creation, starting, connecting, and configuration 
           of devices in EVE-NG using multithreading.
 
+    With the `topology_generator` setting, the `nodes` list, the topology links
+    and the node layout are generated by `generate_topology()` before step 3.
+    With `--plan`, steps 3 to 5 are replaced by `build_plan()` and `print_plan()`,
+    which estimate the run from the workbooks and the recorded stage timings.
+    With `--profile`, steps 3 to 5 run under a `SamplingProfiler`.
+    With `--incremental`, step 5 only pushes configuration changes to the nodes
+    recorded in the deployment inventory.
+    With `--watch`, step 5 is followed by a `LabWatcher` that polls the lab and
+    recovers stopped nodes with `run_threads()` until interrupted.
+
     Args:
         None
 
@@ -67,6 +130,8 @@ def main():
         {'Juniper Firewall': 2}
     ]
 
+    args = parse_args()
+
     try:
         # Display the introductory message
         colors = color_text()  # Get color codes
@@ -89,12 +154,47 @@ def main():
             eve_interface_connection,
             node_interface,
             network_mgmt,
+            eve_lab_url,
             router_config,
             switch_config,
             aristasw_config,
             juniperfw_config,
+            settings,
         ) = file_path()
 
+        node_specs = {
+            'Cisco Router': (router_payload, router_config),
+            'Cisco Switch': (switch_payload, switch_config),
+            'Arista Switch': (aristasw_payload, aristasw_config),
+            'Juniper Firewall': (juniperfw_payload, juniperfw_config),
+        }
+
+        # Replace the nodes list with a generated topology and use its links and layout
+        generator = settings.get('topology_generator', {})
+        if generator.get('kind', 'off') != 'off':
+            topology = generate_topology(generator, node_specs)
+            size_payloads(topology, node_specs)
+            write_topology(generator['output_file'], topology)
+            nodes = topology['nodes']
+            settings['topology_links_file'] = generator['output_file']
+            print(f'{colors.get("green")}Generated {topology["kind"]} topology: {colors.get("reset")}{len(topology["positions"])} nodes, {len(topology["links"])} links\n')
+
+        if args.plan:
+            # Dry run: estimate the deployment from local files only
+            boot_history = BootHistory(settings.get('boot_history_file'))
+            print_plan(build_plan(
+                nodes, node_specs, boot_history,
+                settings.get('lab_build', {}).get('mode', 'api'),
+                settings.get('node_start', {}).get('mode', 'lab'),
+            ), colors)
+            return
+
+        # Sample every thread for the whole run
+        profiler = None
+        if args.profile:
+            profiler = SamplingProfiler(settings.get('profile_dir', 'profile'), interval=args.profile_interval / 1000)
+            profiler.start()
+
         # Authenticate with EVE-NG
         eve_API_creds = gather_valid_creds(data["creds"])
         response, headers = user_auth(
@@ -103,28 +203,62 @@ def main():
             eve_authorization_header, 
             colors
         )
+
+        # Validate everything the deployment depends on before any node is created
+        if not args.skip_preflight:
+            results = run_preflight(nodes, node_specs, response, headers, eve_lab_url, network_mgmt, settings)
+            print_preflight(results, colors)
+            if not all(passed for _, passed, _ in results):
+                print(f'{colors.get("red")}Preflight failed, no nodes were created.{colors.get("reset")}')
+                if profiler is not None:
+                    profiler.stop()
+                return
+
         # Run threads for node creation and configuration
-        run_threads(
-            nodes,
-            response,
-            threading_process,
-            headers,
-            router_payload,
-            switch_payload,
-            aristasw_payload,
-            juniperfw_payload,
-            eve_node_creation_url,
-            eve_start_nodes_url,
-            eve_node_port,
-            eve_interface_connection,
-            node_interface,
-            network_mgmt,
-            router_config,
-            switch_config,
-            aristasw_config,
-            juniperfw_config,
-            colors,
-        )
+        def deploy(session, **options):
+            return run_threads(
+                nodes,
+                session,
+                threading_process,
+                headers,
+                router_payload,
+                switch_payload,
+                aristasw_payload,
+                juniperfw_payload,
+                eve_node_creation_url,
+                eve_start_nodes_url,
+                eve_node_port,
+                eve_interface_connection,
+                node_interface,
+                network_mgmt,
+                eve_lab_url,
+                router_config,
+                switch_config,
+                aristasw_config,
+                juniperfw_config,
+                colors,
+                settings,
+                **options,
+            )
+
+        try:
+            deploy(response, profiler=profiler, incremental=args.incremental)
+        finally:
+            # Write the profile even when the run fails or is interrupted
+            if profiler is not None:
+                profile_dir = profiler.stop()
+                print(f'\n{colors.get("green")}Profile written to: {colors.get("reset")}{profile_dir}')
+
+        # Keep the lab running: poll it and recover the nodes that stop
+        if args.watch:
+            print(f'\n{colors.get("green")}Watching the lab, press Ctrl-C to stop: {colors.get("reset")}{eve_lab_url}')
+            watcher = LabWatcher(
+                eve_lab_url, eve_node_creation_url, response, headers, settings,
+                recover=lambda due: deploy(watcher.response, incremental=True, recover_nodes=due),
+                login=lambda: user_auth(eve_API_creds, eve_ng_url_login, eve_authorization_header, colors)[0],
+                http_timeout=settings.get('http_timeout', 30),
+            )
+            watcher.run()
 
     except FileNotFoundError as e:
         logging.error(f"File not found: {e}")
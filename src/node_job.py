@@ -0,0 +1,123 @@
+"""
+Immutable records handed to the node worker threads.
+
+NodeJob describes one device. It keeps a read-only view of its type's payload,
+shared by all devices of the type, and the few fields of its own (canvas
+position, startup config flag) as overrides. payload() builds the dict for a
+request on demand, so every request gets a private copy and the shared
+payload is never written. Changing a field returns a new job (copy-on-write).
+create_nodes() already posted a per-request copy since the canvas positions
+were added; the job makes that the only way to get at a payload.
+
+RunContext holds the run's shared objects in one immutable record. It is
+passed to every stage function as is, and the stages read the fields they
+need by name (`run.settings`, `run.run_control`), so adding a field does not
+touch any of them. Both are named tuples: no per-instance dict, so thousands
+of queued jobs stay small.
+"""
+
+from __future__ import annotations
+
+from queue import Queue
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Mapping, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    import threading
+    import requests
+    from boot_history import BootHistory
+    from console_capture import TranscriptStore
+    from console_workers import ConsoleWorkers
+    from golden_config import GoldenConfigs
+    from links import LinkEngine
+    from config_server import ConfigServer
+    from run_control import RunControl
+    from session_pool import SessionPool
+    from ssh_config import SshTransport
+    from start_engine import StartEngine
+
+
+def freeze_payload(payload):
+    """
+    Return a read-only snapshot of a payload, to be shared by the jobs of its node type.
+    """
+    return MappingProxyType(dict(payload))
+
+
+class NodeJob(NamedTuple):
+    """
+    One device of the run and the payload it is created with.
+    """
+    node_type: str
+    dev_num: int
+    config_file: str
+    base: Mapping          # Read-only payload of the node type, from freeze_payload()
+    overrides: tuple = ()  # (field, value) pairs of this device only
+
+    @property
+    def key(self):
+        return f"{self.node_type} {self.dev_num}"
+
+    def get(self, field, default=None):
+        """
+        Return a payload field, with this device's overrides applied.
+        """
+        for name, value in reversed(self.overrides):
+            if name == field:
+                return value
+        return self.base.get(field, default)
+
+    def with_payload(self, **changes):
+        """
+        Return a new job whose payload has the given fields changed.
+        """
+        return self._replace(overrides=self.overrides + tuple(changes.items()))
+
+    def payload(self, **changes):
+        """
+        Build a private payload dict for one API request.
+        Args:
+            changes: Fields set for this request only (e.g. a fresh `uuid`).
+        Returns:
+            dict: The node type's payload with the overrides and changes applied.
+        """
+        payload = dict(self.base)
+        payload.update(self.overrides)
+        payload.update(changes)
+        return payload
+
+
+class RunContext(NamedTuple):
+    """
+    Objects shared by every node of a run. Console worker processes only run the
+    console stage, so their context leaves the API and scheduling fields as None.
+    """
+    response: Optional[requests.Response]
+    headers: Optional[dict]
+    eve_node_creation_url: Optional[str]
+    eve_start_nodes_url: Optional[str]
+    eve_node_port: Optional[str]
+    eve_interface_connection: Optional[str]
+    node_interface: Optional[str]
+    network_mgmt: Optional[str]
+    createnode_queue: Queue
+    starnode_queue: Queue
+    connectnode_queue: Queue
+    configure_queue: Queue
+    closeconnection_queue: Queue
+    lock: threading.Lock
+    colors: dict
+    settings: dict
+    boot_history: BootHistory
+    transcripts: TranscriptStore
+    session_pool: SessionPool
+    ssh_transport: SshTransport
+    link_engine: Optional[LinkEngine]
+    run_control: RunControl
+    golden_configs: GoldenConfigs
+    imported_nodes: dict
+    console_workers: Optional[ConsoleWorkers]
+    deployed_nodes: dict
+    start_engine: Optional[StartEngine]
+    config_server: ConfigServer
+    recover_nodes: set
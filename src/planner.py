@@ -0,0 +1,197 @@
+"""
+Deployment plan / dry-run estimate.
+
+Resolves the `nodes` list against the payloads and configuration workbooks and
+estimates, without contacting the EVE-NG server, how many API calls and console
+commands each stage issues, how long the run should take and how much of that
+time is spent in fixed sleeps.
+"""
+
+import math
+import pandas as pd
+import logging
+
+logger = logging.getLogger()
+
+# API calls per node outside of start polling: create POST, interface GET,
+# management network GET, interface PUT, start GET (per-node start mode only) and console port GET
+CREATE_API_CALLS = 4
+START_API_CALLS = 1
+PORT_API_CALLS = 1
+
+# API calls of a lab-wide start: the node list check, then one start for every node of the lab
+LAB_START_API_CALLS = 2
+
+# API calls of an offline-built lab: check for (or delete) the old lab and import the new one
+IMPORT_API_CALLS = 2
+
+# Console writes and fixed sleeps of each login flow in telnet_conn, keyed by node name
+LOGIN_COMMANDS = {'vIOS': 5, 'Switch': 3, 'vEOS': 5, 'vSRX-NG': 2}
+LOGIN_SLEEPS = {'vIOS': 6, 'Switch': 0, 'vEOS': 4, 'vSRX-NG': 7}
+
+# Stage durations in seconds used when an image has no history yet,
+# taken from the May 2025 deployment logs
+DEFAULT_STAGE_SECONDS = {
+    'vIOS': {'create': 2, 'running': 3, 'console': 125},
+    'Switch': {'create': 2, 'running': 3, 'console': 45},
+    'vEOS': {'create': 2, 'running': 3, 'console': 360},
+    'vSRX-NG': {'create': 2, 'running': 3, 'console': 290},
+}
+FALLBACK_STAGE_SECONDS = {'create': 2, 'running': 3, 'console': 300}
+
+
+def _stage_seconds(boot_history, image, name, metric):
+    """
+    Return the median recorded duration of a stage, or the default for the node.
+    """
+    samples = boot_history.samples(image, metric)
+    if samples:
+        samples.sort()
+        return samples[len(samples) // 2], 'history'
+    return DEFAULT_STAGE_SECONDS.get(name, FALLBACK_STAGE_SECONDS)[metric], 'default'
+
+
+def _peak_overlap(intervals):
+    """
+    Return the maximum number of overlapping (start, end) intervals.
+    """
+    events = sorted([(start, 1) for start, end in intervals] + [(end, -1) for start, end in intervals])
+    peak = current = 0
+    for _, change in events:
+        current += change
+        peak = max(peak, current)
+    return peak
+
+
+def build_plan(nodes, node_specs, boot_history, lab_build_mode='api', start_mode='lab'):
+    """
+    Build the deployment estimate for a nodes list.
+    Args:
+        nodes (list): List of dictionaries containing node types and their counts.
+        node_specs (dict): Node type mapped to a (payload, config workbook path) tuple.
+        boot_history (BootHistory): Boot history store with the recorded stage timings.
+        lab_build_mode (str): 'api' creates nodes one by one, 'import' uploads an offline-built lab.
+        start_mode (str): 'lab' starts the nodes with one lab-wide call, 'node' starts them one by one.
+    Returns:
+        dict: Per node type rows and run totals.
+    """
+    workbooks = {}
+    rows = []
+    node_timelines = []
+    for dev in nodes:
+        for node_type, count in dev.items():
+            if node_type not in node_specs:
+                rows.append({'node_type': node_type, 'count': count, 'error': 'Unsupported node type'})
+                continue
+            payload, config_file = node_specs[node_type]
+            name = payload.get('name')
+            image = payload.get('image')
+
+            # Count the workbook commands of every device of this type
+            if config_file not in workbooks:
+                try:
+                    workbooks[config_file] = pd.read_excel(config_file, sheet_name=None)
+                except Exception as e:
+                    logger.error(f"Could not read configuration workbook '{config_file}': {e}")
+                    workbooks[config_file] = {}
+            sheets = workbooks[config_file]
+            missing_sheets = [str(dev_num) for dev_num in range(count) if str(dev_num) not in sheets]
+            workbook_commands = sum(
+                len(sheets[str(dev_num)]['Command'].dropna())
+                for dev_num in range(count) if str(dev_num) in sheets
+            )
+
+            create_s, create_source = _stage_seconds(boot_history, image, name, 'create')
+            if lab_build_mode == 'import':
+                create_s, create_source = 0, 'import'
+            running_s, running_source = _stage_seconds(boot_history, image, name, 'running')
+            console_s, console_source = _stage_seconds(boot_history, image, name, 'console')
+
+            # The start engine polls on the schedule derived from the history, one node list GET per poll for all nodes
+            initial_delay, poll_interval, _ = boot_history.schedule(image, 'running', 3, 5, 50)
+            polls = 1 + max(0, math.ceil((running_s - initial_delay) / poll_interval))
+            poll_sleep = initial_delay + (polls - 1) * poll_interval
+            running_s = max(running_s, poll_sleep)
+
+            node_seconds = create_s + running_s + console_s
+            fixed_sleep = poll_sleep + LOGIN_SLEEPS.get(name, 0)
+            for _ in range(count):
+                node_timelines.append((create_s, running_s, console_s, fixed_sleep))
+
+            rows.append({
+                'node_type': node_type,
+                'count': count,
+                'image': image,
+                'api_calls': {
+                    'create': CREATE_API_CALLS * count if lab_build_mode != 'import' else 0,
+                    'start': (0 if start_mode == 'lab' else START_API_CALLS * count) + polls,
+                    'port': PORT_API_CALLS * count,
+                },
+                'console_commands': LOGIN_COMMANDS.get(name, 0) * count + workbook_commands,
+                'workbook_commands': workbook_commands,
+                'missing_sheets': missing_sheets,
+                'seconds': {'create': create_s, 'running': running_s, 'console': console_s},
+                'sources': {'create': create_source, 'running': running_source, 'console': console_source},
+                'node_seconds': node_seconds,
+                'fixed_sleep': {'start': poll_sleep, 'login': LOGIN_SLEEPS.get(name, 0)},
+            })
+
+    # All node threads are spawned at once and run together
+    api_intervals = [(0, create_s + running_s) for create_s, running_s, _, _ in node_timelines]
+    console_intervals = [(create_s + running_s, create_s + running_s + console_s)
+                         for create_s, running_s, console_s, _ in node_timelines]
+    slowest = max(node_timelines, key=lambda timeline: sum(timeline[:3]), default=(0, 0, 0, 0))
+    wall_clock = sum(slowest[:3])
+    critical_sleep = slowest[3]
+
+    return {
+        'rows': rows,
+        'total_nodes': len(node_timelines),
+        'api_calls': 1 + (IMPORT_API_CALLS if lab_build_mode == 'import' else 0)  # 1 for login
+                     + (LAB_START_API_CALLS if start_mode == 'lab' and rows else 0)
+                     + sum(sum(row['api_calls'].values()) for row in rows if 'api_calls' in row),
+        'console_commands': sum(row.get('console_commands', 0) for row in rows),
+        'wall_clock': wall_clock,
+        'critical_path_sleep': critical_sleep,
+        'total_fixed_sleep': sum(timeline[3] for timeline in node_timelines),
+        'peak_api_threads': _peak_overlap(api_intervals),
+        'peak_consoles': _peak_overlap(console_intervals),
+    }
+
+
+def print_plan(plan, colors):
+    """
+    Print a deployment plan built by build_plan().
+    Args:
+        plan (dict): The plan returned by build_plan().
+        colors (dict): Dictionary containing color codes for terminal output.
+    """
+    print(f'\n{colors.get("blue")}' + '-' * 50 + f'{colors.get("reset")}')
+    print(f'{colors.get("green")}Deployment Plan (no changes are made on the EVE-NG server){colors.get("reset")}')
+    print(f'{colors.get("blue")}' + '-' * 50 + f'{colors.get("reset")}')
+
+    for row in plan['rows']:
+        if 'error' in row:
+            print(f'{colors.get("red")}{row["node_type"]} x{row["count"]}: {row["error"]}{colors.get("reset")}')
+            continue
+        print(f'\n{colors.get("green")}{row["node_type"]} x{row["count"]}{colors.get("reset")} ({row["image"]})')
+        calls = row['api_calls']
+        print(f'  API calls        : create {calls["create"]}, start/poll {calls["start"]}, port {calls["port"]}')
+        print(f'  Console commands : {row["console_commands"]} ({row["workbook_commands"]} from the workbook)')
+        for stage, seconds in row['seconds'].items():
+            print(f'  {stage.capitalize():<17}: {seconds:.0f}s per node ({row["sources"][stage]})')
+        print(f'  Fixed sleeps     : {row["fixed_sleep"]["start"]:.0f}s start/poll, {row["fixed_sleep"]["login"]}s login per node')
+        if row['missing_sheets']:
+            print(f'  {colors.get("red")}Missing workbook sheets: {", ".join(row["missing_sheets"])}{colors.get("reset")}')
+
+    wall_clock = plan['wall_clock']
+    sleep_share = 100 * plan['critical_path_sleep'] / wall_clock if wall_clock else 0
+    print(f'\n{colors.get("green")}Totals{colors.get("reset")}')
+    print(f'  Nodes                  : {plan["total_nodes"]}')
+    print(f'  API calls              : {plan["api_calls"]}')
+    print(f'  Console commands       : {plan["console_commands"]}')
+    print(f'  Estimated wall-clock   : {wall_clock / 60:.1f} min')
+    print(f'  Fixed sleeps (critical): {plan["critical_path_sleep"]:.0f}s ({sleep_share:.0f}% of the wall-clock)')
+    print(f'  Fixed sleeps (all)     : {plan["total_fixed_sleep"]:.0f} thread-seconds')
+    print(f'  Peak API threads       : {plan["peak_api_threads"]}')
+    print(f'  Peak open consoles     : {plan["peak_consoles"]}')
@@ -0,0 +1,170 @@
+"""
+Preflight validation before any node is created.
+
+Every check runs at the same time on its own thread: the server checks (session,
+lab, management network, one request per template and its images) each need a
+single API call, so the whole preflight costs about one round-trip of latency
+plus the time to open the workbooks. Login itself is checked by user_auth().
+A failed check stops the deployment before it leaves half-created nodes behind.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import requests
+import logging
+from lab_builder import lab_location
+from links import load_links
+
+logger = logging.getLogger()
+
+# Payload fields create_nodes and the lab builder rely on
+REQUIRED_PAYLOAD_FIELDS = ('template', 'type', 'image', 'name', 'ethernet', 'console')
+NUMERIC_PAYLOAD_FIELDS = ('cpu', 'ram', 'ethernet')
+
+# Node names telnet_conn has a console login flow for
+CONSOLE_FLOWS = ('vIOS', 'Switch', 'vEOS', 'vSRX-NG')
+
+
+def _api_check(url, response, headers, timeout):
+    api = requests.get(url, headers=headers, cookies=response.cookies, timeout=timeout)
+    if api.status_code != 200:
+        raise ValueError(f"HTTP {api.status_code}: {api.text[:200]}")
+    return api.json()
+
+
+def check_session(base_url, response, headers, timeout):
+    data = _api_check(f"{base_url}/api/auth", response, headers, timeout).get('data', {})
+    return f"logged in as {data.get('username', 'unknown user')}"
+
+
+def check_lab(eve_lab_url, response, headers, timeout):
+    data = _api_check(eve_lab_url, response, headers, timeout).get('data', {})
+    return f"lab {data.get('name', eve_lab_url)} exists"
+
+
+def check_mgmt_network(network_mgmt, response, headers, timeout):
+    data = _api_check(network_mgmt, response, headers, timeout).get('data', {})
+    return f"management network {data.get('name')} exists"
+
+
+def check_template(base_url, template, images, response, headers, timeout):
+    data = _api_check(f"{base_url}/api/list/templates/{template}", response, headers, timeout).get('data', {})
+    available = data.get('options', {}).get('image', {}).get('list', {})
+    missing = [image for image in images if image not in available]
+    if missing:
+        raise ValueError(f"image(s) {', '.join(missing)} not installed (available: {', '.join(available) or 'none'})")
+    return f"template {template} with image(s) {', '.join(images)}"
+
+
+def check_payload(node_type, payload):
+    missing = [field for field in REQUIRED_PAYLOAD_FIELDS if field not in payload]
+    if missing:
+        raise ValueError(f"missing field(s) {', '.join(missing)}")
+    for field in NUMERIC_PAYLOAD_FIELDS:
+        if field in payload and not str(payload[field]).isdigit():
+            raise ValueError(f"field {field} must be a number, found {payload[field]!r}")
+    if payload['name'] not in CONSOLE_FLOWS:
+        raise ValueError(f"name {payload['name']!r} has no console login flow (expected one of {', '.join(CONSOLE_FLOWS)})")
+    return f"{payload['name']} / {payload['template']}"
+
+
+def check_workbook(config_file, count, require_all=True):
+    workbook = pd.ExcelFile(config_file)
+    missing = [str(dev_num) for dev_num in range(count) if str(dev_num) not in workbook.sheet_names]
+    if missing and require_all:
+        raise ValueError(f"no sheet for device number(s) {', '.join(missing)}")
+    present = [dev_num for dev_num in range(count) if str(dev_num) not in missing]
+    for dev_num in present:
+        sheet = workbook.parse(str(dev_num))
+        if 'Command' not in sheet.columns:
+            raise ValueError(f"sheet {dev_num} has no 'Command' column")
+        if sheet['Command'].dropna().empty:
+            raise ValueError(f"sheet {dev_num} has no commands")
+    if missing:
+        return f"{len(present)} sheet(s) with commands, {len(missing)} device(s) without a sheet boot unconfigured"
+    return f"{count} sheet(s) with commands"
+
+
+def check_links(links_file, nodes, node_specs):
+    ethernet = {
+        f"{node_type} {dev_num}": int(node_specs[node_type][0].get('ethernet', 0))
+        for dev in nodes for node_type, count in dev.items() if node_type in node_specs for dev_num in range(count)
+    }
+    links = load_links(links_file)
+    for number, link in enumerate(links):
+        for node, interface in link['endpoints']:
+            if node not in ethernet:
+                raise ValueError(f"link {number} uses unknown node {node!r}")
+            if not 0 < int(interface) < ethernet[node]:
+                raise ValueError(f"link {number} uses interface {interface} of {node}, which has {ethernet[node]} (0 is management)")
+    return f"{len(links)} link(s)"
+
+
+def _fail(detail):
+    raise ValueError(detail)
+
+
+def run_preflight(nodes, node_specs, response, headers, eve_lab_url, network_mgmt, settings):
+    """
+    Run every preflight check concurrently.
+    Args:
+        nodes (list): List of dictionaries containing node types and their counts.
+        node_specs (dict): Node type mapped to a (payload, config workbook path) tuple.
+        response (requests.Response): Response object from the EVE-NG login.
+        headers (dict): Headers for API requests.
+        eve_lab_url (str): URL of the lab; the session and template checks use its server.
+        network_mgmt (str): URL of the management network.
+        settings (dict): Optional tuning settings from the configuration file.
+    Returns:
+        list: (check name, passed, detail) tuples in a stable order.
+    """
+    timeout = settings.get('http_timeout', 30)
+    base_url = lab_location(eve_lab_url)[0]
+    checks = [("EVE-NG session", check_session, (base_url, response, headers, timeout))]
+    # An imported lab and its management network are created by the import itself
+    if settings.get('lab_build', {}).get('mode', 'api') != 'import':
+        checks.append(("Lab", check_lab, (eve_lab_url, response, headers, timeout)))
+        checks.append(("Management network", check_mgmt_network, (network_mgmt, response, headers, timeout)))
+
+    # Generated topologies are sized for scale tests: devices without a sheet are only booted
+    generated = settings.get('topology_generator', {}).get('kind', 'off') != 'off'
+    templates = {}
+    for dev in nodes:
+        for node_type, count in dev.items():
+            if node_type not in node_specs:
+                checks.append((f"Node type {node_type}", _fail, ("unsupported node type",)))
+                continue
+            payload, config_file = node_specs[node_type]
+            checks.append((f"Payload {node_type}", check_payload, (node_type, payload)))
+            checks.append((f"Workbook {node_type}", check_workbook, (config_file, count, not generated)))
+            if 'template' in payload and 'image' in payload:
+                templates.setdefault(payload['template'], set()).add(payload['image'])
+    for template, images in templates.items():
+        checks.append((f"Template {template}", check_template, (base_url, template, sorted(images), response, headers, timeout)))
+    if settings.get('topology_links_file'):
+        checks.append(("Topology links", check_links, (settings['topology_links_file'], nodes, node_specs)))
+
+    with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        futures = [(name, executor.submit(check, *check_args)) for name, check, check_args in checks]
+    results = []
+    for name, future in futures:
+        try:
+            results.append((name, True, future.result()))
+        except Exception as e:
+            logger.error(f"Preflight check '{name}' failed: {e}")
+            results.append((name, False, str(e)))
+    logger.info(f"Preflight: {sum(passed for _, passed, _ in results)}/{len(results)} checks passed.")
+    return results
+
+
+def print_preflight(results, colors):
+    """
+    Print the preflight results.
+    Args:
+        results (list): Results from run_preflight().
+        colors (dict): Dictionary containing color codes for terminal output.
+    """
+    print(f'\n{colors.get("green")}#### PREFLIGHT ####{colors.get("reset")}')
+    for name, passed, detail in results:
+        status = f'{colors.get("green")}OK  ' if passed else f'{colors.get("red")}FAIL'
+        print(f'{status}{colors.get("reset")} {name}: {detail}')
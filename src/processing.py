@@ -1,7 +1,6 @@
 import requests 
 import datetime 
 import uuid 
-from telnetlib import Telnet
 import time
 import datetime
 import pandas as pd
@@ -9,9 +8,40 @@ import threading
 from queue import Queue
 from tqdm import tqdm
 import logging
+import os
+from contextlib import contextmanager, nullcontext
+from boot_history import BootHistory
+from console_capture import CapturingTelnet, TranscriptStore
+from session_pool import PooledSession, SessionPool
+from ssh_config import SshTransport
+from links import LinkEngine, load_links, load_positions
+from start_engine import StartEngine
+from config_server import ConfigServer
+from run_control import RunControl
+from lab_builder import build_lab, grid_positions, import_lab, lab_location
+from node_job import NodeJob, RunContext, freeze_payload
+from golden_config import GoldenConfigs, topology_fingerprint, clean_config, paste_commands, CAPTURE_COMMANDS
+from config_diff import config_delta, DIFF_COMMANDS
+from config_errors import check_output, check_paste
+from inventory import load_inventory, save_inventory
+from console_workers import ConsoleWorkers
+from exceptions import DeploymentCancelled, DeadlineExceeded, ConfigPushError
 
 logger = logging.getLogger()
 
+# Telnet connection parameters of the EVE-NG node consoles
+TELNET_TIMEOUT = 10
+HOST = '192.168.0.119'
+
+# Default timeout of a single EVE-NG API call, in seconds
+HTTP_TIMEOUT = 30
+
+# Seconds a device may take to apply a pasted golden config
+PASTE_TIMEOUT = 120
+
+# Seconds without a prompt after which console_relogin() presses RETURN again
+RELOGIN_NUDGE = 10
+
 # This function will be called to authenticate with the EVE-NG API
 def user_auth(eve_API_creds,eve_ng_url_login,eve_authorization_header,colors):
     """
@@ -55,47 +85,28 @@ def user_auth(eve_API_creds,eve_ng_url_login,eve_authorization_header,colors):
     return response,headers
 
 # This function will be called to create nodes in EVE-NG
-def create_nodes(dev_num, node_type, device_payload, *args):
-    (
-        response,
-        headers,
-        eve_node_creation_url,
-        eve_start_nodes_url,
-        eve_node_port,
-        eve_interface_connection,
-        node_interface,
-        network_mgmt,
-        createnode_queue,
-        starnode_queue,
-        connectnode_queue,
-        configure_queue,
-        closeconnection_queue,
-        lock,
-        colors
-    ) = args
-
+def create_nodes(job, run):
     """
     Create nodes in EVE-NG using the provided payload.
     Args:
-        dev_num (int): Device number for the node.
-        node_type (str): Type of the node (e.g., Router, Switch).
-        device_payload (dict): Payload containing node configuration.
-        args (tuple): Additional arguments for API calls.
+        job (NodeJob): The device to create and its payload.
+        run (RunContext): Objects shared by every node of the run.
     Returns:
         str: The ID of the created node.
     """
+    node_type = job.node_type
 
     max_retries = 3  # Number of retries for node creation
+    http_timeout = run.settings.get('http_timeout', HTTP_TIMEOUT)
     for attempt in range(max_retries):
         try:
-            # Assign a unique UUID to the device payload
+            # Build this request's own payload with a unique UUID
             logger.info(f"Attempting to create node {node_type} (Attempt {attempt + 1}/{max_retries}).")
-            device_payload['uuid'] = str(uuid.uuid4())
-            if dev_num == 1:
-                device_payload['top'] = "30"  # Example adjustment for specific devices
+            device_payload = job.payload(uuid=str(uuid.uuid4()))
 
-            # Send the API request to create the node
-            create_node_api = requests.post(eve_node_creation_url, json=device_payload, headers=headers, cookies=response.cookies)
+            # Send the API request to create the node (lab writes are serialized with the link engine)
+            with run.lock:
+                create_node_api = requests.post(run.eve_node_creation_url, json=device_payload, headers=run.headers, cookies=run.response.cookies, timeout=run.run_control.timeout(http_timeout))
             logger.debug(f"Create Node API Response: {create_node_api.text}")
 
             # Check if the node creation was successful
@@ -106,167 +117,130 @@ def create_nodes(dev_num, node_type, device_payload, *args):
             create_node_response = create_node_api.json()
             device_id = create_node_response['data']['id']
             logger.info(f"Node {node_type} with ID {device_id} created successfully.")
-            createnode_queue.put(f'{datetime.datetime.now()} - {node_type} - Eve-ng Node {device_id} created successfully')
+            run.createnode_queue.put(f'{datetime.datetime.now()} - {node_type} - Eve-ng Node {device_id} created successfully')
+
+            # With topology links, the link engine applies the whole interface map, management
+            # interface included, in one PUT per node: the lookups below would only be thrown away
+            if run.link_engine.enabled:
+                return device_id
 
             # Get device interface
-            node_interface_api = requests.get(node_interface.format(device_id=device_id), headers=headers, cookies=response.cookies)
+            node_interface_api = requests.get(run.node_interface.format(device_id=device_id), headers=run.headers, cookies=run.response.cookies, timeout=run.run_control.timeout(http_timeout))
             node_interface_response = node_interface_api.json()
             node_interface_id = node_interface_response["data"]["ethernet"][0]["name"]
             logger.info(f"Node {node_type} with ID {device_id} has interface {node_interface_id}.")
 
             # Get management network name
-            mgmt_net_api = requests.get(network_mgmt, headers=headers, cookies=response.cookies)
+            mgmt_net_api = requests.get(run.network_mgmt, headers=run.headers, cookies=run.response.cookies, timeout=run.run_control.timeout(http_timeout))
             mgmt_net_response = mgmt_net_api.json()
             mgmt_net_id = mgmt_net_response['data']['name']
             logger.info(f"Management network ID for {node_type} with ID {device_id}: {mgmt_net_id}.")
 
             # Connect device to management network
             interfaces = '{"0":"21"}'  # Adjust the management network ID for your environment
-            interface_connection_api = requests.put(eve_interface_connection.format(device_id=device_id), data=interfaces, headers=headers, cookies=response.cookies)
+            with run.lock:
+                interface_connection_api = requests.put(run.eve_interface_connection.format(device_id=device_id), data=interfaces, headers=run.headers, cookies=run.response.cookies, timeout=run.run_control.timeout(http_timeout))
             logger.info(f"Connected {node_type} with ID {device_id} to management network.")
 
             # Log success for interface connection
-            createnode_queue.put(f'{datetime.datetime.now()} - Connecting MGMT interface {node_interface_id} of {node_type} Eve-ng id {device_id} to management network {mgmt_net_id}')
+            run.createnode_queue.put(f'{datetime.datetime.now()} - Connecting MGMT interface {node_interface_id} of {node_type} Eve-ng id {device_id} to management network {mgmt_net_id}')
 
             return device_id
 
+        except (DeploymentCancelled, DeadlineExceeded):
+            raise  # No retries once the run is cancelled or the stage is out of time
         except Exception as e:
             # Log the error and retry if attempts remain
             logger.error(f"Attempt {attempt + 1} to create node failed: {e}")
             if attempt < max_retries - 1:
-                time.sleep(5)  # Wait before retrying
+                run.run_control.sleep(5)  # Wait before retrying
             else:
                 # If all retries fail, log and raise the error
-                createnode_queue.put(f'{datetime.datetime.now()} - Node creation failed after {max_retries} attempts')
+                run.createnode_queue.put(f'{datetime.datetime.now()} - Node creation failed after {max_retries} attempts')
                 logger.critical(f"Failed to create node {node_type} after {max_retries} attempts.")
                 raise
 
     # This part should never be reached due to the raise statement above
     return None
-# This function will be called to start nodes in EVE-NG
-def start_nodes(device_id, node_type, *args):
-    (
-        response,
-        headers,
-        eve_node_creation_url,
-        eve_start_nodes_url,
-        eve_node_port,
-        eve_interface_connection,
-        node_interface,
-        network_mgmt,
-        createnode_queue,
-        starnode_queue,
-        connectnode_queue,
-        configure_queue,
-        closeconnection_queue,
-        lock,
-        colors
-    ) = args
-
-    logger.info(f"Attempting to start node {node_type} with ID {device_id}.")
-    starnode_queue.put(f'{datetime.datetime.now()} - Starting {node_type} Eve-ng node {device_id} ')
-
-    # Send the API request to start the node
-    start_node_api = requests.get(eve_start_nodes_url.format(device_id=device_id), headers=headers, cookies=response.cookies)
-    time.sleep(3)  # Add a delay of 3 seconds
-
-    if start_node_api.status_code == 200:
-        logger.info(f"Node {node_type} with ID {device_id} started successfully.")
-        starnode_queue.put(f'{datetime.datetime.now()} - Node {device_id} - {node_type} started successfully')
-
-        # Poll the EVE-NG API to check if the node is running
-        max_retries = 10  # Maximum number of retries
-        retry_delay = 5  # Delay between retries in seconds
-        for attempt in range(max_retries):
-            node_status_api = requests.get(f"{eve_node_creation_url}/{device_id}", headers=headers, cookies=response.cookies)
-            if node_status_api.status_code == 200:
-                try:
-                    node_status = node_status_api.json().get('data', {}).get('status', None)
-                    logger.debug(f"Node {node_type} with ID {device_id} status: {node_status} (Attempt {attempt + 1}/{max_retries})")
-                    
-                    if node_status == 2:  # 2 indicates the node is running
-                        logger.info(f"Node {node_type} with ID {device_id} is running.")
-                        return True  # Exit the function as the node is ready
-                    elif node_status == 0:  # 0 indicates the node is stopped
-                        logger.warning(f"Node {node_type} with ID {device_id} is stopped. (Attempt {attempt + 1}/{max_retries})")
-                        start_node_api = requests.get(eve_start_nodes_url.format(device_id=device_id), headers=headers, cookies=response.cookies)
-                        if start_node_api.status_code == 200:
-                            logger.info(f"Retry to start node {node_type} with ID {device_id} was successful.")
-                        else:
-                            logger.error(f"Retry to start node {node_type} with ID {device_id} failed. Response: {start_node_api.text}")
-                    else:
-                        logger.warning(f"Unexpected status for node {node_type} with ID {device_id}: {node_status}")
-                except Exception as e:
-                    logger.error(f"Error parsing node status for {node_type} with ID {device_id}: {e}")
-            else:
-                logger.error(f"Failed to retrieve status for node {node_type} with ID {device_id}. Response: {node_status_api.text}")
-            time.sleep(retry_delay)  # Wait before checking again
-
-        # If the node is not ready after retries
-        logger.error(f"Node {node_type} with ID {device_id} failed to start in time.")
-        starnode_queue.put(f'{colors.get("red")}{datetime.datetime.now()} - Node {device_id} - {node_type} failed to start in time{colors.get("reset")}')
-    else:
-        logger.error(f"Failed to start node {node_type} with ID {device_id}. Response: {start_node_api.text}")
-        starnode_queue.put(f'{colors.get("red")}{datetime.datetime.now()} - Failed to start Eve-ng {device_id} - {node_type}{colors.get("reset")}')
-
-    return False
-
-def get_node_port(device_id,*args):
-    (
-        response,
-        headers,
-        eve_node_creation_url,
-        eve_start_nodes_url,
-        eve_node_port,
-        eve_interface_connection,
-        node_interface,
-        network_mgmt,
-        createnode_queue,
-        starnode_queue,
-        connectnode_queue,
-        configure_queue,
-        closeconnection_queue,
-        lock,
-        colors
-    ) = args
-
+def get_node_port(device_id, run):
     """
     Get the port information for the created node.
     Args:
         device_id (str): The ID of the device to get port information for.
-        args (tuple): Additional arguments for API calls.
+        run (RunContext): Objects shared by every node of the run.
     Returns:
         tuple: A tuple containing the port number and name.
     """
 
     # Get node port information
-    node_port_api = requests.get(eve_node_port.format(device_id=device_id), headers=headers, cookies=response.cookies)
+    node_port_api = requests.get(run.eve_node_port.format(device_id=device_id), headers=run.headers, cookies=run.response.cookies, timeout=run.run_control.timeout(run.settings.get('http_timeout', HTTP_TIMEOUT)))
     port = node_port_api.json()['data']['url'].split(':')[-1]
     name = node_port_api.json()['data']['name']
     return port, name
 
+# This function reads the workbook commands of one device
+def load_device_commands(dev_config_file, dev_num):
+    """
+    Load the commands of a device from its configuration workbook.
+    Args:
+        dev_config_file (str): Path to the configuration file.
+        dev_num (int): The device number (sheet name).
+    Returns:
+        list: The commands, or None if the workbook has no sheet for the device.
+    """
+    commands_config = pd.read_excel(dev_config_file, sheet_name=None)
+    logger.info(f"Available sheets in configuration file: {list(commands_config.keys())}")
+    if str(dev_num) not in commands_config:
+        return None
+    return commands_config[str(dev_num)]['Command'].dropna().tolist()
+
+# This function waits on a Telnet console for a prompt that the device prints only once
+def wait_for_prompt(tn, marker, boot_history=None, image=None, metric=None, started_at=None, poll_interval=1, run_control=None):
+    """
+    Wait until a marker shows up on a Telnet console.
+    When a boot history metric is given, the wait first sleeps until the prompt
+    is expected (the console keeps buffering meanwhile) and then polls tightly.
+    The observed time since `started_at` is recorded back into the history.
+    Args:
+        tn (Telnet): The open Telnet connection.
+        marker (str): Text to wait for (e.g. "localhost login:").
+        boot_history (BootHistory): Boot history store, or None to poll from the start.
+        image (str): Image name of the node.
+        metric (str): Boot history metric to schedule from and record.
+        started_at (float): time.monotonic() value the metric is measured from.
+        poll_interval (float): Poll interval used without history.
+        run_control (RunControl): Deadlines and cancellation of the run; without it the wait has no limit.
+    Returns:
+        str: The tail of the console output that contained the marker.
+    """
+    sleep = run_control.sleep if run_control else time.sleep
+    initial_delay = 0
+    if boot_history is not None and metric:
+        initial_delay, poll_interval, _ = boot_history.schedule(image, metric, 0, poll_interval, 0)
+        remaining = started_at + initial_delay - time.monotonic()
+        if remaining > 0:
+            sleep(remaining)
+
+    output = ''
+    polls = 0
+    while True:
+        polls += 1
+        # Keep a short tail so a marker split across two reads is still found
+        output = (output + tn.read_very_eager().decode('ascii', errors='ignore'))[-(len(marker) + 512):]
+        if marker in output:
+            if boot_history is not None and metric:
+                elapsed = time.monotonic() - started_at
+                if polls == 1 and initial_delay > 0:
+                    # Found right after the scheduled sleep: the prompt may have shown up during it
+                    elapsed = min(elapsed, initial_delay)
+                boot_history.record(image, metric, elapsed)
+            return output
+        sleep(poll_interval)  # Wait for a short period before checking again
+
 # This function will be called to configure the node using Telnet
 # Eve-ng uses Telnet to connect to the nodes as a console connection
 
-def telnet_conn(port,name,device_id,dev_num,node_type,dev_config_file,*args):
-    (
-        response,
-        headers,
-        eve_node_creation_url,
-        eve_start_nodes_url,
-        eve_node_port,
-        eve_interface_connection,
-        node_interface,
-        network_mgmt,
-        createnode_queue,
-        starnode_queue,
-        connectnode_queue,
-        configure_queue,
-        closeconnection_queue,
-        lock,
-        colors
-    ) = args
-
+def telnet_conn(port,name,device_id,dev_num,node_type,dev_config_file,image,started_at,run):
     """
     Connect to the node using Telnet and apply the initial configuration.
     Args:
@@ -276,165 +250,457 @@ def telnet_conn(port,name,device_id,dev_num,node_type,dev_config_file,*args):
         dev_num (int): The device number.
         node_type (str): Type of the node (e.g., Router, Switch).
         dev_config_file (str): Path to the configuration file.
-        args (tuple): Additional arguments for API calls.
+        image (str): Image name of the node, used to schedule prompt waits.
+        started_at (float): time.monotonic() value taken when the node was started.
+        run (RunContext): Objects shared by every node of the run.
     Returns:
-        None
+        bool: True if the console session completed without errors.
     """
-    # Telnet connection
-    # Define the Telnet connection parameters
-    TELNET_TIMEOUT = 10
-    HOST = '192.168.0.119'
     tn = None  # Initialize tn to None to avoid issues for non-Telnet devices
+    failed = False  # Set when the session fails so its console transcript gets dumped
+    error_action = run.settings.get('config_error_action', 'abort')
     def dev_config(dev_config_file, tn, device_id, node_type):
+        nonlocal failed
         try:
-            # Load the configuration file
-            commands_config = pd.read_excel(dev_config_file, sheet_name=None)
-            logger.info(f"Available sheets in configuration file: {list(commands_config.keys())}")
-            
-            # Check if the sheet for the current device exists
-            if str(dev_num) in commands_config:
-                commands = commands_config[str(dev_num)]['Command'].dropna().tolist()
-                logger.info(f"Applying configuration for {node_type} (Device ID: {device_id}, Dev Num: {dev_num}).")
-                configure_queue.put(f"{datetime.datetime.now()} - Applying configuration to {node_type} (Device ID: {device_id}, Dev Num: {dev_num}).")
-                # Send each command via Telnet
-                for command in commands:
-                    logger.info(f"Sending command to {node_type} (Device ID: {device_id}): {command}")
+            golden_config = run.golden_configs.replay_config(node_type, dev_num) if run.golden_configs.method == 'paste' else None
+            if golden_config is not None:
+                # Replay the captured configuration in one write instead of the workbook commands
+                commands = paste_commands(name, golden_config)
+                logger.info(f"Pasting golden config to {node_type} (Device ID: {device_id}, Dev Num: {dev_num}).")
+                run.configure_queue.put(f"{datetime.datetime.now()} - Pasting golden config to {node_type} (Device ID: {device_id}, Dev Num: {dev_num}).")
+                check_paste(name, paste_lines(tn, commands, run.run_control), commands)
+                return
+            if run.config_server.enabled and run.config_server.url(node_type, dev_num) is not None:
+                # The device downloads its whole configuration with one command
+                logger.info(f"Pulling configuration for {node_type} (Device ID: {device_id}, Dev Num: {dev_num}) from the config server.")
+                run.configure_queue.put(f"{datetime.datetime.now()} - Pulling configuration to {node_type} (Device ID: {device_id}, Dev Num: {dev_num}) from the config server.")
+                pull_config(tn, name, node_type, dev_num, device_id, run.config_server, run.run_control)
+                return
+            if run.ssh_transport.enabled:
+                # Only the management bootstrap goes over the console, the workbook follows over SSH
+                commands = run.ssh_transport.bootstrap_commands(name, node_type, dev_num)
+                logger.info(f"Applying SSH bootstrap for {node_type} (Device ID: {device_id}, Dev Num: {dev_num}).")
+                run.configure_queue.put(f"{datetime.datetime.now()} - Applying SSH bootstrap to {node_type} (Device ID: {device_id}, Dev Num: {dev_num}).")
+            else:
+                commands = load_device_commands(dev_config_file, dev_num)
+            if commands is not None:
+                if not run.ssh_transport.enabled:
+                    logger.info(f"Applying configuration for {node_type} (Device ID: {device_id}, Dev Num: {dev_num}).")
+                    run.configure_queue.put(f"{datetime.datetime.now()} - Applying configuration to {node_type} (Device ID: {device_id}, Dev Num: {dev_num}).")
+                # Send each command via Telnet and check its output before sending the next one
+                # Console output is kept in the device transcript instead of the shared log
+                push_errors = []
+                for line_number, command in enumerate(commands, 1):
+                    logger.debug(f"Sending command to {node_type} (Device ID: {device_id}): {command}")
                     tn.write(f"{command}\n".encode('ascii'))
-                    output = tn.read_until(b"#", timeout=10).decode('ascii', errors='ignore')
-                    logger.debug(f"Response for command '{command}' on {node_type} (Device ID: {device_id}): {output}")
+                    _, _, output = tn.expect([rb"#", rb"[Pp]assword:"], timeout=run.run_control.timeout(10))
+                    try:
+                        check_output(name, output.decode('ascii', errors='ignore'), command, line_number)
+                    except ConfigPushError as e:
+                        if error_action == 'abort':
+                            raise
+                        logger.error(f"{node_type} (Device ID: {device_id}) rejected {e}")
+                        push_errors.append(e)
+                if push_errors:
+                    raise push_errors[0]
             else:
                 logger.warning(f"No configuration found for {node_type} (Device ID: {device_id}, Dev Num: {dev_num}). Skipping configuration.")
-                configure_queue.put(f"{datetime.datetime.now()} - No configuration found for {node_type} (Device ID: {device_id}, Dev Num: {dev_num}). Skipping configuration.")
+                run.configure_queue.put(f"{datetime.datetime.now()} - No configuration found for {node_type} (Device ID: {device_id}, Dev Num: {dev_num}). Skipping configuration.")
+        except (DeploymentCancelled, DeadlineExceeded, ConfigPushError):
+            failed = True
+            raise
         except Exception as e:
+            failed = True
             logger.error(f"Error applying configuration to {node_type} (Device ID: {device_id}): {e}")
-            configure_queue.put(f"{colors.get('red')}{datetime.datetime.now()} - Error applying configuration to {node_type} (Device ID: {device_id}): {e}{colors.get('reset')}")
+            run.configure_queue.put(f"{run.colors.get('red')}{datetime.datetime.now()} - Error applying configuration to {node_type} (Device ID: {device_id}): {e}{run.colors.get('reset')}")
 
+    # Wait for a free slot if the session pool is full, waking up regularly to notice a cancelled run
+    while not run.session_pool.reserve(run.run_control.timeout(5)):
+        pass
     try:
         if name == 'vIOS':
             # Create a Telnet object and connect to the server
             logger.info(f"Connecting to {node_type} (Device ID: {device_id}) on port {port} via Telnet.")
 
-            tn = Telnet(HOST, port)
-            connectnode_queue.put(f"{datetime.datetime.now()} - Connected to the {node_type} - node {device_id} on port {port}")
-            while True:
-                output = tn.read_until(b"[yes/no]:", timeout=TELNET_TIMEOUT)
-                if b"[yes/no]:" in output:
-                    tn.write(b"no\r\n")
-                    break
-            time.sleep(2)  # Add a small delay to give the device time to process the input                  
+            tn = CapturingTelnet(HOST, port, run.transcripts.open(name, device_id), run.run_control.timeout(TELNET_TIMEOUT))
+            run.connectnode_queue.put(f"{datetime.datetime.now()} - Connected to the {node_type} - node {device_id} on port {port}")
+            wait_for_prompt(tn, "[yes/no]:", run.boot_history, image, 'prompt', started_at, run_control=run.run_control)
+            tn.write(b"no\r\n")
+            run.run_control.sleep(2)  # Add a small delay to give the device time to process the input
             # Wait for the "Press RETURN to get started!" prompt
-            tn.read_until(b"Press RETURN to get started!", timeout=TELNET_TIMEOUT)
+            tn.read_until(b"Press RETURN to get started!", timeout=run.run_control.timeout(TELNET_TIMEOUT))
             logger.debug(f"Telnet connection established for {node_type} (Device ID: {device_id}).")
 
             # Send a newline character to proceed
             tn.write(b"\r\n")
-            while True:
-                output = tn.read_very_eager().decode('ascii')
-                #print(output)  # Print the output for debugging purposes
-                if "(Config Wizard)" in output:
-                    tn.write(b"\r\n")
-                    time.sleep(2)  # Add a small delay to give the device time to process the input
-                    break
-                time.sleep(1)  # Wait for a short period before checking again
+            wait_for_prompt(tn, "(Config Wizard)", run_control=run.run_control)
+            tn.write(b"\r\n")
+            run.run_control.sleep(2)  # Add a small delay to give the device time to process the input
             # Wait for the enable prompt
-            tn.read_until(b"Router>", timeout=TELNET_TIMEOUT)
-            logger.debug(f"Telnet prompt for {node_type} (Device ID: {device_id}): {output}")
+            tn.read_until(b"Router>", timeout=run.run_control.timeout(TELNET_TIMEOUT))
             # Send "enable" command
             tn.write(b"enable\n")
             # Wait for the enable prompt
-            tn.read_until(b"#", timeout=TELNET_TIMEOUT)
+            tn.read_until(b"#", timeout=run.run_control.timeout(TELNET_TIMEOUT))
             # Send "terminal length 0" command to avoid pagination
-            logger.debug(f"Telnet enable prompt for {node_type} (Device ID: {device_id}): {output}")
 
             tn.write(b"terminal length 0\n")
-            time.sleep(2)  # Add a 2-second delay
-            output = tn.read_very_eager().decode('ascii', errors='ignore')
-            logger.debug(f"Telnet terminal length 0 prompt for {node_type} (Device ID: {device_id}): {output}")
+            run.run_control.sleep(2)  # Add a 2-second delay
             # Wait for the prompt
             tn.read_very_eager()  # Clear the buffer
-            tn.read_until(b"#", timeout=TELNET_TIMEOUT)
+            tn.read_until(b"#", timeout=run.run_control.timeout(TELNET_TIMEOUT))
             logger.info(f"Applying configuration to {node_type} (Device ID: {device_id}).")
             dev_config(dev_config_file, tn, device_id, node_type)
             
 
         elif name == 'Switch':
-            tn = Telnet(HOST, port)
-            connectnode_queue.put(f"{datetime.datetime.now()} - Connected to the {node_type} - node {device_id} on port {port}")
+            tn = CapturingTelnet(HOST, port, run.transcripts.open(name, device_id), run.run_control.timeout(TELNET_TIMEOUT))
+            run.connectnode_queue.put(f"{datetime.datetime.now()} - Connected to the {node_type} - node {device_id} on port {port}")
             logger.info(f"Connecting to {node_type} (Device ID: {device_id}) on port {port} via Telnet.")
-            tn.read_until(b"signing verification", timeout=TELNET_TIMEOUT)
+            tn.read_until(b"signing verification", timeout=run.run_control.timeout(TELNET_TIMEOUT))
             tn.write(b"\r\n")
-            tn.read_until(b"Switch>", timeout=TELNET_TIMEOUT)
+            tn.read_until(b"Switch>", timeout=run.run_control.timeout(TELNET_TIMEOUT))
             # Send "enable" command
             tn.write(b"enable\n")
-            tn.read_until(b"#", timeout=TELNET_TIMEOUT)
+            tn.read_until(b"#", timeout=run.run_control.timeout(TELNET_TIMEOUT))
             # Send "terminal length 0" command to avoid pagination
             tn.write(b"terminal length 0\n")
             # Wait for the prompt
-            tn.read_until(b"#", timeout=TELNET_TIMEOUT)
+            tn.read_until(b"#", timeout=run.run_control.timeout(TELNET_TIMEOUT))
             dev_config(dev_config_file, tn, device_id, node_type)
         elif name == 'vEOS':
             #### Arista Switch
-            tn = Telnet(HOST, port)
-            connectnode_queue.put(f"{datetime.datetime.now()} - Connected to the {node_type} - node {device_id} on port {port}")
+            tn = CapturingTelnet(HOST, port, run.transcripts.open(name, device_id), run.run_control.timeout(TELNET_TIMEOUT))
+            run.connectnode_queue.put(f"{datetime.datetime.now()} - Connected to the {node_type} - node {device_id} on port {port}")
             logger.info(f"Connecting to {node_type} (Device ID: {device_id}) on port {port} via Telnet.")
-            while True:
-                output = tn.read_very_eager().decode('ascii')
-                #print(output)  # Print the output for debugging purposes
-                if "localhost login:" in output:
-                    tn.write(b"admin\n")
-                    time.sleep(2)  # Add a small delay to give the device time to process the input
-                    break
-                time.sleep(1)  # Wait for a short period before checking again
-            tn.read_until(b"localhost>", timeout=TELNET_TIMEOUT)
+            wait_for_prompt(tn, "localhost login:", run.boot_history, image, 'prompt', started_at, run_control=run.run_control)
+            tn.write(b"admin\n")
+            run.run_control.sleep(2)  # Add a small delay to give the device time to process the input
+            tn.read_until(b"localhost>", timeout=run.run_control.timeout(TELNET_TIMEOUT))
             # Close the connection
             tn.write(b"enable\n")
-            tn.read_until(b"#", timeout=TELNET_TIMEOUT)
+            tn.read_until(b"#", timeout=run.run_control.timeout(TELNET_TIMEOUT))
             tn.write(b"zerotouch cancel\n")
-            connectnode_queue.put(f"{datetime.datetime.now()} - {node_type} node {device_id} is rebooting, please wait for a few minutes")	
+            reboot_at = time.monotonic()
+            run.connectnode_queue.put(f"{datetime.datetime.now()} - {node_type} node {device_id} is rebooting, please wait for a few minutes")	
             logger.info(f"Rebooting {node_type} (Device ID: {device_id}).")
-            while True:
-                output = tn.read_very_eager().decode('ascii')
-                #print(output)  # Print the output for debugging purposes
-                if "localhost login:" in output:
-                    tn.write(b"admin\n")
-                    time.sleep(2)  # Add a small delay to give the device time to process the input
-                    break
-                time.sleep(1)  # Wait for a short period before checking again
-            tn.read_until(b"localhost>", timeout=TELNET_TIMEOUT)
+            wait_for_prompt(tn, "localhost login:", run.boot_history, image, 'reboot_prompt', reboot_at, run_control=run.run_control)
+            tn.write(b"admin\n")
+            run.run_control.sleep(2)  # Add a small delay to give the device time to process the input
+            tn.read_until(b"localhost>", timeout=run.run_control.timeout(TELNET_TIMEOUT))
             tn.write(b"enable\n")
-            tn.read_until(b"#", timeout=TELNET_TIMEOUT)
+            tn.read_until(b"#", timeout=run.run_control.timeout(TELNET_TIMEOUT))
             dev_config(dev_config_file, tn, device_id, node_type)
         elif name == 'vSRX-NG':
-            tn = Telnet(HOST, port)
-            connectnode_queue.put(f"{datetime.datetime.now()} - Connected to the {node_type} - node {device_id} on port {port}")
+            tn = CapturingTelnet(HOST, port, run.transcripts.open(name, device_id), run.run_control.timeout(TELNET_TIMEOUT))
+            run.connectnode_queue.put(f"{datetime.datetime.now()} - Connected to the {node_type} - node {device_id} on port {port}")
             logger.info(f"Connecting to {node_type} (Device ID: {device_id}) on port {port} via Telnet.")
-            while True:
-                output = tn.read_very_eager().decode('ascii')
-                #print(output)  # Print the output for debugging purposes
-                if "login:" in output:
-                    tn.write(b"root\n")
-                    time.sleep(2)  # Add a small delay to give the device time to process the input
-                    break
-                time.sleep(1)  # Wait for a short period before checking again
-            tn.read_until(b"root@:~ #", timeout=TELNET_TIMEOUT)
+            wait_for_prompt(tn, "login:", run.boot_history, image, 'prompt', started_at, run_control=run.run_control)
+            tn.write(b"root\n")
+            run.run_control.sleep(2)  # Add a small delay to give the device time to process the input
+            tn.read_until(b"root@:~ #", timeout=run.run_control.timeout(TELNET_TIMEOUT))
             tn.write(b"cli\n")
-            tn.read_until(b">", timeout=TELNET_TIMEOUT)
-            time.sleep(5)  # Wait for 5 seconds before starting configuration
+            tn.read_until(b">", timeout=run.run_control.timeout(TELNET_TIMEOUT))
+            run.run_control.sleep(5)  # Wait for 5 seconds before starting configuration
             logger.info(f"Applying configuration to {node_type} (Device ID: {device_id}).")
             dev_config(dev_config_file, tn, device_id, node_type)
     except Exception as e:
-        configure_queue.put(f'{colors.get("red")}{datetime.datetime.now()} - An error occurred while configuring {node_type} - node {device_id}: {e}{colors.get("reset")}')
+        failed = True
+        run.configure_queue.put(f'{run.colors.get("red")}{datetime.datetime.now()} - An error occurred while configuring {node_type} - node {device_id}: {e}{run.colors.get("reset")}')
         logger.error(f"Error during Telnet connection for {node_type} (Device ID: {device_id}): {e}")
+        if isinstance(e, (DeploymentCancelled, DeadlineExceeded, ConfigPushError)):
+            raise  # Stop this node instead of moving on to the next stage
 
     finally:
-        # Close Telnet connection if it was initialized
-        if tn:
-            try:
-                tn.close()
-                closeconnection_queue.put(f"{datetime.datetime.now()} - Telnet connection closed for {node_type} - node {device_id}")
-                logger.info(f"Telnet connection closed for {node_type} (Device ID: {device_id}).")
-            except Exception as close_error:
-                closeconnection_queue.put(f'{colors.get("red")}{datetime.datetime.now()} - Error while closing Telnet connection: {close_error}{colors.get("reset")}')
+        if tn and run.session_pool.enabled and not failed:
+            # Keep the authenticated console for the verification and later stages
+            run.session_pool.release(PooledSession(
+                device_id, name, node_type, tn,
+                on_close=lambda session: run.transcripts.close(session.name, session.device_id),
+            ))
+            run.closeconnection_queue.put(f"{datetime.datetime.now()} - Console session kept open for {node_type} - node {device_id}")
+            logger.info(f"Console session kept open for {node_type} (Device ID: {device_id}).")
+        else:
+            # Close Telnet connection if it was initialized
+            if tn:
+                try:
+                    tn.close()
+                    run.closeconnection_queue.put(f"{datetime.datetime.now()} - Telnet connection closed for {node_type} - node {device_id}")
+                    logger.info(f"Telnet connection closed for {node_type} (Device ID: {device_id}).")
+                except Exception as close_error:
+                    run.closeconnection_queue.put(f'{run.colors.get("red")}{datetime.datetime.now()} - Error while closing Telnet connection: {close_error}{run.colors.get("reset")}')
+            run.session_pool.discard()
+            # Dump the console transcript on failure (or always, if configured) and free its buffer
+            run.transcripts.close(name, device_id, failed)
+    return not failed
+
+# This function sends many configuration lines to a console in one write
+def paste_lines(tn, lines, run_control, timeout=PASTE_TIMEOUT):
+    """
+    Paste lines into a console in one write and wait until the device has applied them.
+    Args:
+        tn (Telnet): The open Telnet connection.
+        lines (list): The lines to send, ending with a command that returns to a prompt.
+        run_control (RunControl): Deadlines and cancellation of the run.
+        timeout (float): Seconds the device may take to apply the lines.
+    Returns:
+        str: The console output up to the final prompt.
+    """
+    tn.write(("\n".join(lines) + "\n").encode('ascii'))
+    output = tn.read_until(lines[-1].encode('ascii'), timeout=run_control.timeout(timeout))
+    _, _, prompt = tn.expect([rb"[>#] ?$"], timeout=run_control.timeout(timeout))
+    return (output + prompt).decode('ascii', errors='ignore')
+
+# This function makes a device download its configuration from the config server
+def pull_config(tn, name, node_type, dev_num, device_id, config_server, run_control):
+    """
+    Give a device its management address and make it pull its configuration file.
+    Args:
+        tn (Telnet): The open Telnet connection, at the enable (or Junos operational) prompt.
+        name (str): The name of the node.
+        node_type (str): Type of the node (e.g., Router, Switch).
+        dev_num (int): The device number.
+        device_id (str): The ID of the device.
+        config_server (ConfigServer): Server holding the rendered configuration of the device.
+        run_control (RunControl): Deadlines and cancellation of the run.
+    """
+    paste_lines(tn, config_server.address_commands(name, node_type, dev_num), run_control)
+    commands, success = config_server.pull_commands(name, node_type, dev_num)
+    pull_started = time.monotonic()
+    for attempt in range(1, config_server.pull_retries + 1):
+        output = paste_lines(tn, commands, run_control, timeout=config_server.pull_timeout)
+        if success.search(output):
+            check_paste(name, output, commands)  # The file arrived, but the device may have rejected some of its lines
+            break
+        # The management interface may still be coming up, so a failed pull is retried
+        result = next((line.strip() for line in output.splitlines() if 'rror' in line), output.strip()[-200:])
+        if attempt == config_server.pull_retries:
+            raise RuntimeError(f"Configuration pull failed after {attempt} attempts: {result}")
+        logger.warning(f"Configuration pull for {node_type} (Device ID: {device_id}) failed (attempt {attempt}): {result}")
+        run_control.sleep(config_server.retry_delay)
+    logger.info(f"{node_type} (Device ID: {device_id}) applied its configuration from the config server in {time.monotonic() - pull_started:.1f}s.")
+
+    # Commands that answer a prompt are not part of the file
+    for command in config_server.console_commands(node_type, dev_num):
+        tn.write(f"{command}\n".encode('ascii'))
+        tn.expect([rb"#", rb"[Pp]assword:"], timeout=run_control.timeout(10))
+
+# This function logs in again to a console that was already configured
+def console_relogin(tn, name, settings, timeout=60, run_control=None):
+    """
+    Bring an already configured console to a privileged prompt.
+    Handles login and password prompts with the credentials from the
+    `console_credentials` setting, enters enable mode on Cisco and Arista
+    devices and starts the CLI from the Junos shell.
+    Args:
+        tn (Telnet): The open Telnet connection.
+        name (str): The name of the node.
+        settings (dict): Tuning settings with the `console_credentials` entry.
+        timeout (float): Seconds to wait for a usable prompt.
+        run_control (RunControl): Deadlines and cancellation of the run, if any.
+    Returns:
+        bytes: The prompt the device settled on (e.g. b"ciscorouter06#").
+    """
+    credentials = settings.get('console_credentials', {}).get(name, {})
+    patterns = [
+        rb"[Ll]ogin: ?$",
+        rb"[Uu]sername: ?$",
+        rb"[Pp]assword: ?$",
+        rb"root@[^\r\n]*:~ ?[#%] ?$",      # Junos shell
+        rb"\(config[^\r\n]*\)# ?$",        # Cisco / Arista configuration mode
+        rb"root@[^\r\n:]*# ?$",            # Junos configuration mode
+        rb"[^\r\n]*> ?$",
+        rb"[^\r\n]*# ?$",
+        rb"\[yes/no\]: ?$",               # Cisco setup dialog of a device booting without saved config
+    ]
+    deadline = time.monotonic() + timeout
+    enable_sent = False
+    tn.write(b"\r\n")
+    while time.monotonic() < deadline:
+        expect_timeout = max(0.1, min(RELOGIN_NUDGE, deadline - time.monotonic()))
+        if run_control:
+            expect_timeout = run_control.timeout(expect_timeout)
+        index, match, text = tn.expect(patterns, timeout=expect_timeout)
+        if index == -1:
+            tn.write(b"\r\n")  # A booting device only shows its prompt after RETURN once it is up
+        elif index == 8:
+            tn.write(b"no\n")
+        elif index in (0, 1):
+            tn.write(f"{credentials.get('username', 'admin')}\n".encode('ascii'))
+        elif index == 2:
+            password = credentials.get('enable_password', credentials.get('password', '')) if enable_sent else credentials.get('password', '')
+            tn.write(f"{password}\n".encode('ascii'))
+        elif index == 3:
+            tn.write(b"cli\n")
+        elif index == 4:
+            tn.write(b"end\n")
+        elif index == 5:
+            tn.write(b"exit configuration-mode\n")
+        elif index == 6 and name in ('vIOS', 'Switch', 'vEOS') and not enable_sent:
+            tn.write(b"enable\n")
+            enable_sent = True
+        elif index in (6, 7):
+            return match.group(0).strip()
+    raise TimeoutError(f"No prompt from {name} console within {timeout} seconds")
+
+def run_show_commands(tn, commands, prompt, timeout=30, run_control=None):
+    """
+    Run commands on a logged in console and collect their output.
+    Args:
+        tn (Telnet): The open Telnet connection.
+        commands (list): Commands to run.
+        prompt (bytes): The device prompt that ends each command output.
+        timeout (float): Seconds to wait for each command.
+        run_control (RunControl): Deadlines and cancellation of the run, if any.
+    Returns:
+        dict: Command mapped to its output.
+    """
+    outputs = {}
+    tn.read_very_eager()  # Drop anything left over from previous stages
+    for command in commands:
+        tn.write(f"{command}\n".encode('ascii'))
+        read_timeout = run_control.timeout(timeout) if run_control else timeout
+        output = tn.read_until(prompt, timeout=read_timeout).decode('ascii', errors='ignore')
+        outputs[command] = output
+    return outputs
+
+# This function reuses the pooled console (or logs in again) to run commands on a configured node
+def run_console_commands(port, name, device_id, node_type, commands, run):
+    """
+    Run show commands on a configured node.
+    The session kept by telnet_conn is reused when it is still in the pool,
+    otherwise a new console is opened and logged in with console_relogin().
+    Args:
+        port (str): The port number for the Telnet connection.
+        name (str): The name of the node.
+        device_id (str): The ID of the device.
+        node_type (str): Type of the node (e.g., Router, Switch).
+        commands (list): Commands to run.
+        run (RunContext): Objects shared by every node of the run.
+    Returns:
+        dict: Command mapped to its output.
+    """
+    with console_session(port, name, device_id, node_type, run.settings, run.transcripts, run.session_pool, run.run_control) as session:
+        return run_show_commands(session.connection, commands, session.prompt, run_control=run.run_control)
+
+@contextmanager
+def console_session(port, name, device_id, node_type, settings, transcripts, session_pool, run_control, login_timeout=60):
+    """
+    Lend a logged in console session of a configured node.
+    The pooled session is reused when there is one, otherwise a new console is
+    opened and logged in with console_relogin(). On failure the transcript is
+    dumped and the session dropped, otherwise it goes back to the pool.
+    """
+    session = session_pool.acquire(device_id)
+    if session is None:
+        while not session_pool.reserve(run_control.timeout(5)):
+            pass
+        try:
+            tn = CapturingTelnet(HOST, port, transcripts.open(name, device_id), run_control.timeout(TELNET_TIMEOUT))
+        except Exception:
+            session_pool.discard()
+            transcripts.close(name, device_id, True)
+            raise
+        session = PooledSession(
+            device_id, name, node_type, tn,
+            on_close=lambda session: transcripts.close(session.name, session.device_id),
+        )
+    try:
+        if session.prompt is None:
+            session.prompt = console_relogin(session.connection, name, settings, timeout=login_timeout, run_control=run_control)
+        yield session
+    except Exception:
+        transcripts.dump(name, device_id, 'console command failure')
+        session_pool.discard(session)
+        raise
+    session_pool.release(session)
+
+def verify_node(port, name, device_id, node_type, commands, run):
+    """
+    Run verification / show commands on a configured node and save their output.
+    Args:
+        port (str): The port number for the Telnet connection.
+        name (str): The name of the node.
+        device_id (str): The ID of the device.
+        node_type (str): Type of the node (e.g., Router, Switch).
+        commands (list): Commands to run.
+        run (RunContext): Objects shared by every node of the run.
+    Returns:
+        dict: Command mapped to its output.
+    """
+    outputs = run_console_commands(port, name, device_id, node_type, commands, run)
+
+    output_dir = run.settings.get('show_output_dir')
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, f"{name}_{device_id}.txt"), 'w') as show_file:
+            for command, output in outputs.items():
+                show_file.write(f"### {command}\n{output}\n")
+    logger.info(f"Collected {len(outputs)} show commands from {node_type} (Device ID: {device_id}).")
+    return outputs
+
+# This function saves the running configuration of a deployed node as its golden config
+def capture_golden_config(port, name, device_id, dev_num, node_type, image, run):
+    """
+    Capture the running configuration of a node into the golden config store.
+    Args:
+        port (str): The port number for the Telnet connection.
+        name (str): The name of the node.
+        device_id (str): The ID of the device.
+        dev_num (int): The device number.
+        node_type (str): Type of the node (e.g., Router, Switch).
+        image (str): Image name of the node, recorded in the store manifest.
+        run (RunContext): Objects shared by every node of the run.
+    Returns:
+        str: The captured configuration.
+    """
+    commands = CAPTURE_COMMANDS[name]
+    outputs = run_console_commands(port, name, device_id, node_type, commands, run)
+    config = clean_config(outputs[commands[-1]])
+    if not config.strip():
+        raise ValueError(f"Empty running configuration captured from {node_type} (Device ID: {device_id})")
+    run.golden_configs.save(node_type, dev_num, name, image, config)
+    return config
+
+# This function brings a running node in line with its workbook by pushing only what is missing
+def push_config_delta(port, name, device_id, dev_num, node_type, dev_config_file, run):
+    """
+    Diff the running configuration of a node against its workbook and push the delta.
+    The running config is read over SSH when the SSH transport is enabled,
+    otherwise over the console, and the delta goes back the same way.
+    Args:
+        port (str): The port number for the Telnet connection.
+        name (str): The name of the node.
+        device_id (str): The ID of the device.
+        dev_num (int): The device number.
+        node_type (str): Type of the node (e.g., Router, Switch).
+        dev_config_file (str): Path to the configuration file.
+        run (RunContext): Objects shared by every node of the run.
+    Returns:
+        int: Number of workbook lines that were missing on the device.
+    """
+    commands = load_device_commands(dev_config_file, dev_num)
+    if commands is None:
+        logger.warning(f"No configuration found for {node_type} (Device ID: {device_id}, Dev Num: {dev_num}). Skipping configuration.")
+        run.configure_queue.put(f"{datetime.datetime.now()} - No configuration found for {node_type} (Device ID: {device_id}, Dev Num: {dev_num}). Skipping configuration.")
+        return 0
+    show_commands = DIFF_COMMANDS[name]
+    if run.ssh_transport.enabled:
+        running = clean_config(run.ssh_transport.show(device_id, name, node_type, dev_num, show_commands, run.run_control))
+        delta, missing, compared = config_delta(name, commands, running)
+        if delta:
+            check_paste(name, run.ssh_transport.push(device_id, name, node_type, dev_num, delta, run.run_control), delta)
+    else:
+        # A node that was just started again may still be booting
+        login_timeout = run.settings.get('watch', {}).get('boot_timeout', 600) if f"{node_type} {dev_num}" in run.recover_nodes else 60
+        with console_session(port, name, device_id, node_type, run.settings, run.transcripts, run.session_pool, run.run_control, login_timeout) as session:
+            outputs = run_show_commands(session.connection, show_commands, session.prompt, run_control=run.run_control)
+            delta, missing, compared = config_delta(name, commands, clean_config(outputs[show_commands[-1]]))
+            if delta:
+                check_paste(name, paste_lines(session.connection, delta, run.run_control), delta)
+    logger.info(f"Pushed {missing} of {compared} workbook lines to {node_type} (Device ID: {device_id}); the rest is already applied.")
+    run.configure_queue.put(f"{datetime.datetime.now()} - {node_type} - node {device_id}: {missing} of {compared} lines changed")
+    return missing
 
 # Trheading function to create and manage nodes
 # This function will create threads for each node type and manage their execution
@@ -455,11 +721,16 @@ def run_threads(
     eve_interface_connection,
     node_interface,
     network_mgmt,
+    eve_lab_url,
     router_config,
     switch_config,
     aristasw_config,
     juniperfw_config,
-    colors
+    colors,
+    settings,
+    profiler=None,
+    incremental=False,
+    recover_nodes=None
 ):
     """
     Run threads for node creation and configuration.
@@ -478,11 +749,19 @@ def run_threads(
         eve_interface_connection (str): URL for connecting interfaces API.
         node_interface (str): URL for getting node interface information.
         network_mgmt (str): URL for management network API.
+        eve_lab_url (str): URL of the lab, used for lab-wide operations such as link wiring.
         router_config (str): Path to router configuration file.
         switch_config (str): Path to switch configuration file.
         aristasw_config (str): Path to Arista switch configuration file.
         juniperfw_config (str): Path to Juniper firewall configuration file.
         colors (dict): Dictionary containing color codes for terminal output.
+        settings (dict): Optional tuning settings from the configuration file.
+        profiler (SamplingProfiler): Profiler started by `--profile`; samples are tagged with each node's stage.
+        incremental (bool): Push only the changed lines to the nodes recorded in the inventory and deploy the others.
+        recover_nodes (set): Used by the watch mode with `incremental`: only these nodes
+            ("<node type> <device number>") are processed, and recorded nodes are started again first.
+    Returns:
+        dict: Per-node progress from RunControl.summary().
     """
     # Initialize queues and locks for thread-safe communication
     threads = []
@@ -492,28 +771,148 @@ def run_threads(
     configure_queue = Queue()
     closeconnection_queue = Queue()
     lock = threading.Lock()
+    boot_history = BootHistory(
+        settings.get('boot_history_file'),
+        max_samples=settings.get('boot_history_samples', 50),
+        tight_interval=settings.get('tight_poll_interval', 1),
+    )
+    transcripts = TranscriptStore(
+        settings.get('transcript_dir'),
+        capacity=settings.get('transcript_size', 65536),
+        use_mmap=settings.get('transcript_mmap', False),
+        dump_mode=settings.get('transcript_dump', 'failure'),
+    )
+    transcripts.install_signal_handler()  # SIGUSR1 dumps every open console transcript
+    session_pool = SessionPool(
+        max_sessions=settings.get('session_pool_size', 0),
+        idle_timeout=settings.get('session_idle_timeout', 300),
+    )
+    ssh_transport = SshTransport(settings, nodes)
+    config_server = ConfigServer(settings, nodes)
+    links_file = settings.get('topology_links_file')
+    links = load_links(links_file) if links_file else []
+    lab_build = settings.get('lab_build', {})
+    deployed_nodes = load_inventory(settings.get('inventory_file'), eve_lab_url) if incremental else {}
+    # An incremental run keeps the lab: nothing is imported and existing links stay as they are
+    import_mode = lab_build.get('mode', 'api') == 'import' and not deployed_nodes
+    node_specs = {
+        'Cisco Router': (router_payload, router_config),
+        'Cisco Switch': (switch_payload, switch_config),
+        'Arista Switch': (aristasw_payload, aristasw_config),
+        'Juniper Firewall': (juniperfw_payload, juniperfw_config),
+    }
+    # Canvas position of every node: from the link file when it has them, on a grid otherwise
+    node_positions = grid_positions(nodes, node_specs)
+    if links_file:
+        node_positions.update(load_positions(links_file))
+    golden_configs = GoldenConfigs(
+        settings, topology_fingerprint(nodes, node_specs, links_file),
+        eve_lab_url, response, headers, lock,
+        http_timeout=settings.get('http_timeout', HTTP_TIMEOUT),
+    )
+    config_server.publish(nodes, node_specs)
+
+    # Fork the console worker processes before the engines and the config server start their threads.
+    # Only the profiler's sampler may be running: it is held between two samples while forking.
+    with profiler.paused() if profiler is not None else nullcontext():
+        console_workers = ConsoleWorkers(
+            settings.get('console_processes', 0), telnet_conn, colors, settings,
+            boot_history, transcripts, ssh_transport, golden_configs, config_server,
+        )
+    console_workers.bind_queues(createnode_queue, starnode_queue, connectnode_queue, configure_queue, closeconnection_queue)
+
+    run_control = RunControl(
+        run_timeout=settings.get('run_timeout'),
+        stage_timeouts=settings.get('stage_timeouts', {}),
+        failure_threshold=settings.get('failure_threshold', 0),
+    )
+    if profiler is not None:
+        profiler.attach(run_control)
+    link_engine = LinkEngine(
+        [] if import_mode or deployed_nodes else links,  # Imported labs already contain their links
+        nodes, eve_lab_url, network_mgmt, response, headers, lock,
+        http_timeout=settings.get('http_timeout', HTTP_TIMEOUT),
+        run_control=run_control,
+    )
+    start_engine = StartEngine(
+        nodes, eve_lab_url, eve_node_creation_url, eve_start_nodes_url, response, headers, boot_history, settings,
+        http_timeout=settings.get('http_timeout', HTTP_TIMEOUT),
+        lab_start=not recover_nodes,  # A watch recovery must not start the nodes left alone
+        run_control=run_control,
+    )
+    config_server.start()
+
+    # Build the whole lab offline and import it with one call instead of creating nodes one by one
+    imported_nodes = {}
+    if import_mode:
+        startup_configs = {}
+        if golden_configs.method == 'startup':
+            for dev in nodes:
+                for node_type, value in dev.items():
+                    for dev_num in range(value):
+                        config = golden_configs.replay_config(node_type, dev_num)
+                        if config is not None:
+                            startup_configs[f"{node_type} {dev_num}"] = config
+        mgmt_network = dict(lab_build.get('mgmt_network', {}), id=link_engine.mgmt_network_id)
+        lab_xml, imported_nodes = build_lab(lab_location(eve_lab_url)[2], nodes, node_specs, links, mgmt_network, startup_configs, node_positions)
+        import_lab(
+            eve_lab_url, lab_xml, response, headers,
+            replace_existing=lab_build.get('replace_existing', False),
+            timeout=run_control.timeout(settings.get('http_timeout', HTTP_TIMEOUT)),
+        )
+        print(f'{colors.get("green")}Lab imported with {len(imported_nodes)} nodes and {len(links)} links: {colors.get("reset")}{eve_lab_url}\n')
 
     # Calculate the total number of devices
     total_devices = sum(value for dev in nodes for value in dev.values())
+    if recover_nodes:
+        total_devices = len(recover_nodes)
     print(f'{colors.get("green")}Total devices to be created: {colors.get("reset")}{total_devices}\n')
-    # Create a tuple of arguments to be passed to the threading_process function
-    args_var = (
-        response,
-        headers,
-        eve_node_creation_url,
-        eve_start_nodes_url,
-        eve_node_port,
-        eve_interface_connection,
-        node_interface,
-        network_mgmt,
-        createnode_queue,
-        starnode_queue,
-        connectnode_queue,
-        configure_queue,
-        closeconnection_queue,
-        lock,
-        colors
+    if link_engine.enabled:
+        print(f'{colors.get("green")}Topology links to be wired: {colors.get("reset")}{len(link_engine.links)}\n')
+    if golden_configs.replaying:
+        print(f'{colors.get("green")}Replaying golden configs ({golden_configs.method}): {colors.get("reset")}{golden_configs.version_dir}\n')
+    elif golden_configs.capturing:
+        print(f'{colors.get("green")}Capturing golden configs for topology version: {colors.get("reset")}{golden_configs.fingerprint[:12]}\n')
+    if console_workers.enabled:
+        print(f'{colors.get("green")}Console worker processes: {colors.get("reset")}{console_workers.processes}\n')
+    if config_server.enabled:
+        print(f'{colors.get("green")}Devices pull their configuration from: {colors.get("reset")}http://{config_server.host}:{config_server.port}\n')
+    # Objects shared by every node, passed to each stage as one record
+    run = RunContext(
+        response=response,
+        headers=headers,
+        eve_node_creation_url=eve_node_creation_url,
+        eve_start_nodes_url=eve_start_nodes_url,
+        eve_node_port=eve_node_port,
+        eve_interface_connection=eve_interface_connection,
+        node_interface=node_interface,
+        network_mgmt=network_mgmt,
+        createnode_queue=createnode_queue,
+        starnode_queue=starnode_queue,
+        connectnode_queue=connectnode_queue,
+        configure_queue=configure_queue,
+        closeconnection_queue=closeconnection_queue,
+        lock=lock,
+        colors=colors,
+        settings=settings,
+        boot_history=boot_history,
+        transcripts=transcripts,
+        session_pool=session_pool,
+        ssh_transport=ssh_transport,
+        link_engine=link_engine,
+        run_control=run_control,
+        golden_configs=golden_configs,
+        imported_nodes=imported_nodes,
+        console_workers=console_workers,
+        deployed_nodes=deployed_nodes,
+        start_engine=start_engine,
+        config_server=config_server,
+        recover_nodes=recover_nodes or set(),
     )
+    # Each node type's payload is frozen once and shared read-only by the jobs of its nodes
+    payloads = {node_type: freeze_payload(payload) for node_type, (payload, _) in node_specs.items()}
+    if deployed_nodes:
+        print(f'{colors.get("green")}Incremental update of deployed nodes: {colors.get("reset")}{len(deployed_nodes)}\n')
 
     # Create progress bars with consecutive positions
     create_progress = tqdm(total=total_devices, desc=f'{colors.get("green")}Creating Nodes{colors.get("reset")}', position=0, leave=True, ncols=100)
@@ -525,41 +924,68 @@ def run_threads(
     for dev in nodes:  # Loop through each dictionary in the nodes list
         for node_type, value in dev.items():  # Loop through each device type and count
             for dev_num in range(value):  # Create a thread for each instance
-                if node_type == "Cisco Router":
-                    th = threading.Thread(
-                        target=threading_process,
-                        args=(dev_num, node_type, router_payload, router_config, create_progress, start_progress, connect_progress, configure_progress, close_progress, *args_var),
-                    )
-                    threads.append(th)
-                    time.sleep(3)  # Add a delay of 3 seconds
-                elif node_type == "Cisco Switch":
-                    th = threading.Thread(
-                        target=threading_process,
-                        args=(dev_num, node_type, switch_payload, switch_config, create_progress, start_progress, connect_progress, configure_progress, close_progress, *args_var),
-                    )
-                    threads.append(th)
-                elif node_type == "Arista Switch":
-                    th = threading.Thread(
-                        target=threading_process,
-                        args=(dev_num, node_type, aristasw_payload, aristasw_config, create_progress, start_progress, connect_progress, configure_progress, close_progress, *args_var),
-                    )
-                    threads.append(th)
-                elif node_type == "Juniper Firewall":
-                    th = threading.Thread(
-                        target=threading_process,
-                        args=(dev_num, node_type, juniperfw_payload, juniperfw_config, create_progress, start_progress, connect_progress, configure_progress, close_progress, *args_var),
-                    )
-                    threads.append(th)
-                else:
+                if recover_nodes and f"{node_type} {dev_num}" not in recover_nodes:
+                    # Watch recovery: only the nodes that went down are processed
+                    link_engine.node_failed(node_type, dev_num)
+                    start_engine.node_skipped(node_type, dev_num)
+                    continue
+                if node_type not in node_specs:
                     print(f'{colors.get("red")}{datetime.datetime.now()} - Unsupported node type: {node_type}{colors.get("reset")}')
+                    link_engine.node_failed(node_type, dev_num)  # Nothing to wait for
+                    start_engine.node_skipped(node_type, dev_num)
+                    continue
+                left, top = node_positions[f"{node_type} {dev_num}"]
+                job = NodeJob(node_type, dev_num, node_specs[node_type][1], payloads[node_type], (('left', str(left)), ('top', str(top))))
+                th = threading.Thread(
+                    target=threading_process,
+                    name=job.key,
+                    args=(job, create_progress, start_progress, connect_progress, configure_progress, close_progress, run),
+                    daemon=True,  # A worker still stuck after the grace period must not keep the process alive
+                )
+                threads.append(th)
 
     # Start all threads
     for th in threads:
         th.start()
 
     # Wait for all threads to finish
-    for th in threads:
-        th.join()
+    # Ctrl-C or an expired run deadline cancels the run and gives the workers a grace period to stop
+    grace_period = settings.get('cancel_grace_period', 15)
+    try:
+        for th in threads:
+            while th.is_alive():
+                th.join(1)
+                if run_control.run_expired(grace_period):
+                    run_control.cancel("Run deadline exceeded")
+                    break
+    except KeyboardInterrupt:
+        print(f'\n{colors.get("red")}{datetime.datetime.now()} - Interrupted, stopping all workers (up to {grace_period}s)...{colors.get("reset")}')
+        run_control.cancel("Interrupted by the user")
+    if run_control.cancelled:
+        console_workers.cancel()
+        grace_deadline = time.monotonic() + grace_period
+        for th in threads:
+            th.join(max(0, grace_deadline - time.monotonic()))
+
+    # Close the console sessions kept for the later stages
+    session_pool.close_all()
+    console_workers.close()
+    start_engine.close()
+    logger.info(f"Started nodes in {start_engine.waves} waves with {start_engine.api_calls} API calls (starts and status polls).")
+    ssh_transport.close_all()
+    config_server.close()
+
+    # Keep the observed boot timings for the next run
+    boot_history.save()
+
+    # Remember the device ID of every deployed node for incremental runs
+    save_inventory(settings.get('inventory_file'), eve_lab_url, {
+        **run_control.summary(),
+        **{node: {'device_id': device_id} for node, device_id in deployed_nodes.items()},
+    })
+
+    # Publish the captured configs as a new golden config version (only if every device was captured)
+    golden_version = golden_configs.publish(total_devices)
 
     # Close progress bars
     create_progress.close()
@@ -594,64 +1020,178 @@ def run_threads(
     while not closeconnection_queue.empty():
         print(closeconnection_queue.get())
 
+    # Report how far every node got, so a cancelled run still shows its partial results
+    print(f'\n{colors.get("green")}#### RUN SUMMARY ####{colors.get("reset")}')
+    if run_control.cancelled:
+        print(f'{colors.get("red")}Run cancelled: {run_control.cancel_reason}{colors.get("reset")}')
+    if golden_version:
+        print(f'{colors.get("green")}Golden configs saved: {colors.get("reset")}{golden_version}')
+    for node, progress in run_control.summary().items():
+        status = progress['status'] if progress['status'] != 'running' else 'abandoned (still running)'
+        color = colors.get("green") if status == 'done' else colors.get("red")
+        details = f"stage: {progress['stage']}, Device ID: {progress['device_id']}"
+        if progress.get('error'):
+            details += f", error: {progress['error']}"
+        print(f'{color}{node} - {status}{colors.get("reset")} ({details})')
+    return run_control.summary()
+
 # This function will be called by each thread to handle the node creation and management
 # It will call the process_node function to handle the node creation, starting, and port retrieval
 
-def threading_process(dev_num, node_type, device_payload, dev_config_file, create_progress, start_progress, connect_progress, configure_progress, close_progress, *args):
+def threading_process(job, create_progress, start_progress, connect_progress, configure_progress, close_progress, run):
     """
     Process a single node by creating, starting, and configuring it.
     Args:
-        dev_num (int): Device number for the node.
-        node_type (str): Type of the node (e.g., Router, Switch).
-        device_payload (dict): Payload containing node configuration.
-        dev_config_file (str): Path to the configuration file.
+        job (NodeJob): The device to process: node type, device number, workbook and payload.
         create_progress (tqdm): Progress bar for node creation.
         start_progress (tqdm): Progress bar for starting nodes.
         connect_progress (tqdm): Progress bar for connecting nodes.
         configure_progress (tqdm): Progress bar for configuring nodes.
         close_progress (tqdm): Progress bar for closing connections.
-        args (tuple): Additional arguments for API calls.
+        run (RunContext): Objects shared by every node of the run.
     Returns:    
         None
     """
     # Unpack the arguments
-    (
-        response,
-        headers,
-        eve_node_creation_url,
-        eve_start_nodes_url,
-        eve_node_port,
-        eve_interface_connection,
-        node_interface,
-        network_mgmt,
-        createnode_queue,
-        starnode_queue,
-        connectnode_queue,
-        configure_queue,
-        closeconnection_queue,
-        lock,
-        colors
-    ) = args
+    node_type, dev_num, dev_config_file = job.node_type, job.dev_num, job.config_file
 
+    # Every blocking call below takes its timeout from the current stage deadline
+    run.run_control.start_node(job.key)
     try:
-        # Step 1: Create the node
-        device_id = create_nodes(dev_num, node_type, device_payload, *args)
+        # Incremental mode: the node is already deployed, so only the changed lines are pushed
+        device_id = run.deployed_nodes.get(job.key)
+        if device_id is not None:
+            run.run_control.set_device_id(device_id)
+            recovering = job.key in run.recover_nodes
+            if not recovering:
+                run.start_engine.node_skipped(node_type, dev_num)  # Already running
+            create_progress.update(1)
+            if recovering:
+                # Stopped or crashed while watched: start it again with the next wave
+                run.run_control.start_stage('start')
+                run.start_engine.request_start(node_type, dev_num, device_id, job.get('image'))
+                running = None
+                while running is None:
+                    running = run.start_engine.wait_running(device_id, run.run_control.timeout(5))
+                if not running:
+                    raise RuntimeError(f"Node {device_id} did not start again")
+                run.starnode_queue.put(f'{datetime.datetime.now()} - Node {device_id} - {node_type} started again')
+            start_progress.update(1)
+            port, name = get_node_port(device_id, run)
+            connect_progress.update(1)
+            run.run_control.start_stage('diff')
+            push_config_delta(port, name, device_id, dev_num, node_type, dev_config_file, run)
+            configure_progress.update(1)
+            close_progress.update(1)
+            run.run_control.finish_node('done')
+            return
+
+        # A captured golden config replaces the workbook: as startup config the node boots configured
+        golden_config = run.golden_configs.replay_config(node_type, dev_num)
+        startup_config = golden_config if run.golden_configs.method == 'startup' else None
+        if startup_config is not None:
+            job = job.with_payload(config="1")
+
+        # Step 1: Create the node (an imported lab already holds it, its links and its startup config)
+        image = job.get('image')
+        device_id = run.imported_nodes.get(job.key)
+        if device_id is not None:
+            run.createnode_queue.put(f'{datetime.datetime.now()} - {node_type} - Eve-ng Node {device_id} imported with the lab')
+        else:
+            stage_start = time.monotonic()
+            run.run_control.start_stage('create')
+            device_id = create_nodes(job, run)
+            if startup_config is not None:
+                run.golden_configs.upload_startup_config(device_id, startup_config, run.run_control)
+            run.boot_history.record(image, 'create', time.monotonic() - stage_start)  # Stage timings feed the --plan estimate
+        run.run_control.set_device_id(device_id)
         create_progress.update(1)
 
-        # Step 2: Start the node
-        start_nodes(device_id, node_type, *args)
+        # Step 1b: Wire the topology once every node exists (no-op without topology links)
+        run.run_control.start_stage('wire')
+        run.link_engine.node_created(node_type, dev_num, device_id)
+        while not run.link_engine.wait_until_wired(run.run_control.timeout(5)):
+            pass  # Wake up regularly to notice a cancelled run
+
+        # Step 2: Start the node with the next wave and wait until it is running
+        run.run_control.start_stage('start')
+        started_at = time.monotonic()
+        logger.info(f"Queueing node {node_type} with ID {device_id} for the next start wave.")
+        run.starnode_queue.put(f'{datetime.datetime.now()} - Starting {node_type} Eve-ng node {device_id} ')
+        run.start_engine.request_start(node_type, dev_num, device_id, image)
+        running = None
+        while running is None:
+            running = run.start_engine.wait_running(device_id, run.run_control.timeout(5))  # Wake up regularly to notice a cancelled run
+        if running:
+            run.starnode_queue.put(f'{datetime.datetime.now()} - Node {device_id} - {node_type} started successfully')
+        else:
+            run.starnode_queue.put(f'{run.colors.get("red")}{datetime.datetime.now()} - Node {device_id} - {node_type} failed to start in time{run.colors.get("reset")}')
         start_progress.update(1)
 
         # Step 3: Get the node's port information
-        port, name = get_node_port(device_id, *args)
+        port, name = get_node_port(device_id, run)
         connect_progress.update(1)
 
-        # Step 4: Configure the node
-        telnet_conn(port, name, device_id, dev_num, node_type, dev_config_file, *args)
+        # Step 4: Configure the node (skipped when it boots from its golden startup config)
+        if startup_config is not None:
+            console_ok = True
+            run.configure_queue.put(f"{datetime.datetime.now()} - {node_type} - node {device_id} booted from its golden startup config")
+        else:
+            run.run_control.start_stage('console')
+            stage_start = time.monotonic()
+            if run.console_workers.enabled:
+                # Prompt matching and logging run in a worker process, outside this interpreter's GIL
+                console_ok = run.console_workers.run(port, name, device_id, dev_num, node_type, dev_config_file, image, started_at, run.run_control)
+            else:
+                console_ok = telnet_conn(port, name, device_id, dev_num, node_type, dev_config_file, image, started_at, run)
+            run.boot_history.record(image, 'console', time.monotonic() - stage_start)
         configure_progress.update(1)
 
-        # Step 5: Close the connection
+        # Step 4b: Push the bulk configuration over the management network
+        if run.ssh_transport.enabled and golden_config is None:
+            run.run_control.start_stage('configure')
+            commands = load_device_commands(dev_config_file, dev_num)
+            if commands:
+                run.configure_queue.put(f"{datetime.datetime.now()} - Pushing {len(commands)} commands to {node_type} - node {device_id} over SSH")
+                check_paste(name, run.ssh_transport.push(device_id, name, node_type, dev_num, commands, run.run_control), commands)
+                run.configure_queue.put(f"{datetime.datetime.now()} - SSH configuration applied to {node_type} - node {device_id}")
+
+        # Step 5: Verify the node over the pooled console session
+        verify_commands = run.settings.get('verify_commands', {}).get(name)
+        if verify_commands:
+            run.run_control.start_stage('verify')
+            verify_node(port, name, device_id, node_type, verify_commands, run)
+            run.configure_queue.put(f"{datetime.datetime.now()} - Verification output collected for {node_type} - node {device_id}")
+
+        # Step 5b: Capture the running configuration for later builds of this topology
+        if run.golden_configs.capturing and console_ok:
+            run.run_control.start_stage('capture')
+            try:
+                capture_golden_config(port, name, device_id, dev_num, node_type, image, run)
+                run.configure_queue.put(f"{datetime.datetime.now()} - Golden config captured for {node_type} - node {device_id}")
+            except DeploymentCancelled:
+                raise
+            except Exception as e:
+                logger.error(f"Golden config capture failed for {node_type} (Device ID: {device_id}): {e}")
+                run.configure_queue.put(f"{run.colors.get('red')}{datetime.datetime.now()} - Golden config capture failed for {node_type} - node {device_id}: {e}{run.colors.get('reset')}")
+
+        # Step 6: Close the connection
         close_progress.update(1)
+        if console_ok:
+            run.run_control.finish_node('done')
+        else:
+            run.run_control.finish_node('failed', 'Console configuration failed')
 
+    except DeploymentCancelled as e:
+        run.closeconnection_queue.put(f'{run.colors.get("red")}Cancelled node {node_type} instance {dev_num}: {e}{run.colors.get("reset")}')
+        run.run_control.finish_node('cancelled', str(e))
+    except ConfigPushError as e:
+        # The push stopped at the first rejected line; later stages would only build on a broken config
+        run.configure_queue.put(f'{run.colors.get("red")}{datetime.datetime.now()} - {node_type} - node {device_id} rejected {e}{run.colors.get("reset")}')
+        run.run_control.finish_node('failed', str(e), details=e.details())
     except Exception as e:
-        closeconnection_queue.put(f'{colors.get("red")}Error processing node {node_type} instance {dev_num}: {e}{colors.get("reset")}')
\ No newline at end of file
+        run.closeconnection_queue.put(f'{run.colors.get("red")}Error processing node {node_type} instance {dev_num}: {e}{run.colors.get("reset")}')
+        run.run_control.finish_node('failed', str(e))
+    finally:
+        run.link_engine.node_failed(node_type, dev_num)  # No-op once the node has reported its creation
+        run.start_engine.node_skipped(node_type, dev_num)  # No-op once the node has asked to be started
\ No newline at end of file
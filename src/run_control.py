@@ -0,0 +1,168 @@
+"""
+Run-level and per-stage deadlines with cooperative cancellation.
+
+Every worker thread works on one node and moves through stages (create, start,
+console, ...). RunControl keeps the current node and stage of each thread, so
+HTTP calls, poll loops and console reads only have to ask it for a timeout:
+the answer is capped by the stage deadline and the run deadline, and raises as
+soon as the run is cancelled. Sleeps wait on the cancel event, so Ctrl-C or a
+failure threshold stops all workers within one read timeout.
+"""
+
+import threading
+import time
+import logging
+from exceptions import DeploymentCancelled, DeadlineExceeded
+
+logger = logging.getLogger()
+
+
+class RunControl:
+    """
+    Deadlines, cancellation and per-node progress of one deployment run.
+    """
+
+    def __init__(self, run_timeout=None, stage_timeouts=None, failure_threshold=0, run_deadline=None):
+        """
+        Args:
+            run_timeout (float): Seconds the whole run may take. None means no limit.
+            stage_timeouts (dict): Stage name mapped to the seconds one node may spend in it.
+            failure_threshold (int): Number of failed nodes that cancels the run. 0 disables it.
+            run_deadline (float): time.monotonic() value the run must end by; overrides `run_timeout`.
+        """
+        if run_deadline is None and run_timeout:
+            run_deadline = time.monotonic() + run_timeout
+        self.run_deadline = run_deadline
+        self.stage_timeouts = stage_timeouts or {}
+        self.failure_threshold = failure_threshold
+        self.cancel_reason = None
+        self.failures = 0
+        self.node_progress = {}
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._thread_context = {}
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def run_expired(self, grace_period=0):
+        """
+        Return True once the run deadline plus a grace period has passed.
+        """
+        return self.run_deadline is not None and time.monotonic() >= self.run_deadline + grace_period
+
+    def cancel(self, reason):
+        """
+        Ask every worker to stop at its next timeout or check.
+        """
+        with self._lock:
+            if self.cancel_reason is None:
+                self.cancel_reason = reason
+                logger.warning(f"Cancelling the run: {reason}")
+        self._cancelled.set()
+
+    def start_node(self, node):
+        """
+        Bind the calling thread to a node (e.g. 'Cisco Router 0').
+        """
+        self._local.node = node
+        self._local.stage = None
+        self._local.deadline = self.run_deadline
+        self._thread_context[threading.get_ident()] = (node, None)
+        with self._lock:
+            self.node_progress[node] = {'stage': None, 'status': 'running', 'device_id': None}
+
+    def set_device_id(self, device_id):
+        with self._lock:
+            self.node_progress[self._local.node]['device_id'] = device_id
+
+    def start_stage(self, stage):
+        """
+        Enter a stage; its timeout applies until the next stage starts.
+        """
+        self.check()
+        self._local.stage = stage
+        stage_timeout = self.stage_timeouts.get(stage)
+        deadline = self.run_deadline
+        if stage_timeout:
+            stage_deadline = time.monotonic() + stage_timeout
+            deadline = stage_deadline if deadline is None else min(deadline, stage_deadline)
+        self._local.deadline = deadline
+        self._thread_context[threading.get_ident()] = (self._local.node, stage)
+        with self._lock:
+            self.node_progress[self._local.node]['stage'] = stage
+
+    def finish_node(self, status, error=None, details=None):
+        """
+        Record the outcome of the calling thread's node and count failures.
+        `details` holds structured error data, such as the line a device rejected.
+        """
+        with self._lock:
+            progress = self.node_progress[self._local.node]
+            progress['status'] = status
+            progress['error'] = error
+            if details is not None:
+                progress['details'] = details
+            if status == 'failed':
+                self.failures += 1
+                over_threshold = self.failure_threshold and self.failures >= self.failure_threshold
+            else:
+                over_threshold = False
+        if over_threshold:
+            self.cancel(f"{self.failures} nodes failed (threshold {self.failure_threshold})")
+
+    def context(self, thread_id):
+        """
+        Return the (node, stage) another thread is working on, e.g. for the sampling profiler.
+        """
+        return self._thread_context.get(thread_id, (None, None))
+
+    def check(self):
+        """
+        Raise if the run was cancelled or the current deadline has passed.
+        """
+        if self._cancelled.is_set():
+            raise DeploymentCancelled(self.cancel_reason)
+        deadline = getattr(self._local, 'deadline', self.run_deadline)
+        if deadline is not None and time.monotonic() >= deadline:
+            raise DeadlineExceeded(f"Deadline exceeded in stage {getattr(self._local, 'stage', None)}")
+
+    def deadline(self):
+        """
+        Return the calling thread's current deadline as a time.monotonic() value, or None.
+        """
+        self.check()
+        return getattr(self._local, 'deadline', self.run_deadline)
+
+    def timeout(self, cap=None):
+        """
+        Return a timeout for a blocking call: `cap` limited by the current deadline.
+        Args:
+            cap (float): The call's own timeout. None means no limit of its own.
+        Returns:
+            float: Seconds to wait, or None if neither the call nor the deadlines set a limit.
+        """
+        self.check()
+        deadline = getattr(self._local, 'deadline', self.run_deadline)
+        if deadline is None:
+            return cap
+        remaining = deadline - time.monotonic()
+        return remaining if cap is None else min(cap, remaining)
+
+    def sleep(self, seconds):
+        """
+        Sleep, waking up early if the run is cancelled or the deadline comes first.
+        """
+        timeout = self.timeout(seconds)
+        if timeout and timeout > 0:
+            self._cancelled.wait(timeout)
+        self.check()
+
+    def summary(self):
+        """
+        Return a copy of the per-node progress (stage reached and status).
+        """
+        with self._lock:
+            return {node: dict(progress) for node, progress in self.node_progress.items()}
@@ -0,0 +1,173 @@
+"""
+Pool of authenticated device sessions.
+
+Logging in to a console is the slowest part of a deployment (vEOS even reboots
+once before it can be configured), so sessions that finished configuration are
+kept open and handed to later stages such as verification, show-command
+collection and incremental pushes. Idle sessions are closed after a timeout and
+the total number of open sessions is capped.
+"""
+
+import threading
+import time
+import logging
+
+logger = logging.getLogger()
+
+
+class PooledSession:
+    """
+    An authenticated session kept by the pool.
+    """
+
+    def __init__(self, device_id, name, node_type, connection, prompt=None, on_close=None, kind="Telnet connection"):
+        """
+        Args:
+            device_id (str): EVE-NG node ID.
+            name (str): Node name (e.g. 'vIOS').
+            node_type (str): Type of the node (e.g., Router, Switch).
+            connection: The open connection (Telnet or SSH channel), must provide close().
+            prompt (bytes): The device prompt seen after login, if known.
+            on_close (callable): Called with the session after the connection is closed.
+            kind (str): Session description used in log messages.
+        """
+        self.device_id = device_id
+        self.name = name
+        self.node_type = node_type
+        self.connection = connection
+        self.prompt = prompt
+        self.on_close = on_close
+        self.kind = kind
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.connection.close()
+            logger.info(f"{self.kind} closed for {self.node_type} (Device ID: {self.device_id}).")
+        except Exception as e:
+            logger.error(f"Error while closing session for {self.node_type} (Device ID: {self.device_id}): {e}")
+        finally:
+            if self.on_close:
+                self.on_close(self)
+
+
+class SessionPool:
+    """
+    Thread-safe pool of open sessions keyed by device ID.
+    """
+
+    def __init__(self, max_sessions=0, idle_timeout=300):
+        """
+        Args:
+            max_sessions (int): Maximum number of open sessions (idle and in use).
+                0 disables pooling, so sessions are closed as soon as they are released.
+            idle_timeout (float): Seconds after which an idle session is closed.
+        """
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._in_use = 0
+        self._condition = threading.Condition()
+        self._closed = threading.Event()
+        self._reaper = None  # Started with the first idle session, so creating a pool starts no thread
+
+    @property
+    def enabled(self):
+        return self.max_sessions > 0
+
+    def reserve(self, timeout=None):
+        """
+        Reserve a slot for a new session, closing the least recently used idle
+        session if the pool is full, or waiting until a session is released.
+        Args:
+            timeout (float): Seconds to wait for a free slot. None waits without limit.
+        Returns:
+            bool: True if a slot was reserved, False if the wait timed out.
+        """
+        if not self.enabled:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._in_use + len(self._idle) >= self.max_sessions:
+                if self._idle:
+                    oldest = min(self._idle.values(), key=lambda session: session.last_used)
+                    del self._idle[oldest.device_id]
+                    self._close_outside_lock(oldest)
+                    continue
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self._in_use += 1
+            return True
+
+    def acquire(self, device_id):
+        """
+        Take the idle session of a device out of the pool.
+        Returns:
+            PooledSession: The session, or None if the device has no idle session.
+        """
+        with self._condition:
+            session = self._idle.pop(device_id, None)
+            if session is not None:
+                self._in_use += 1
+                session.last_used = time.monotonic()
+            return session
+
+    def release(self, session):
+        """
+        Return a session to the pool after use. Without pooling it is closed.
+        """
+        if not self.enabled:
+            session.close()
+            return
+        with self._condition:
+            self._in_use -= 1
+            session.last_used = time.monotonic()
+            if self._closed.is_set():
+                self._close_outside_lock(session)
+            else:
+                self._idle[session.device_id] = session
+                if self._reaper is None:
+                    self._reaper = threading.Thread(target=self._reap_idle, name="session-pool-reaper", daemon=True)
+                    self._reaper.start()
+            self._condition.notify()
+
+    def discard(self, session=None):
+        """
+        Give up a reserved slot, closing the session if there is one (e.g. after a failure).
+        """
+        if session is not None:
+            session.close()
+        if self.enabled:
+            with self._condition:
+                self._in_use -= 1
+                self._condition.notify()
+
+    def _close_outside_lock(self, session):
+        # Closing a console can block, so do it in the background
+        threading.Thread(target=session.close, daemon=True).start()
+
+    def _reap_idle(self):
+        while not self._closed.wait(min(self.idle_timeout, 5)):
+            now = time.monotonic()
+            with self._condition:
+                expired = [session for session in self._idle.values() if now - session.last_used >= self.idle_timeout]
+                for session in expired:
+                    del self._idle[session.device_id]
+                if expired:
+                    self._condition.notify_all()
+            for session in expired:
+                logger.info(f"Closing idle session for {session.node_type} (Device ID: {session.device_id}).")
+                session.close()
+
+    def close_all(self):
+        """
+        Close every idle session and stop the idle reaper.
+        """
+        self._closed.set()
+        with self._condition:
+            sessions = list(self._idle.values())
+            self._idle.clear()
+        for session in sessions:
+            session.close()
@@ -0,0 +1,362 @@
+"""
+Management-plane SSH fast path.
+
+Every node is wired to the management network, so once a device has an
+address, a user and SSH enabled, the bulk of its configuration can go over SSH
+instead of the slow serial console. In this mode the console stage only pushes
+a small vendor bootstrap built from BOOTSTRAP_TEMPLATES; the workbook commands
+are then sent over pooled SSH sessions, either pasted into one shell write or
+copied to the device as a file with SCP and applied with a single command.
+
+paramiko is only required when the SSH transport is enabled.
+"""
+
+import ipaddress
+import posixpath
+import re
+import time
+import logging
+from session_pool import PooledSession, SessionPool
+
+try:
+    import paramiko
+except ImportError:  # Only needed for the SSH transport
+    paramiko = None
+
+logger = logging.getLogger()
+
+# Console bootstrap per node name: management address, local user and SSH
+BOOTSTRAP_TEMPLATES = {
+    'vIOS': [
+        "conf t",
+        "interface GigabitEthernet0/0",
+        "ip address {address} {netmask}",
+        "no shutdown",
+        "exit",
+        "username {username} privilege 15 secret {password}",
+        "ip domain name {domain}",
+        "crypto key generate rsa modulus 2048",
+        "ip ssh version 2",
+        "ip scp server enable",
+        "line vty 0 4",
+        "login local",
+        "transport input ssh",
+        "end",
+    ],
+    'Switch': [
+        "conf t",
+        "interface Vlan1",
+        "ip address {address} {netmask}",
+        "no shutdown",
+        "exit",
+        "username {username} privilege 15 secret {password}",
+        "ip domain name {domain}",
+        "crypto key generate rsa modulus 2048",
+        "ip ssh version 2",
+        "ip scp server enable",
+        "line vty 0 4",
+        "login local",
+        "transport input ssh",
+        "end",
+    ],
+    'vEOS': [
+        "configure",
+        "username {username} privilege 15 secret {password}",
+        "interface Management1",
+        "ip address {address}/{prefixlen}",
+        "exit",
+        "management ssh",
+        "no shutdown",
+        "end",
+    ],
+    'vSRX-NG': [
+        "configure",
+        "set system login user {username} class super-user authentication plain-text-password",
+        "{password}",
+        "{password}",
+        "set interfaces fxp0 unit 0 family inet address {address}/{prefixlen}",
+        "set system services ssh",
+        "commit and-quit",
+    ],
+}
+
+# SCP upload target and the commands that apply the uploaded file, per node name.
+# Junos workbooks are interactive (edit/commit), so vSRX-NG is always pasted.
+SCP_TRANSFER = {
+    'vIOS': ("flash0:/eve_bulk.cfg", ["copy flash0:/eve_bulk.cfg running-config", "", "write memory"]),
+    'Switch': ("flash0:/eve_bulk.cfg", ["copy flash0:/eve_bulk.cfg running-config", "", "write memory"]),
+    'vEOS': ("/mnt/flash/eve_bulk.cfg", ["copy flash:eve_bulk.cfg running-config", "write memory"]),
+}
+
+# A prompt on its own line, after the output of the last command
+PROMPT_AFTER_ECHO = re.compile(rb"\n[^\n]*[>#] ?$")
+
+# Interactive mode changes that have no meaning inside a configuration file
+MODE_COMMANDS = {"conf t", "configure", "configure terminal", "end", "wr", "write", "write memory"}
+
+
+class SshSession:
+    """
+    SSH client and interactive shell channel of one device.
+    """
+
+    def __init__(self, client, channel):
+        self.client = client
+        self.channel = channel
+
+    def close(self):
+        try:
+            self.channel.close()
+        finally:
+            self.client.close()
+
+
+def assign_mgmt_addresses(nodes, ssh_settings):
+    """
+    Give every device a management address, in the order of the nodes list.
+    Args:
+        nodes (list): List of dictionaries containing node types and their counts.
+        ssh_settings (dict): The `ssh` settings (`mgmt_network`, `first_address`, `addresses`).
+    Returns:
+        dict: (node_type, dev_num) mapped to an ipaddress.IPv4Interface.
+    """
+    network = ipaddress.ip_network(ssh_settings.get('mgmt_network', '192.168.0.0/24'))
+    overrides = ssh_settings.get('addresses', {})
+    next_address = ipaddress.ip_address(ssh_settings.get('first_address', str(network.network_address + 200)))
+    taken = {ipaddress.ip_address(address) for address in overrides.values()}
+    addresses = {}
+    for dev in nodes:
+        for node_type, count in dev.items():
+            for dev_num in range(count):
+                override = overrides.get(f"{node_type} {dev_num}")
+                if override:
+                    addresses[(node_type, dev_num)] = ipaddress.ip_interface(f"{override}/{network.prefixlen}")
+                    continue
+                while next_address in taken:
+                    next_address += 1
+                if next_address not in network or next_address == network.broadcast_address:
+                    raise ValueError(f"Management network {network} has no free address left for {node_type} {dev_num}")
+                addresses[(node_type, dev_num)] = ipaddress.ip_interface(f"{next_address}/{network.prefixlen}")
+                next_address += 1
+    return addresses
+
+
+def config_file_content(commands):
+    """
+    Turn interactive workbook commands into a configuration file.
+    """
+    return "\n".join(command for command in commands if command.strip().lower() not in MODE_COMMANDS) + "\n"
+
+
+def scp_upload(client, data, remote_path, timeout=30):
+    """
+    Upload bytes with the SCP sink protocol (no SFTP subsystem needed on the device).
+    Args:
+        client (paramiko.SSHClient): Connected SSH client.
+        data (bytes): File content.
+        remote_path (str): Destination path on the device.
+        timeout (float): Seconds to wait for each acknowledgement.
+    """
+    channel = client.get_transport().open_session()
+    channel.settimeout(timeout)
+    try:
+        channel.exec_command(f"scp -t {remote_path}")
+
+        def expect_ack():
+            ack = channel.recv(1)
+            if ack != b"\0":
+                raise IOError(f"SCP upload to {remote_path} refused: {ack + channel.recv(1024)!r}")
+
+        expect_ack()
+        channel.sendall(f"C0644 {len(data)} {posixpath.basename(remote_path.split(':')[-1])}\n".encode('ascii'))
+        expect_ack()
+        channel.sendall(data + b"\0")
+        expect_ack()
+    finally:
+        channel.close()
+
+
+class SshTransport:
+    """
+    Pushes bulk configuration over SSH on the management network.
+    """
+
+    def __init__(self, settings, nodes):
+        """
+        Args:
+            settings (dict): Tuning settings; the SSH transport is used when
+                `config_transport` is 'ssh' and is configured by the `ssh` entry.
+            nodes (list): List of dictionaries containing node types and their counts.
+        """
+        self.enabled = settings.get('config_transport', 'console') == 'ssh'
+        ssh_settings = settings.get('ssh', {})
+        self.username = ssh_settings.get('username', 'admin')
+        self.password = ssh_settings.get('password', 'adminpassword')
+        self.domain = ssh_settings.get('domain', 'domain.com')
+        self.port = ssh_settings.get('port', 22)
+        self.transfer = ssh_settings.get('transfer', 'paste')
+        self.ready_timeout = ssh_settings.get('ready_timeout', 120)
+        self.command_timeout = ssh_settings.get('command_timeout', 120)
+        self.addresses = {}
+        self.pool = SessionPool(
+            max_sessions=ssh_settings.get('max_sessions', 0),
+            idle_timeout=ssh_settings.get('idle_timeout', 300),
+        )
+        if self.enabled:
+            if paramiko is None:
+                raise ImportError("The SSH configuration transport requires paramiko (pip install paramiko).")
+            self.addresses = assign_mgmt_addresses(nodes, ssh_settings)
+
+    def bootstrap_commands(self, name, node_type, dev_num):
+        """
+        Return the console bootstrap of a device.
+        Args:
+            name (str): The name of the node (e.g. 'vIOS').
+            node_type (str): Type of the node (e.g., Router, Switch).
+            dev_num (int): The device number.
+        Returns:
+            list: Commands to send over the console.
+        """
+        if name not in BOOTSTRAP_TEMPLATES:
+            raise ValueError(f"No SSH bootstrap template for {name}")
+        address = self.addresses[(node_type, dev_num)]
+        values = {
+            'address': address.ip,
+            'netmask': address.network.netmask,
+            'prefixlen': address.network.prefixlen,
+            'username': self.username,
+            'password': self.password,
+            'domain': self.domain,
+        }
+        return [line.format(**values) for line in BOOTSTRAP_TEMPLATES[name]]
+
+    def _connect(self, host, run_control=None):
+        # Keys are generated during the bootstrap, so SSH may take a little while to come up
+        deadline = time.monotonic() + self.ready_timeout
+        delay = 1
+        sleep = run_control.sleep if run_control else time.sleep
+        while True:
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            try:
+                client.connect(
+                    host, port=self.port, username=self.username, password=self.password,
+                    timeout=run_control.timeout(10) if run_control else 10,
+                    allow_agent=False, look_for_keys=False,
+                )
+                channel = client.invoke_shell(width=512)
+                channel.settimeout(self.command_timeout)
+                return SshSession(client, channel)
+            except (paramiko.SSHException, OSError) as e:
+                client.close()
+                if time.monotonic() + delay > deadline:
+                    raise TimeoutError(f"SSH on {host} not reachable within {self.ready_timeout} seconds: {e}")
+                sleep(delay)
+                delay = min(delay * 2, 10)
+
+    def _read_until_quiet(self, channel, quiet=2, run_control=None):
+        # Network OS shells have no end-of-output marker: wait for a prompt followed by silence
+        output = b''
+        deadline = time.monotonic() + self.command_timeout
+        last_data = time.monotonic()
+        while time.monotonic() < deadline:
+            if run_control:
+                run_control.check()  # Stop reading once the run is cancelled or the stage deadline passes
+            if channel.recv_ready():
+                output += channel.recv(65536)
+                last_data = time.monotonic()
+            elif time.monotonic() - last_data >= quiet and output.rstrip().endswith((b'#', b'>', b'%')):
+                return output.decode('ascii', errors='ignore')
+            else:
+                time.sleep(0.1)
+        raise TimeoutError(f"No prompt after {self.command_timeout} seconds")
+
+    def _read_until_applied(self, channel, commands, run_control=None):
+        # Done once the device has echoed the last pasted line and printed a prompt after it.
+        # A pause or a line ending in a prompt character in the middle of the paste (key
+        # generation, commit, error messages) is not mistaken for the end.
+        last_line = next((command for command in reversed(commands) if command.strip()), None)
+        if last_line is None:
+            return self._read_until_quiet(channel, run_control=run_control)
+        echo = last_line.strip().encode('ascii')
+        echoes = sum(1 for command in commands if command.strip() == last_line.strip())
+        output = b''
+        deadline = time.monotonic() + self.command_timeout
+        while time.monotonic() < deadline:
+            if run_control:
+                run_control.check()  # Stop reading once the run is cancelled or the stage deadline passes
+            if channel.recv_ready():
+                output += channel.recv(65536)
+                if output.count(echo) >= echoes and PROMPT_AFTER_ECHO.search(output[output.rfind(echo) + len(echo):]):
+                    return output.decode('ascii', errors='ignore')
+            else:
+                time.sleep(0.1)
+        raise TimeoutError(f"No prompt after {last_line!r} within {self.command_timeout} seconds")
+
+    def push(self, device_id, name, node_type, dev_num, commands, run_control=None):
+        """
+        Push a device's workbook commands over SSH.
+        Args:
+            device_id (str): The ID of the device.
+            name (str): The name of the node.
+            node_type (str): Type of the node (e.g., Router, Switch).
+            dev_num (int): The device number.
+            commands (list): Workbook commands for the device.
+            run_control (RunControl): Deadlines and cancellation of the run, if any.
+        Returns:
+            str: Device output of the push.
+        """
+        output = self._send(device_id, name, node_type, dev_num, commands, run_control, upload=self.transfer == 'scp')
+        logger.info(f"Pushed configuration to {node_type} (Device ID: {device_id}) over SSH at {self.addresses[(node_type, dev_num)].ip}.")
+        return output
+
+    def show(self, device_id, name, node_type, dev_num, commands, run_control=None):
+        """
+        Run show commands over SSH.
+        Args:
+            device_id (str): The ID of the device.
+            name (str): The name of the node.
+            node_type (str): Type of the node (e.g., Router, Switch).
+            dev_num (int): The device number.
+            commands (list): Commands to run.
+            run_control (RunControl): Deadlines and cancellation of the run, if any.
+        Returns:
+            str: Output of the last command, starting with its echo and ending with the prompt.
+        """
+        output = self._send(device_id, name, node_type, dev_num, commands, run_control, upload=False)
+        return output[output.rfind(commands[-1]):]
+
+    def _send(self, device_id, name, node_type, dev_num, commands, run_control, upload):
+        host = str(self.addresses[(node_type, dev_num)].ip)
+        session = self.pool.acquire(device_id)
+        if session is None:
+            while not self.pool.reserve(run_control.timeout(5) if run_control else None):
+                pass  # Wake up regularly to notice a cancelled run
+            try:
+                session = PooledSession(device_id, name, node_type, self._connect(host, run_control), kind="SSH session")
+            except Exception:
+                self.pool.discard()
+                raise
+        try:
+            channel = session.connection.channel
+            channel.sendall(b"\n")
+            self._read_until_quiet(channel, run_control=run_control)  # Login banner (new sessions) and a fresh prompt
+            if upload and name in SCP_TRANSFER:
+                remote_path, apply_commands = SCP_TRANSFER[name]
+                scp_upload(
+                    session.connection.client, config_file_content(commands).encode('ascii'), remote_path,
+                    timeout=run_control.timeout(30) if run_control else 30,
+                )
+                logger.info(f"Uploaded {len(commands)} commands to {node_type} (Device ID: {device_id}) at {remote_path}.")
+                commands = apply_commands
+            # One write for the whole batch instead of a round-trip per command
+            channel.sendall(("\n".join(commands) + "\n").encode('ascii'))
+            output = self._read_until_applied(channel, commands, run_control=run_control)
+        except Exception:
+            self.pool.discard(session)
+            raise
+        self.pool.release(session)
+        return output
+
+    def close_all(self):
+        self.pool.close_all()
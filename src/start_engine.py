@@ -0,0 +1,282 @@
+"""
+Node starts in waves with one shared readiness tracker.
+
+Workers hand their created node to the engine instead of starting it
+themselves. Start requests are collected into waves. The lab-wide
+`GET /api/labs/<lab>/nodes/start` starts every node of the lab, so it is only
+used when one wave holds every node of the run and the lab's node list shows
+no other node (never for a watch recovery). Requests that arrive while
+other nodes are still being created are started after a short collection
+window with bounded parallel per-node starts, which is also the fallback when
+the lab-wide call fails (`"mode": "node"` always uses it).
+
+A single tracker thread then polls the lab's node list, one API call for all
+started nodes, on the schedule the boot history gives for each image, and
+wakes each worker as soon as its node is running. Nothing sleeps a fixed time:
+the engine thread waits on a condition until the next wave or poll is due.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import logging
+from exceptions import DeploymentCancelled, DeadlineExceeded
+
+logger = logging.getLogger()
+
+# Node status reported by the EVE-NG API
+STATUS_STOPPED = 0
+STATUS_RUNNING = 2
+
+
+class StartEngine:
+    """
+    Starts created nodes in waves and tracks when each one is running.
+    """
+
+    def __init__(self, nodes, eve_lab_url, eve_node_creation_url, eve_start_nodes_url, response, headers, boot_history, settings, http_timeout=None, lab_start=True, run_control=None):
+        """
+        Args:
+            nodes (list): List of dictionaries containing node types and their counts.
+            eve_lab_url (str): URL of the lab, used for the lab-wide start.
+            eve_node_creation_url (str): URL of the lab's node list, polled for the node status.
+            eve_start_nodes_url (str): URL for starting a single node.
+            response (requests.Response): Response object from the EVE-NG login.
+            headers (dict): Headers for API requests.
+            boot_history (BootHistory): Boot history store; schedules the polls and records the running time.
+            settings (dict): Tuning settings; configured by the `node_start` entry
+                (`mode`: lab or node, `wave_window` in seconds, `max_parallel` per-node starts).
+            http_timeout (float): Timeout of each API call in seconds.
+            lab_start (bool): Allow the lab-wide start; False when only some nodes of the lab are processed.
+            run_control (RunControl): Deadlines and cancellation of the run; caps every API call.
+        """
+        start_settings = settings.get('node_start', {})
+        self.mode = start_settings.get('mode', 'lab') if lab_start else 'node'
+        self.wave_window = start_settings.get('wave_window', 2)
+        self.max_parallel = start_settings.get('max_parallel', 10)
+        self.eve_lab_url = eve_lab_url
+        self.eve_node_creation_url = eve_node_creation_url
+        self.eve_start_nodes_url = eve_start_nodes_url
+        self.response = response
+        self.headers = headers
+        self.boot_history = boot_history
+        self.http_timeout = http_timeout
+        self.run_control = run_control
+        self.expected = {f"{node_type} {dev_num}" for dev in nodes for node_type, count in dev.items() for dev_num in range(count)}
+        self.accounted = set()  # Nodes that asked to be started or will never ask
+        self.pending = []       # Start requests of the next wave
+        self.nodes = {}         # Device ID mapped to the start and readiness state of the node
+        self.api_calls = 0
+        self.waves = 0
+        self._first_pending_at = None
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="start-engine", daemon=True)
+        self._thread.start()
+
+    def request_start(self, node_type, dev_num, device_id, image):
+        """
+        Queue a created node for the next start wave.
+        """
+        with self._condition:
+            self.accounted.add(f"{node_type} {dev_num}")
+            self.nodes[device_id] = {'node_type': node_type, 'key': f"{node_type} {dev_num}", 'image': image, 'state': 'pending'}
+            self.pending.append(device_id)
+            if self._first_pending_at is None:
+                self._first_pending_at = time.monotonic()
+            self._condition.notify_all()
+
+    def node_skipped(self, node_type, dev_num):
+        """
+        Record that a node will not be started (failed before its start, or already running).
+        """
+        with self._condition:
+            self.accounted.add(f"{node_type} {dev_num}")
+            self._condition.notify_all()
+
+    def wait_running(self, device_id, timeout=None):
+        """
+        Wait until a node is running.
+        Args:
+            device_id (str): The ID of the node.
+            timeout (float): Seconds to wait. None waits without limit.
+        Returns:
+            bool: True if the node is running, False if it failed to start, None if the wait timed out.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.nodes[device_id]['state'] in ('running', 'failed'), timeout)
+            state = self.nodes[device_id]['state']
+        return None if state not in ('running', 'failed') else state == 'running'
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(5)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._closed:
+                        return
+                    now = time.monotonic()
+                    wave_due = self._wave_due(now)
+                    poll_due = min((node['next_poll'] for node in self.nodes.values() if node['state'] == 'started'), default=None)
+                    if wave_due is not None and wave_due <= now:
+                        wave, self.pending, self._first_pending_at = self.pending, [], None
+                        # Nodes that were skipped (failed, or recorded as deployed) must not be started with the lab
+                        whole_run = {self.nodes[device_id]['key'] for device_id in wave} >= self.expected
+                        break
+                    if poll_due is not None and poll_due <= now:
+                        wave = None
+                        break
+                    due = [moment for moment in (wave_due, poll_due) if moment is not None]
+                    self._condition.wait(min(due) - now if due else None)
+            try:
+                if wave is not None:
+                    self._start_wave(wave, whole_run)
+                else:
+                    self._poll()
+            except (DeploymentCancelled, DeadlineExceeded) as e:
+                logger.info(f"Start engine stopped: {e}")
+                self._fail_wave(wave)
+                return
+            except Exception as e:
+                logger.error(f"Start engine error: {e}")
+                self._fail_wave(wave)
+
+    def _fail_wave(self, wave):
+        # The wave is no longer pending: without this its workers would wait for it forever
+        if not wave:
+            return
+        with self._condition:
+            for device_id in wave:
+                if self.nodes[device_id]['state'] == 'pending':
+                    self.nodes[device_id]['state'] = 'failed'
+            self._condition.notify_all()
+
+    def _wave_due(self, now):
+        if not self.pending:
+            return None
+        # Every node is in: no reason to wait for the collection window
+        if self.accounted >= self.expected:
+            return now
+        return self._first_pending_at + self.wave_window
+
+    def _get(self, url):
+        with self._condition:  # Also called from the per-node start threads
+            self.api_calls += 1
+        timeout = self.run_control.timeout(self.http_timeout) if self.run_control else self.http_timeout
+        return requests.get(url, headers=self.headers, cookies=self.response.cookies, timeout=timeout)
+
+    def _start_wave(self, wave, whole_run):
+        self.waves += 1
+        for device_id in wave:
+            logger.info(f"Attempting to start node {self.nodes[device_id]['node_type']} with ID {device_id}.")
+        started = []
+        if self.mode == 'lab' and whole_run:
+            try:
+                start_api = None
+                if self._lab_holds_only(wave):
+                    start_api = self._get(f"{self.eve_lab_url}/nodes/start")
+                if start_api is None:
+                    logger.info("The lab holds nodes outside this run, starting the nodes one by one.")
+                elif start_api.status_code == 200:
+                    started = list(wave)
+                    logger.info(f"Started {len(wave)} nodes with one lab-wide start (wave {self.waves}).")
+                else:
+                    logger.warning(f"Lab-wide start failed ({start_api.status_code}), starting the nodes one by one: {start_api.text}")
+            except requests.RequestException as e:
+                logger.warning(f"Lab-wide start failed, starting the nodes one by one: {e}")
+        if not started:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_parallel, len(wave)))) as executor:
+                results = list(executor.map(self._start_node, wave))
+            started = [device_id for device_id, ok in zip(wave, results) if ok]
+            logger.info(f"Started {len(started)}/{len(wave)} nodes one by one (wave {self.waves}).")
+
+        now = time.monotonic()
+        with self._condition:
+            for device_id in wave:
+                node = self.nodes[device_id]
+                if device_id not in started:
+                    node['state'] = 'failed'
+                    continue
+                initial_delay, retry_delay, window = self.boot_history.schedule(node['image'], 'running', 3, 5, 50)
+                node.update({
+                    'state': 'started',
+                    'started_at': now,
+                    'initial_delay': initial_delay,
+                    'retry_delay': retry_delay,
+                    'next_poll': now + initial_delay,
+                    'deadline': now + initial_delay + window,
+                    'polls': 0,
+                })
+            self._condition.notify_all()
+
+    def _lab_holds_only(self, wave):
+        # The lab-wide start would also start unrelated nodes and nodes stopped on purpose
+        node_list = self._get(self.eve_node_creation_url)
+        if node_list.status_code != 200:
+            return False
+        try:
+            lab_nodes = node_list.json().get('data', {})
+        except ValueError:
+            return False
+        return {str(device_id) for device_id in lab_nodes} == {str(device_id) for device_id in wave}
+
+    def _start_node(self, device_id):
+        try:
+            start_api = self._get(self.eve_start_nodes_url.format(device_id=device_id))
+        except requests.RequestException as e:
+            logger.error(f"Failed to start node with ID {device_id}: {e}")
+            return False
+        if start_api.status_code != 200:
+            logger.error(f"Failed to start node with ID {device_id}. Response: {start_api.text}")
+            return False
+        return True
+
+    def _poll(self):
+        # One call returns the status of every node in the lab
+        statuses = {}
+        try:
+            status_api = self._get(self.eve_node_creation_url)
+            if status_api.status_code == 200:
+                statuses = {str(device_id): node.get('status') for device_id, node in status_api.json().get('data', {}).items()}
+            else:
+                logger.error(f"Failed to retrieve the node status list. Response: {status_api.text}")
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"Failed to retrieve the node status list: {e}")
+
+        now = time.monotonic()
+        restart = []
+        with self._condition:
+            for device_id, node in self.nodes.items():
+                if node['state'] != 'started':
+                    continue
+                status = statuses.get(str(device_id))
+                if status == STATUS_RUNNING:
+                    node['state'] = 'running'
+                    # A node already running at its first poll may have been ready earlier,
+                    # so record the scheduled delay to keep the estimate from creeping up
+                    elapsed = now - node['started_at']
+                    self.boot_history.record(node['image'], 'running', elapsed if node['polls'] else min(elapsed, node['initial_delay']))
+                    logger.info(f"Node {node['node_type']} with ID {device_id} is running.")
+                    continue
+                if node['next_poll'] > now:
+                    continue  # Polled early for another node; its own schedule decides
+                node['polls'] += 1
+                if status == STATUS_STOPPED:
+                    logger.warning(f"Node {node['node_type']} with ID {device_id} is stopped. (Attempt {node['polls']})")
+                    restart.append(device_id)
+                if now + node['retry_delay'] >= node['deadline']:
+                    node['state'] = 'failed'
+                    logger.error(f"Node {node['node_type']} with ID {device_id} failed to start in time.")
+                else:
+                    node['next_poll'] = now + node['retry_delay']
+            self._condition.notify_all()
+
+        for device_id in restart:
+            if self._start_node(device_id):
+                logger.info(f"Retry to start node {self.nodes[device_id]['node_type']} with ID {device_id} was successful.")
@@ -0,0 +1,220 @@
+"""
+Parametric topology generator for large labs.
+
+Writing the `nodes` list, a link file and a canvas position for every device
+by hand does not scale past a few dozen nodes. With the `topology_generator`
+setting, the tool builds the whole topology from a handful of parameters:
+
+    leaf_spine  every leaf connects to every spine (`uplinks` parallel links per pair)
+    hub_spoke   every spoke connects to every hub
+    full_mesh   every node connects to every other node
+
+Each role (spine, leaf, hub, spoke, node) is a node type and a count. Device
+numbers, interface indexes, link endpoints and canvas positions are computed
+as numpy arrays for all nodes at once, so a 1,000-node lab is generated in
+milliseconds. Tiers are laid out as centred rows, hub-and-spoke as concentric
+rings sized so that neighbours are at least `spacing` pixels apart, and full
+mesh as a single ring.
+
+The result is written in the link file format (see links.py) with two more
+keys, `nodes` and `positions`, and used as the run's `topology_links_file`.
+"""
+
+import json
+import os
+import numpy as np
+import logging
+
+logger = logging.getLogger()
+
+# Roles of each kind of topology, in layout order
+KINDS = {
+    'leaf_spine': ('spine', 'leaf'),
+    'hub_spoke': ('hub', 'spoke'),
+    'full_mesh': ('node',),
+}
+
+# Interface 0 is the management interface
+FIRST_LINK_INTERFACE = 1
+
+
+def _roles(spec, node_specs):
+    kind = spec.get('kind')
+    if kind not in KINDS:
+        raise ValueError(f"Unknown topology kind {kind!r} (expected one of {', '.join(KINDS)})")
+    roles = []
+    next_dev_num = {}
+    for role in KINDS[kind]:
+        role_spec = spec.get('roles', {}).get(role)
+        if not role_spec:
+            raise ValueError(f"Topology kind {kind} needs the role {role!r} in `topology_generator.roles`")
+        node_type, count = role_spec['node_type'], int(role_spec['count'])
+        if node_type not in node_specs:
+            raise ValueError(f"Unsupported node type {node_type!r} for role {role}")
+        if count < 1:
+            raise ValueError(f"Role {role} needs at least one node, found {count}")
+        # Roles that share a node type get consecutive device numbers
+        first = next_dev_num.get(node_type, 0)
+        next_dev_num[node_type] = first + count
+        roles.append((role, node_type, np.arange(first, first + count)))
+    return kind, roles
+
+
+def _grid(count, columns, spacing, width):
+    """
+    Centre `count` nodes in rows of at most `columns` within `width` pixels.
+    Returns:
+        tuple: (left, top) arrays relative to the top-left corner of the block.
+    """
+    index = np.arange(count)
+    row = index // columns
+    in_row = np.minimum(columns, count - row * columns)
+    left = (width - (in_row - 1) * spacing) / 2 + (index % columns) * spacing
+    return left, row * spacing
+
+
+def _ring(count, radius):
+    angle = 2 * np.pi * np.arange(count) / max(count, 1)
+    return radius * np.cos(angle), radius * np.sin(angle)
+
+
+def _layout(kind, roles, spacing, columns):
+    """
+    Compute the canvas offsets of every node, in role order.
+    Returns:
+        tuple: (left, top) arrays, starting at 0.
+    """
+    counts = [len(dev_nums) for _, _, dev_nums in roles]
+    if kind == 'leaf_spine':
+        # Tiers as centred rows, spines above leaves, one empty row between the tiers
+        width = (min(max(counts), columns) - 1) * spacing
+        lefts, tops, tier_top = [], [], 0
+        for count in counts:
+            left, top = _grid(count, columns, spacing, width)
+            lefts.append(left)
+            tops.append(top + tier_top)
+            tier_top += (-(-count // columns) + 1) * spacing
+        left, top = np.concatenate(lefts), np.concatenate(tops)
+    elif kind == 'hub_spoke':
+        # Hubs in a square block in the centre, spokes on rings around it
+        hubs, spokes = counts
+        hub_columns = int(np.ceil(np.sqrt(hubs)))
+        hub_width = (hub_columns - 1) * spacing
+        hub_left, hub_top = _grid(hubs, hub_columns, spacing, hub_width)
+        hub_height = hub_top.max()
+        hub_left, hub_top = hub_left - hub_width / 2, hub_top - hub_height / 2
+        # Ring k holds as many spokes as fit with a chord of at least `spacing` between neighbours
+        radii = np.hypot(hub_width, hub_height) / 2 + spacing * np.arange(1, int(np.sqrt(spokes)) + 3)
+        capacity = np.floor(np.pi / np.arcsin(np.minimum(1, spacing / (2 * radii)))).astype(int)
+        ends = np.cumsum(capacity)
+        index = np.arange(spokes)
+        ring = np.searchsorted(ends, index, side='right')
+        start = ends[ring] - capacity[ring]
+        in_ring = np.minimum(capacity[ring], spokes - start)
+        angle = 2 * np.pi * (index - start) / in_ring
+        left = np.concatenate([hub_left, radii[ring] * np.cos(angle)])
+        top = np.concatenate([hub_top, radii[ring] * np.sin(angle)])
+    else:
+        # One ring, with neighbours `spacing` apart
+        count = counts[0]
+        left, top = _ring(count, spacing / (2 * np.sin(np.pi / count)) if count > 1 else 0)
+    return left - left.min(), top - top.min()
+
+
+def _bipartite(upper, lower, uplinks):
+    """
+    Connect every lower node to every upper node with `uplinks` parallel links.
+    Returns:
+        tuple: (upper index, upper interface, lower index, lower interface) arrays, grouped per lower node.
+    """
+    lower_index, upper_index, link = (axis.ravel() for axis in np.meshgrid(
+        np.arange(lower), np.arange(upper), np.arange(uplinks), indexing='ij'))
+    upper_interface = FIRST_LINK_INTERFACE + lower_index * uplinks + link
+    lower_interface = FIRST_LINK_INTERFACE + upper_index * uplinks + link
+    return upper_index, upper_interface, lower_index, lower_interface
+
+
+def _links(kind, roles, uplinks):
+    """
+    Compute the endpoints of every link.
+    Returns:
+        tuple: (node index, interface, peer node index, peer interface) arrays, where a node
+            index is the position of the node in role order.
+    """
+    counts = [len(dev_nums) for _, _, dev_nums in roles]
+    if kind == 'full_mesh':
+        a, b = np.triu_indices(counts[0], 1)
+        # A node's interfaces go to its peers in order, skipping itself
+        return a, FIRST_LINK_INTERFACE + b - 1, b, FIRST_LINK_INTERFACE + a
+    upper, lower = counts
+    upper_index, upper_interface, lower_index, lower_interface = _bipartite(
+        upper, lower, uplinks if kind == 'leaf_spine' else 1)
+    return lower_index + upper, lower_interface, upper_index, upper_interface
+
+
+def generate_topology(spec, node_specs):
+    """
+    Generate the nodes, canvas positions and links of a parametric topology.
+    Args:
+        spec (dict): The `topology_generator` setting: `kind`, `roles` (role mapped to
+            `node_type` and `count`), `uplinks`, `spacing`, `columns` and `origin`.
+        node_specs (dict): Node type mapped to a (payload, config workbook path) tuple.
+    Returns:
+        dict: `nodes` (the nodes list), `positions` ("<node type> <device number>" mapped to
+            [left, top]), `links` (link dictionaries, see links.py) and `interfaces` (node type
+            mapped to the ethernet interfaces its nodes need, management included).
+    """
+    kind, roles = _roles(spec, node_specs)
+    spacing = spec.get('spacing', 120)
+    columns = max(1, spec.get('columns', 40))
+    origin_left, origin_top = spec.get('origin', [150, 100])
+
+    names = np.array([f"{node_type} {dev_num}" for _, node_type, dev_nums in roles for dev_num in dev_nums])
+    types = np.array([node_type for _, node_type, dev_nums in roles for _ in dev_nums])
+    left, top = _layout(kind, roles, spacing, columns)
+    left = np.rint(left + origin_left).astype(int)
+    top = np.rint(top + origin_top).astype(int)
+    node, interface, peer, peer_interface = _links(kind, roles, max(1, spec.get('uplinks', 1)))
+
+    # Interfaces each node type needs: the highest index any of its nodes uses, plus management
+    used = np.zeros(len(names), dtype=int)
+    np.maximum.at(used, node, interface)
+    np.maximum.at(used, peer, peer_interface)
+    interfaces = {}
+    for node_type in dict.fromkeys(types.tolist()):
+        interfaces[node_type] = int(used[types == node_type].max()) + 1
+
+    nodes = {}
+    for _, node_type, dev_nums in roles:
+        nodes[node_type] = nodes.get(node_type, 0) + len(dev_nums)
+    return {
+        'kind': kind,
+        'nodes': [{node_type: count} for node_type, count in nodes.items()],
+        'positions': {name: [x, y] for name, x, y in zip(names.tolist(), left.tolist(), top.tolist())},
+        'links': [
+            {'type': 'p2p', 'endpoints': [[a, i], [b, j]]}
+            for a, i, b, j in zip(names[node].tolist(), interface.tolist(), names[peer].tolist(), peer_interface.tolist())
+        ],
+        'interfaces': interfaces,
+    }
+
+
+def size_payloads(topology, node_specs):
+    """
+    Raise the ethernet count of each node type's payload to what the topology needs.
+    """
+    for node_type, needed in topology['interfaces'].items():
+        payload = node_specs[node_type][0]
+        if int(payload.get('ethernet', 0)) < needed:
+            logger.info(f"Raising the ethernet interfaces of {node_type} from {payload.get('ethernet', 0)} to {needed}.")
+            payload['ethernet'] = needed
+
+
+def write_topology(topology_file, topology):
+    """
+    Write a generated topology as a link file (with its nodes and positions).
+    """
+    os.makedirs(os.path.dirname(topology_file) or '.', exist_ok=True)
+    with open(topology_file, 'w') as topology_json:
+        json.dump({key: topology[key] for key in ('kind', 'nodes', 'positions', 'links')}, topology_json)
+    logger.info(f"Generated {topology['kind']} topology with {len(topology['positions'])} nodes and {len(topology['links'])} links: {topology_file}")
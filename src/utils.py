@@ -113,10 +113,13 @@ def file_path():
             eve_interface_connection = files_path["api_urls"]["eve_interface_connection_url"]
             node_interface = files_path["api_urls"]["eve_node_interface_url"]
             network_mgmt = files_path["api_urls"]["eve_network_mgmt_url"]
+            # Older configs have no lab URL: it is the node creation URL without its /nodes suffix
+            eve_lab_url = files_path["api_urls"].get("eve_lab_url", eve_node_creation_url.rstrip('/').removesuffix('/nodes'))
             router_config = files_path["urls"]["router_config"]
             switch_config = files_path["urls"]["switch_config"]
             aristasw_config = files_path["urls"]["aristasw_config"]
             juniperfw_config = files_path["urls"]["juniperfw_config"]
+            settings = files_path.get("settings", {})
 
     except FileNotFoundError:
         logger.error("The configuration file 'automation_urls.json' was not found.")
@@ -182,10 +185,12 @@ def file_path():
         eve_interface_connection,\
         node_interface,\
         network_mgmt,\
+        eve_lab_url,\
         router_config,\
         switch_config,\
         aristasw_config,\
-        juniperfw_config
+        juniperfw_config,\
+        settings
 
 
 def gather_valid_creds(creds):
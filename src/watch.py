@@ -0,0 +1,222 @@
+"""
+Watch mode: keep a deployed lab running.
+
+After the deployment, `--watch` polls the lab's node list every `interval`
+seconds: one API call for the status of every node, whatever the size of the
+lab. A node that is seen stopped (or gone from the list) on `down_polls`
+consecutive polls is recovered through the normal pipeline: run_threads() in
+incremental mode, limited to the nodes to recover, starts them with the start
+engine and pushes whatever their running configuration is missing. A node that
+was deleted is dropped from the inventory first, so it is deployed anew; it is
+still watched, without a device ID, until a recovery records one. Nodes
+that keep failing are left alone after `max_restarts` recoveries per hour.
+
+Per-node metrics (status, uptime, downtime, restarts and the result of the
+last recovery) are written to `metrics_file` after every poll, so any
+dashboard or exporter can pick them up without calling the EVE-NG API.
+"""
+
+import json
+import os
+import time
+import requests
+import logging
+from inventory import load_inventory, save_inventory
+
+logger = logging.getLogger()
+
+# Node status reported by the EVE-NG API
+STATUS_RUNNING = 2
+
+
+class LabWatcher:
+    """
+    Polls the lab, recovers stopped nodes and exports per-node metrics.
+    """
+
+    def __init__(self, eve_lab_url, eve_node_creation_url, response, headers, settings, recover, login=None, http_timeout=None):
+        """
+        Args:
+            eve_lab_url (str): URL of the lab; the inventory written for it names the nodes to watch.
+            eve_node_creation_url (str): URL of the lab's node list, polled for the node status.
+            response (requests.Response): Response object from the EVE-NG login.
+            headers (dict): Headers for API requests.
+            settings (dict): Tuning settings; configured by the `watch` entry (`interval`,
+                `down_polls`, `max_restarts`, `metrics_file`) and uses `inventory_file`.
+            recover (function): Called with the set of nodes ("<node type> <device number>") to
+                recover; returns the run summary of the recovery.
+            login (function): Called without arguments to log in again when the session expired.
+            http_timeout (float): Timeout of each API call in seconds.
+        """
+        watch_settings = settings.get('watch', {})
+        self.interval = watch_settings.get('interval', 30)
+        self.down_polls = watch_settings.get('down_polls', 2)
+        self.max_restarts = watch_settings.get('max_restarts', 3)
+        self.metrics_file = watch_settings.get('metrics_file')
+        self.inventory_file = settings.get('inventory_file')
+        self.eve_lab_url = eve_lab_url
+        self.eve_node_creation_url = eve_node_creation_url
+        self.response = response
+        self.headers = headers
+        self.recover = recover
+        self.login = login
+        self.http_timeout = http_timeout
+        self.next_poll = None
+        self.nodes = {}   # Node mapped to its device ID
+        self.metrics = {}
+        self.polls = 0
+
+    def _reload_inventory(self):
+        # Recoveries may redeploy a node under a new device ID
+        nodes = load_inventory(self.inventory_file, self.eve_lab_url)
+        for node in self.nodes:
+            # A deleted node whose redeploy failed has left the inventory: keep watching it
+            # without a device ID (needs redeploy), so it is retried and max_restarts applies
+            nodes.setdefault(node, None)
+        self.nodes = nodes
+        now = time.time()
+        for node, device_id in self.nodes.items():
+            metric = self.metrics.setdefault(node, {
+                'status': 'unknown', 'up_since': None, 'down_since': None, 'uptime': 0.0, 'downtime': 0.0,
+                'restarts': 0, 'restart_times': [], 'last_recovery': None, 'down_polls': 0, 'missing': False,
+            })
+            metric['device_id'] = device_id
+            metric.setdefault('last_seen', now)
+
+    def _timeout(self):
+        # A poll that hangs must not push back the next one
+        if self.next_poll is None:
+            return self.http_timeout
+        remaining = max(1, self.next_poll - time.monotonic())
+        return remaining if self.http_timeout is None else min(self.http_timeout, remaining)
+
+    def _statuses(self):
+        try:
+            status_api = requests.get(self.eve_node_creation_url, headers=self.headers, cookies=self.response.cookies, timeout=self._timeout())
+            if status_api.status_code in (401, 412) and self.login is not None:
+                # The EVE-NG session expired while watching
+                logger.info("Watch: session expired, logging in again.")
+                self.response = self.login()
+                status_api = requests.get(self.eve_node_creation_url, headers=self.headers, cookies=self.response.cookies, timeout=self._timeout())
+            if status_api.status_code != 200:
+                logger.error(f"Watch: failed to retrieve the node status list. Response: {status_api.text}")
+                return None
+            return {str(device_id): node.get('status') for device_id, node in status_api.json().get('data', {}).items()}
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"Watch: failed to retrieve the node status list: {e}")
+            return None
+        finally:
+            self.polls += 1
+
+    def poll(self):
+        """
+        Poll the lab once and update the metrics.
+        Returns:
+            set: Nodes that are due for recovery.
+        """
+        statuses = self._statuses()
+        now = time.time()
+        due = set()
+        if statuses is None:
+            return due  # Unknown is not down: never recover on a failed poll
+        for node, device_id in self.nodes.items():
+            metric = self.metrics[node]
+            elapsed = now - metric['last_seen']
+            metric['last_seen'] = now
+            status = statuses.get(str(device_id))
+            metric['missing'] = status is None
+            if status == STATUS_RUNNING:
+                if metric['status'] != 'running':
+                    if metric['status'] == 'down':
+                        logger.info(f"Watch: {node} (Device ID: {device_id}) is running again.")
+                    metric.update(status='running', up_since=now, down_since=None)
+                else:
+                    metric['uptime'] += elapsed
+                metric['down_polls'] = 0
+                continue
+            if metric['status'] == 'down':
+                metric['downtime'] += elapsed
+            else:
+                state = 'waiting to be redeployed' if device_id is None else 'missing from the lab' if status is None else 'stopped'
+                logger.warning(f"Watch: {node} (Device ID: {device_id}) is {state}.")
+                metric.update(status='down', up_since=None, down_since=now)
+            metric['down_polls'] += 1
+            metric['restart_times'] = [moment for moment in metric['restart_times'] if now - moment < 3600]
+            if metric['down_polls'] < self.down_polls:
+                continue  # Give a node that is being restarted by hand a chance first
+            if len(metric['restart_times']) >= self.max_restarts:
+                if metric['down_polls'] == self.down_polls:
+                    logger.error(f"Watch: {node} was recovered {self.max_restarts} times in the last hour, leaving it down.")
+                continue
+            due.add(node)
+        return due
+
+    def run_recovery(self, due):
+        """
+        Recover nodes through the normal pipeline and record the outcome.
+        """
+        logger.info(f"Watch: recovering {len(due)} nodes: {', '.join(sorted(due))}.")
+        started = time.time()
+        missing = {node for node in due if self.metrics[node]['missing']}
+        if missing:
+            # A node deleted from the lab cannot be started again: forget it, so the recovery deploys it anew
+            save_inventory(self.inventory_file, self.eve_lab_url, {
+                node: {'device_id': device_id} for node, device_id in self.nodes.items() if node not in missing
+            })
+        summary = self.recover(due) or {}
+        for node in due:
+            metric = self.metrics[node]
+            metric['restarts'] += 1
+            metric['restart_times'].append(started)
+            metric['down_polls'] = 0
+            progress = summary.get(node, {})
+            metric['last_recovery'] = {
+                'at': started,
+                'seconds': round(time.time() - started, 1),
+                'status': progress.get('status', 'unknown'),
+                'error': progress.get('error'),
+            }
+        self._reload_inventory()
+        if any(progress.get('error') == "Interrupted by the user" for progress in summary.values()):
+            raise KeyboardInterrupt  # Ctrl-C during a recovery also ends the watch
+
+    def export(self):
+        if not self.metrics_file:
+            return
+        os.makedirs(os.path.dirname(self.metrics_file) or '.', exist_ok=True)
+        temp_file = f"{self.metrics_file}.tmp"
+        with open(temp_file, 'w') as metrics:
+            json.dump({
+                'lab': self.eve_lab_url,
+                'updated': time.time(),
+                'polls': self.polls,
+                'nodes': {
+                    node: {key: value for key, value in metric.items() if key not in ('restart_times', 'last_seen')}
+                    for node, metric in self.metrics.items()
+                },
+            }, metrics, indent=2)
+        os.replace(temp_file, self.metrics_file)
+
+    def run(self, stop=None):
+        """
+        Watch until interrupted (Ctrl-C) or until `stop()` returns True.
+        """
+        self._reload_inventory()
+        if not self.nodes:
+            logger.error(f"Watch: no deployed nodes recorded in {self.inventory_file} for {self.eve_lab_url}.")
+            return
+        logger.info(f"Watch: monitoring {len(self.nodes)} nodes every {self.interval}s.")
+        self.next_poll = time.monotonic()
+        try:
+            while not (stop and stop()):
+                delay = self.next_poll - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self.next_poll = time.monotonic() + self.interval
+                due = self.poll()
+                if due:
+                    self.run_recovery(due)
+                self.export()
+        except KeyboardInterrupt:
+            logger.info("Watch: stopped by the user.")
+        self.export()
@@ -0,0 +1,249 @@
+"""
+log_analyzer.py
+
+Streaming analyzer for historical deployment logs (`log/*_main_log_file.log`,
+optionally gzip-compressed). Files are read line by line, so months of logs
+can be analyzed without loading a whole file in memory.
+
+Each file is one run. Node timelines are rebuilt from these messages:
+    Attempting to create node <type> (Attempt n/m).       -> create started / retry
+    Node <type> with ID <id> created successfully.        -> create finished
+    Attempting to start node <type> with ID <id>.         -> start requested
+    Node <type> with ID <id> is running.                  -> node running
+    Telnet connection closed for <type> (Device ID: <id>) -> console finished
+    Console session kept open for <type> (Device ID: <id>) (pooled sessions)
+    Failed to create node <type> after n attempts.        -> create given up
+Creation attempts carry no node ID, so they are matched to the next
+"created successfully" of the same node type in order. A create that is
+given up drops the oldest unmatched attempt of its type.
+
+Reported per node type and stage (create, start, console, total): sample count
+and latency percentiles. Also reported: create retries, API 500 errors and
+lab lock errors, per run and overall, plus a per-run trend table.
+
+Usage:
+------
+    python log_analyzer.py "../log/*_main_log_file.log"
+    python log_analyzer.py ../log --since 2025-05-01 --json report.json
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import math
+import os
+import re
+from collections import defaultdict
+from datetime import datetime
+
+LINE_FORMAT = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) - (\w+) - (.*)$")
+CREATE_ATTEMPT = re.compile(r"Attempting to create node (.+?) \(Attempt (\d+)/\d+\)")
+CREATED = re.compile(r"Node (.+?) with ID (\S+) created successfully")
+CREATE_FAILED = re.compile(r"Failed to create node (.+?) after \d+ attempts")
+START_ATTEMPT = re.compile(r"Attempting to start node (.+?) with ID (\S+?)\.")
+RUNNING = re.compile(r"Node (.+?) with ID (\S+) is running")
+CLOSED = re.compile(r"(?:Telnet connection closed|Console session kept open) for (.+?) \(Device ID: (\S+?)\)")
+HTTP_500 = re.compile(r"\b500\b|Internal Server Error")
+LOCK_ERROR = re.compile(r"\block", re.IGNORECASE)
+
+STAGES = ('create', 'start', 'console', 'total')
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of a sorted list.
+    """
+    if not values:
+        return None
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def log_files(paths):
+    """
+    Expand directories and glob patterns into log files sorted by name (= run start time).
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, '*_main_log_file.log*')))
+        else:
+            files.extend(glob.glob(path))
+    return sorted(set(files))
+
+
+def open_log(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', errors='replace')
+    return open(path, 'r', errors='replace')
+
+
+def analyze_run(path):
+    """
+    Stream one log file and rebuild its node timelines.
+    Args:
+        path (str): Log file.
+    Returns:
+        dict: Stage durations per node type, retry and error counts of the run.
+    """
+    pending_creates = defaultdict(list)  # Node type mapped to the start times of unmatched creations
+    nodes = {}                           # Device ID mapped to its timeline
+    run = {
+        'file': os.path.basename(path),
+        'started': None,
+        'durations': defaultdict(lambda: defaultdict(list)),
+        'retries': defaultdict(int),
+        'errors': 0,
+        'http_500': 0,
+        'lock_errors': 0,
+    }
+    with open_log(path) as log:
+        for line in log:
+            match = LINE_FORMAT.match(line)
+            if not match:
+                continue  # Continuation lines (tracebacks, multi-line API responses)
+            stamp, level, message = match.groups()
+
+            if level in ('ERROR', 'CRITICAL'):
+                run['errors'] += 1
+                if HTTP_500.search(message):
+                    run['http_500'] += 1
+                if LOCK_ERROR.search(message):
+                    run['lock_errors'] += 1
+                event = CREATE_FAILED.search(message)
+                if event and pending_creates[event.group(1)]:
+                    # The failed create must not lend its start time to the next success of its type
+                    pending_creates[event.group(1)].pop(0)
+                continue
+
+            # Cheap substring checks first: most lines are none of the timeline messages
+            if 'Attempting to create node' in message:
+                event = CREATE_ATTEMPT.search(message)
+                if event:
+                    node_type, attempt = event.group(1), int(event.group(2))
+                    when = parse_time(stamp)
+                    run['started'] = run['started'] or when
+                    if attempt == 1:
+                        pending_creates[node_type].append(when)
+                    else:
+                        run['retries'][node_type] += 1
+            elif 'created successfully' in message:
+                event = CREATED.search(message)
+                if event:
+                    node_type, device_id = event.groups()
+                    when = parse_time(stamp)
+                    created_at = pending_creates[node_type].pop(0) if pending_creates[node_type] else when
+                    nodes[device_id] = {'type': node_type, 'create': created_at, 'created': when}
+            elif 'Attempting to start node' in message:
+                event = START_ATTEMPT.search(message)
+                if event and event.group(2) in nodes:
+                    nodes[event.group(2)].setdefault('start', parse_time(stamp))
+            elif 'is running' in message:
+                event = RUNNING.search(message)
+                if event and event.group(2) in nodes:
+                    nodes[event.group(2)].setdefault('running', parse_time(stamp))
+            elif 'for ' in message and ('connection closed' in message or 'session kept open' in message):
+                event = CLOSED.search(message)
+                if event and event.group(2) in nodes:
+                    nodes[event.group(2)].setdefault('closed', parse_time(stamp))
+
+    for timeline in nodes.values():
+        durations = run['durations'][timeline['type']]
+        add_duration(durations, 'create', timeline.get('create'), timeline.get('created'))
+        add_duration(durations, 'start', timeline.get('start'), timeline.get('running'))
+        add_duration(durations, 'console', timeline.get('running'), timeline.get('closed'))
+        add_duration(durations, 'total', timeline.get('create'), timeline.get('closed'))
+    run['nodes'] = len(nodes)
+    return run
+
+
+def parse_time(stamp):
+    return datetime.strptime(stamp, "%Y-%m-%d %H:%M:%S")
+
+
+def add_duration(durations, stage, start, end):
+    if start is not None and end is not None:
+        durations[stage].append((end - start).total_seconds())
+
+
+def stage_summary(values):
+    values = sorted(values)
+    summary = {'count': len(values)}
+    for percent in PERCENTILES:
+        summary[f"p{percent}"] = percentile(values, percent)
+    summary['max'] = values[-1] if values else None
+    return summary
+
+
+def build_report(runs):
+    """
+    Aggregate the analyzed runs.
+    """
+    combined = defaultdict(lambda: defaultdict(list))
+    for run in runs:
+        for node_type, stages in run['durations'].items():
+            for stage, values in stages.items():
+                combined[node_type][stage].extend(values)
+                combined['All nodes'][stage].extend(values)
+    total_nodes = sum(run['nodes'] for run in runs)
+    return {
+        'runs': len(runs),
+        'nodes': total_nodes,
+        'stages': {
+            node_type: {stage: stage_summary(stages[stage]) for stage in STAGES if stages[stage]}
+            for node_type, stages in combined.items()
+        },
+        'retries': sum(sum(run['retries'].values()) for run in runs),
+        'errors': sum(run['errors'] for run in runs),
+        'http_500_per_node': sum(run['http_500'] for run in runs) / total_nodes if total_nodes else 0,
+        'lock_errors_per_node': sum(run['lock_errors'] for run in runs) / total_nodes if total_nodes else 0,
+        'trend': [
+            {
+                'file': run['file'],
+                'started': run['started'].isoformat(sep=' ') if run['started'] else None,
+                'nodes': run['nodes'],
+                'median_total': percentile(sorted(sum((stages['total'] for stages in run['durations'].values()), [])), 50),
+                'retries': sum(run['retries'].values()),
+                'http_500': run['http_500'],
+                'lock_errors': run['lock_errors'],
+            }
+            for run in runs
+        ],
+    }
+
+
+def print_report(report):
+    def seconds(value):
+        return f"{value:7.0f}" if value is not None else "      -"
+
+    print(f"Runs: {report['runs']}  Nodes: {report['nodes']}  Create retries: {report['retries']}  Errors: {report['errors']}")
+    print(f"API 500 errors per node: {report['http_500_per_node']:.3f}  Lock errors per node: {report['lock_errors_per_node']:.3f}\n")
+    print(f"{'Node type':<18}{'Stage':<9}{'Count':>6}" + "".join(f"{'p' + str(percent):>8}" for percent in PERCENTILES) + f"{'max':>8}  (seconds)")
+    for node_type, stages in sorted(report['stages'].items()):
+        for stage, summary in stages.items():
+            print(f"{node_type:<18}{stage:<9}{summary['count']:>6}" + "".join(f" {seconds(summary['p' + str(percent)])}" for percent in PERCENTILES) + f" {seconds(summary['max'])}")
+    print(f"\n{'Run':<45}{'Nodes':>6}{'Median total':>14}{'Retries':>9}{'500s':>6}{'Locks':>7}")
+    for run in report['trend']:
+        print(f"{run['file']:<45}{run['nodes']:>6}{seconds(run['median_total']):>14}{run['retries']:>9}{run['http_500']:>6}{run['lock_errors']:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze historical EVE-NG deployment logs")
+    parser.add_argument("paths", nargs="*", default=["../log"], help="Log files, directories or glob patterns")
+    parser.add_argument("--since", help="Only analyze runs started on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--json", dest="json_file", help="Also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    runs = []
+    for path in log_files(args.paths):
+        # Log file names start with the run timestamp, so older runs are skipped without reading them
+        if args.since and os.path.basename(path)[:10] < args.since:
+            continue
+        runs.append(analyze_run(path))
+
+    report = build_report(runs)
+    print_report(report)
+    if args.json_file:
+        with open(args.json_file, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
@@ -0,0 +1,160 @@
+"""
+ssh_standin.py
+
+Local SSH stand-in for a network device, used to try the SSH configuration
+transport (`config_transport: "ssh"`) without an EVE-NG server.
+
+It accepts one username/password, answers every line sent to the interactive
+shell with a device-like prompt, accepts SCP uploads (`scp -t <path>`) and
+answers `copy <file> running-config` the way Cisco IOS does. Every received
+command and uploaded file is printed and appended to a log file, so the pushed
+configuration can be compared with the workbook.
+
+This is a manual tool: nothing in the repository starts it or runs it
+automatically. It answers every line at once, so it shows what is pushed but not how the
+transport copes with slow devices.
+
+Dependencies:
+-------------
+- paramiko: SSH server implementation.
+
+Usage:
+------
+Start the stand-in, then point a device at it in the `ssh` settings of
+`automation_urls.json` (e.g. `"port": 2222, "addresses": {"Cisco Router 0": "127.0.0.1"}`):
+    python ssh_standin.py --port 2222 --prompt "ciscorouter06#"
+"""
+
+import argparse
+import socket
+import threading
+import paramiko
+
+
+class StandinServer(paramiko.ServerInterface):
+    """
+    Accepts password logins, shells and exec requests.
+    """
+
+    def __init__(self, username, password):
+        self.username = username
+        self.password = password
+        self.exec_command = None
+        self.event = threading.Event()
+
+    def check_auth_password(self, username, password):
+        if username == self.username and password == self.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.event.set()
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        self.exec_command = command.decode('ascii', errors='ignore')
+        self.event.set()
+        return True
+
+
+def log(log_file, text):
+    print(text)
+    with open(log_file, 'a') as standin_log:
+        standin_log.write(text + "\n")
+
+
+def run_shell(channel, prompt, log_file):
+    """
+    Echo every received line and answer with the prompt.
+    """
+    channel.sendall(f"\r\nSSH stand-in\r\n{prompt}".encode('ascii'))
+    buffer = b''
+    while True:
+        data = channel.recv(65536)
+        if not data:
+            return
+        buffer += data
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            command = line.decode('ascii', errors='ignore').strip("\r")
+            if command:
+                log(log_file, f"COMMAND: {command}")
+            reply = f"{command}\r\n"
+            if command.startswith("copy ") and command.endswith("running-config"):
+                reply += "Destination filename [running-config]? "
+            else:
+                reply += prompt
+            channel.sendall(reply.encode('ascii'))
+
+
+def run_scp_sink(channel, target, log_file):
+    """
+    Receive one file with the SCP sink protocol.
+    """
+    channel.sendall(b"\0")
+    header = b''
+    while not header.endswith(b"\n"):
+        header += channel.recv(1)
+    mode, size, name = header.decode('ascii').strip().split(" ", 2)
+    channel.sendall(b"\0")
+    remaining = int(size)
+    data = b''
+    while remaining:
+        chunk = channel.recv(min(remaining, 65536))
+        data += chunk
+        remaining -= len(chunk)
+    channel.recv(1)  # Trailing \0
+    channel.sendall(b"\0")
+    log(log_file, f"UPLOAD: {target} ({len(data)} bytes)\n{data.decode('ascii', errors='ignore')}")
+    channel.send_exit_status(0)
+
+
+def handle_client(client, host_key, args):
+    transport = paramiko.Transport(client)
+    transport.add_server_key(host_key)
+    server = StandinServer(args.username, args.password)
+    transport.start_server(server=server)
+    while transport.is_active():
+        channel = transport.accept(30)
+        if channel is None:
+            continue
+        server.event.wait(10)
+        command, server.exec_command = server.exec_command, None
+        server.event.clear()
+        if command and command.startswith("scp -t "):
+            run_scp_sink(channel, command[len("scp -t "):], args.log_file)
+            channel.close()
+        else:
+            threading.Thread(target=run_shell, args=(channel, args.prompt, args.log_file), daemon=True).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SSH stand-in for a network device")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="adminpassword")
+    parser.add_argument("--prompt", default="Router#")
+    parser.add_argument("--log-file", default="ssh_standin.log")
+    args = parser.parse_args()
+
+    host_key = paramiko.RSAKey.generate(2048)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(100)
+    print(f"SSH stand-in listening on {args.host}:{args.port} (user {args.username})")
+    while True:
+        client, address = sock.accept()
+        threading.Thread(target=handle_client, args=(client, host_key, args), daemon=True).start()